@@ -0,0 +1,209 @@
+"""Benchmark the whole pipeline of ``scrape_news_and_save_to_db()`` without a network.
+
+Feeds and local news are served by ``benchmarks.local_news_server``, with
+injected latency and errors, and news are stored to a new SQLite file for
+each run (or to the PostgreSQL database in ``DATABASE_CONFIG``).
+
+For each run, it reports:
+    - Throughput: news, requests and megabytes per second.
+    - Latency percentiles of each stage (See ``scraper_metrics.py``).
+    - Peak memory: the maximum resident set size of this process, and the peak
+      of Python allocations with ``--tracemalloc``. Memory of the HTML parser
+      processes is not included, unless ``FEED_PARSER_CONFIG["html_parser_processes"]``
+      is 0, which parses HTML in this process.
+
+Example:
+    Run from the root of the repository:
+
+    .. code-block:: console
+
+        $ python -m benchmarks.bench_pipeline --items-per-feed 50 --latency 0.05 --error-rate 0.01
+        $ python -m benchmarks.bench_pipeline --runs 3 --output bench_result.json
+
+"""
+# Standard library
+import argparse
+import json
+import logging
+import os
+import resource
+import tempfile
+import tracemalloc
+# Local modules
+import rss_feed_parsers
+import scraper_metrics
+from benchmarks.local_news_server import LocalNewsServer, build_corpus
+from collect_news_to_db import scrape_news_and_save_to_db
+from news_sources import get_news_source_registry
+from scraping_rules_reader import get_rules_from_file
+from settings import DATABASE_CONFIG, METRICS_CONFIG, SCRAPER_CONFIG
+
+STAGES = ("feed_fetch", "feed_parse", "article_fetch", "html_parse", "score", "db")
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+def run_benchmark(server, work_dir, backend="sqlite", use_tracemalloc=False):
+    """Run ``scrape_news_and_save_to_db()`` once against a running ``LocalNewsServer``.
+
+    Args:
+        server (LocalNewsServer): The running server.
+        work_dir (str): Directory for the DB, the error log and the metrics of the run.
+        backend (str, optional): "sqlite" for a new SQLite file, or "postgresql"
+            for the database in ``DATABASE_CONFIG``.
+        use_tracemalloc (bool, optional): Whether to trace Python allocations.
+
+    Returns:
+        dict: The result of the run.
+
+    """
+    metrics_file = os.path.join(work_dir, "scraper_metrics.json")
+    overrides = [
+        (SCRAPER_CONFIG, {
+            "debug": False,
+            "error_log": os.path.join(work_dir, "error.log"),
+            "score_memo_file": None,
+            "news_index_file": None,
+        }),
+        (METRICS_CONFIG, {"json_file": metrics_file, "prometheus_file": None}),
+        (DATABASE_CONFIG, {
+            "backend": backend,
+            "sqlite_file": os.path.join(work_dir, "news_scraper.sqlite3"),
+        }),
+    ]
+    # Settings are read by modules at call time, so they are overridden in place.
+    saved = [(config, {key: config[key] for key in values}) for config, values in overrides]
+    for config, values in overrides:
+        config.update(values)
+
+    # Nothing is cached from the previous run.
+    rss_feed_parsers.clear_content_cache()
+    request_count, bytes_sent = server.request_count, server.bytes_sent
+
+    if use_tracemalloc:
+        tracemalloc.start()
+    try:
+        scrape_news_and_save_to_db()
+    finally:
+        if use_tracemalloc:
+            _, peak_allocated = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        for config, values in saved:
+            config.update(values)
+
+    with open(metrics_file) as infile:
+        report = json.load(infile)
+
+    duration = report["duration"]
+    request_count = server.request_count - request_count
+    megabytes = (server.bytes_sent - bytes_sent) / 2 ** 20
+    recorder = scraper_metrics.get_recorder()
+
+    result = {
+        "duration": duration,
+        "summary": report["summary"],
+        "throughput": {
+            "news_per_second": report["summary"]["news_count"] / duration,
+            "requests_per_second": request_count / duration,
+            "megabytes_per_second": megabytes / duration,
+        },
+        "requests": request_count,
+        "megabytes": megabytes,
+        "latency": {},
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_megabytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    if use_tracemalloc:
+        result["peak_allocated_megabytes"] = peak_allocated / 2 ** 20
+
+    for stage in STAGES:
+        histogram = recorder.get_stage_latency(stage)
+        if histogram.count:
+            result["latency"][stage] = dict(
+                count=histogram.count,
+                **{"p%d" % round(q * 100): histogram.quantile(q) for q in QUANTILES}
+            )
+
+    return result
+
+
+def print_result(index, result):
+    summary = result["summary"]
+    throughput = result["throughput"]
+    print("Run %d: %.3f seconds, %d news (%d stored, %d near-duplicates), %d requests, %.2f MB" % (
+        index, result["duration"], summary["news_count"], summary["target_count"],
+        summary["duplicate_count"], result["requests"], result["megabytes"]
+    ))
+    print("  Throughput: %.1f news/s, %.1f requests/s, %.2f MB/s" % (
+        throughput["news_per_second"], throughput["requests_per_second"],
+        throughput["megabytes_per_second"]
+    ))
+    print("  %-14s %8s %10s %10s %10s" % ("Latency (ms)", "count", "p50", "p90", "p99"))
+    for stage, latency in result["latency"].items():
+        print("  %-14s %8d %10.2f %10.2f %10.2f" % (
+            stage, latency["count"], latency["p50"] * 1000, latency["p90"] * 1000,
+            latency["p99"] * 1000
+        ))
+
+    memory = "  Peak RSS: %.1f MB" % result["peak_rss_megabytes"]
+    if "peak_allocated_megabytes" in result:
+        memory += ", Python allocations: %.1f MB" % result["peak_allocated_megabytes"]
+    print(memory)
+
+
+def main():
+    """Benchmark the pipeline against a local HTTP server.
+    """
+    arg_parser = argparse.ArgumentParser(description=main.__doc__)
+    arg_parser.add_argument("--items-per-feed", type=int, default=20,
+                            help="Number of items in each feed (default: %(default)s)")
+    arg_parser.add_argument("--duplicate-ratio", type=float, default=0.1,
+                            help="Ratio of items which are in other feeds (default: %(default)s)")
+    arg_parser.add_argument("--match-ratio", type=float, default=0.2,
+                            help="Ratio of items which match a rule (default: %(default)s)")
+    arg_parser.add_argument("--latency", type=float, default=0.0,
+                            help="Seconds to wait before each response (default: %(default)s)")
+    arg_parser.add_argument("--jitter", type=float, default=0.0,
+                            help="Seconds of random latency added (default: %(default)s)")
+    arg_parser.add_argument("--error-rate", type=float, default=0.0,
+                            help="Ratio of requests which get a 503 error (default: %(default)s)")
+    arg_parser.add_argument("--backend", choices=("sqlite", "postgresql"), default="sqlite",
+                            help="DB to store news to (default: %(default)s). "
+                                 "postgresql uses DATABASE_CONFIG of settings.py.")
+    arg_parser.add_argument("--runs", type=int, default=1,
+                            help="Number of runs (default: %(default)s)")
+    arg_parser.add_argument("--seed", type=int, default=0,
+                            help="Seed of the corpus and the injected errors (default: %(default)s)")
+    arg_parser.add_argument("--tracemalloc", action="store_true",
+                            help="Trace peak Python allocations (slower)")
+    arg_parser.add_argument("--output", metavar="FILE",
+                            help="Write results of all runs to FILE in JSON")
+    args = arg_parser.parse_args()
+
+    # Only warnings of the pipeline are shown.
+    logging.basicConfig(level=logging.WARNING)
+
+    corpus = build_corpus(
+        get_news_source_registry(), items_per_feed=args.items_per_feed,
+        duplicate_ratio=args.duplicate_ratio, match_ratio=args.match_ratio,
+        scraping_rules=list(get_rules_from_file(SCRAPER_CONFIG["rule_file"])), seed=args.seed
+    )
+    print("Corpus: %d urls, %.2f MB" % (
+        len(corpus), sum(len(content) for _, content in corpus.values()) / 2 ** 20
+    ))
+
+    results = []
+    with LocalNewsServer(corpus, latency=args.latency, jitter=args.jitter,
+                         error_rate=args.error_rate, seed=args.seed) as server:
+        for index in range(1, args.runs + 1):
+            with tempfile.TemporaryDirectory(prefix="bench_pipeline_") as work_dir:
+                result = run_benchmark(server, work_dir, args.backend, args.tracemalloc)
+            print_result(index, result)
+            results.append(result)
+
+    if args.output:
+        with open(args.output, "w") as outfile:
+            json.dump({"arguments": vars(args), "runs": results}, outfile, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+"""This module serves news feeds and local news pages by a local HTTP server.
+
+It stands in for Google News, Yahoo News and the local news sources, so that
+the whole pipeline can be run and measured without a network.
+
+A corpus maps canonical urls to responses. ``build_corpus()`` generates one
+for the registered news sources, in the formats of the recorded feeds in
+``tests/unit_tests/`` and the layouts in ``extraction_profiles.json``:
+
+    - A feed for each category of each news source.
+    - Google News items link to 1 to 3 local news, on a site with an
+      extraction profile, or on an unknown site (parsed by its <meta> tags).
+    - Some items appear in several feeds, as they do in the real feeds.
+    - Some titles contain keywords of the scraping rules, so they are stored.
+
+While ``LocalNewsServer`` is running, ``scraper_utils.fetch_url()`` retrieves
+every url from the server instead, with injected latency and errors.
+
+Example:
+    .. code-block:: python
+
+        corpus = build_corpus(get_news_source_registry(), items_per_feed=20)
+        with LocalNewsServer(corpus, latency=0.05, error_rate=0.01):
+            scrape_news_and_save_to_db()
+
+"""
+# Standard library
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlsplit
+from urllib.request import urlopen
+from xml.sax.saxutils import escape
+# Local modules
+import scraper_utils
+from extraction_profiles import get_extraction_profiles
+from settings import FEED_PARSER_CONFIG
+from url_canonicalizer import canonicalize_url
+
+# Urls of local news of each site: <url pattern, site name>
+_LOCAL_SITES = {
+    "ltn.com.tw": ("https://news.ltn.com.tw/news/world/breakingnews/%d", "自由時報電子報"),
+    "cna.com.tw": ("https://www.cna.com.tw/news/aopl/%d.aspx", "中央社即時新聞"),
+    "udn.com": ("https://udn.com/news/story/6809/%d", "聯合新聞網"),
+    "ettoday.net": ("https://www.ettoday.net/news/20180219/%d.htm", "ETtoday"),
+}
+# A site without an extraction profile
+_UNKNOWN_SITE = ("https://www.example-news.com.tw/article/%d", "範例新聞網")
+
+_FILLER_TEXT = (
+    "花蓮震災重建小組召集人今天說對於因地震受損的民間建築物已編列預算提供重建法令技術諮詢等服務"
+    "並補助辦理結構安全性能評估及擬定重建計畫美國總統川普批評聯邦調查局忙於調查通俄案"
+    "行政院會通過前瞻基礎建設計畫第二期特別預算立法院將於下週召開臨時會審查"
+)
+
+_RSS_TEMPLATE = (
+    '<?xml version="1.0" encoding="UTF-8"?>\n'
+    '<rss version="2.0"><channel>'
+    '<title>%s</title><link>%s</link><description>%s</description>'
+    '<language>zh-tw</language>%s</channel></rss>'
+)
+_ITEM_TEMPLATE = (
+    '<item><title>%s</title><link>%s</link><guid isPermaLink="false">%s</guid>'
+    '<pubDate>%s</pubDate><description>%s</description></item>'
+)
+
+
+def build_corpus(news_sources, items_per_feed=20, duplicate_ratio=0.1,
+                 match_ratio=0.2, scraping_rules=(), profile_file=None, seed=0):
+    """Generate feeds of news sources, and the local news linked by them.
+
+    Args:
+        news_sources (dict): Registry of news source classes,
+            as returned by ``news_sources.get_news_source_registry()``.
+
+        items_per_feed (int, optional): Number of items in each feed.
+
+        duplicate_ratio (float, optional): Ratio of items which are copies of
+            items of other feeds.
+
+        match_ratio (float, optional): Ratio of items whose titles contain the
+            keywords of one of ``scraping_rules``.
+
+        scraping_rules (Iterable(scraper_models.ScrapingRule), optional): Rules
+            whose keywords are put into titles.
+
+        profile_file (str, optional): The extraction profile file, whose
+            selectors are used to lay out local news. Defaults to
+            ``FEED_PARSER_CONFIG["extraction_profile_file"]``.
+
+        seed (int, optional): Seed of the random generator, so that the same
+            corpus is generated every time.
+
+    Returns:
+        dict: <Canonical url, (content type, content in bytes)>
+
+    """
+    if profile_file is None:
+        profile_file = FEED_PARSER_CONFIG["extraction_profile_file"]
+
+    generator = _CorpusGenerator(
+        random.Random(seed), get_extraction_profiles(profile_file),
+        [sorted(group) for rule in scraping_rules for group in rule.include_groups if group]
+    )
+
+    for news_source_class in news_sources.values():
+        news_src = news_source_class()
+        is_google = "google" in news_src.get_rss_url(news_src.categories[0])
+
+        for category in news_src.categories:
+            generator.add_feed(
+                news_src.get_rss_url(category), is_google, items_per_feed,
+                duplicate_ratio, match_ratio
+            )
+
+    return generator.corpus
+
+
+class _CorpusGenerator(object):
+
+    def __init__(self, rand, profiles, keyword_groups):
+        self.rand = rand
+        self.profiles = {profile.domains[0]: profile for profile in profiles}
+        self.keyword_groups = keyword_groups
+        self.corpus = {}
+        self._items = {True: [], False: []}  # Whether from Google ==> items
+        self._next_id = 100000
+        self._now = datetime(2018, 2, 19, 9, 0, tzinfo=timezone.utc)
+
+    def add_feed(self, feed_url, is_google, item_count, duplicate_ratio, match_ratio):
+        items = []
+        for _ in range(item_count):
+            seen_items = self._items[is_google]
+            if seen_items and self.rand.random() < duplicate_ratio:
+                items.append(self.rand.choice(seen_items))
+                continue
+
+            item = self._new_google_item(match_ratio) if is_google else self._new_yahoo_item(
+                match_ratio
+            )
+            seen_items.append(item)
+            items.append(item)
+
+        site_name = "Google News" if is_google else "Yahoo奇摩新聞"
+        feed = _RSS_TEMPLATE % (
+            escape(site_name), escape(feed_url), escape(site_name), "".join(items)
+        )
+        self.corpus[canonicalize_url(feed_url)] = ("application/rss+xml", feed.encode("utf-8"))
+
+    def _new_google_item(self, match_ratio):
+        title = self._title(match_ratio)
+        links = []
+        for _ in range(self.rand.randint(1, 3)):
+            if self.rand.random() < 0.8:
+                domain = self.rand.choice(sorted(self._available_sites()))
+                url_pattern, site_name = _LOCAL_SITES[domain]
+            else:
+                domain = None
+                url_pattern, site_name = _UNKNOWN_SITE
+
+            url = url_pattern % self._new_id()
+            links.append((url, site_name))
+            self.corpus[canonicalize_url(url)] = ("text/html", self._article(title, domain))
+
+        description = (
+            '<table border="0" cellpadding="2" cellspacing="3"><tr><td><ol>%s</ol></td></tr></table>'
+            % "".join(
+                '<li><a href="%s" target="_blank">%s</a>&nbsp;&nbsp;'
+                '<font color="#6f6f6f">%s</font></li>'
+                % (escape(url), escape(title), escape(site_name))
+                for url, site_name in links
+            )
+        )
+        return self._item(title, links[0][0], escape(description))
+
+    def _new_yahoo_item(self, match_ratio):
+        title = self._title(match_ratio)
+        url = "https://tw.news.yahoo.com/%d.html" % self._new_id()
+        return self._item(title, url, "<![CDATA[%s]]>" % self._paragraph())
+
+    def _item(self, title, url, description):
+        published_time = self._now - timedelta(minutes=self.rand.randint(0, 600))
+        return _ITEM_TEMPLATE % (
+            escape(title), escape(url), escape(url),
+            format_datetime(published_time, usegmt=True), description
+        )
+
+    def _article(self, title, domain):
+        paragraphs = "".join(
+            "<p>%s</p>" % self._paragraph() for _ in range(self.rand.randint(3, 12))
+        )
+        if domain is None:
+            body = "<div>%s</div>" % paragraphs
+        else:
+            # Any of the layouts of the site
+            selector = self.rand.choice(self.profiles[domain].selectors)
+            attrs = "".join(' %s="%s"' % (key, value) for key, value in selector.attrs.items())
+            body = "<%s%s>%s</%s>" % (selector.tag, attrs, paragraphs, selector.tag)
+
+        html = (
+            '<html><head><meta charset="utf-8"><title>%s</title>'
+            '<meta name="description" content="%s"></head><body>%s</body></html>'
+            % (escape(title), escape(self._paragraph()), body)
+        )
+        return html.encode("utf-8")
+
+    def _available_sites(self):
+        return set(_LOCAL_SITES).intersection(self.profiles)
+
+    def _title(self, match_ratio):
+        words = [self._text(2, 4) for _ in range(self.rand.randint(3, 6))]
+        if self.keyword_groups and self.rand.random() < match_ratio:
+            words.extend(self.rand.choice(self.keyword_groups))
+            self.rand.shuffle(words)
+        return "".join(words)
+
+    def _paragraph(self):
+        return self._text(40, 160) + "。"
+
+    def _text(self, min_length, max_length):
+        return "".join(self.rand.choices(_FILLER_TEXT, k=self.rand.randint(min_length, max_length)))
+
+    def _new_id(self):
+        self._next_id += 1
+        return self._next_id
+
+
+class LocalNewsServer(object):
+    """A local HTTP server which serves a corpus, with latency and errors.
+
+    While it is running (inside the ``with`` block), ``scraper_utils.fetch_url()``
+    retrieves ``http://127.0.0.1:<port>/fetch?url=<url>`` instead of the url.
+
+    Args:
+        corpus (dict): <Canonical url, (content type, content in bytes)>,
+            as returned by ``build_corpus()``.
+
+        latency (float, optional): Seconds to wait before responding.
+
+        jitter (float, optional): Seconds of random latency added to ``latency``.
+
+        error_rate (float, optional): Ratio of requests which get a 503 error.
+
+        seed (int, optional): Seed of the random generator for jitter and errors.
+
+    Attributes:
+        request_count (int): Number of requests received.
+        error_count (int): Number of errors injected.
+        bytes_sent (int): Number of bytes of contents sent.
+
+    """
+
+    def __init__(self, corpus, latency=0.0, jitter=0.0, error_rate=0.0, seed=0):
+        self.corpus = corpus
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.request_count = 0
+        self.error_count = 0
+        self.bytes_sent = 0
+        self._rand = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = None
+        self._thread = None
+        self._original_fetch_url = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return "http://%s:%d" % (host, port)
+
+    def start(self):
+        """Start the server, and redirect ``scraper_utils.fetch_url()`` to it.
+        """
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(self))
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever, name="LocalNewsServer", daemon=True
+        )
+        self._thread.start()
+
+        self._original_fetch_url = scraper_utils.fetch_url
+        scraper_utils.fetch_url = self.fetch_url
+
+    def stop(self):
+        """Restore ``scraper_utils.fetch_url()``, and stop the server.
+        """
+        if self._httpd is None:
+            return
+
+        scraper_utils.fetch_url = self._original_fetch_url
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._thread.join()
+        self._httpd = None
+
+    def fetch_url(self, url, timeout=None):
+        """Retrieve a url from this server. See ``scraper_utils.fetch_url()``.
+        """
+        local_url = "%s/fetch?url=%s" % (self.base_url, quote(url, safe=""))
+        with urlopen(local_url, timeout=timeout) as response:
+            return response.read()
+
+    def _respond(self, url):
+        """Get <status, content type, content> of a request of a url.
+        """
+        with self._lock:
+            self.request_count += 1
+            delay = self.latency + self._rand.random() * self.jitter
+            failed = self._rand.random() < self.error_rate
+            if failed:
+                self.error_count += 1
+
+        if delay > 0:
+            time.sleep(delay)
+
+        if failed:
+            return 503, "text/plain", b"Injected error"
+
+        response = self.corpus.get(canonicalize_url(url))
+        if response is None:
+            return 404, "text/plain", b"Not in the corpus"
+
+        content_type, content = response
+        with self._lock:
+            self.bytes_sent += len(content)
+        return 200, content_type, content
+
+
+def _make_handler(server):
+
+    class _Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.0"
+
+        def do_GET(self):  # pylint: disable=invalid-name
+            url = parse_qs(urlsplit(self.path).query).get("url", [""])[0]
+            status, content_type, content = server._respond(url)
+
+            self.send_response(status)
+            self.send_header("Content-Type", "%s; charset=utf-8" % content_type)
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+            pass
+
+    return _Handler
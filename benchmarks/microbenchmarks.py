@@ -0,0 +1,323 @@
+"""Microbenchmarks of local news parsers, Google News routing and scoring.
+
+Benchmarks and their corpora:
+
+    - ``parse/<page>``: Extract the news content of a saved page in
+      ``benchmarks/corpus/articles/`` (one per layout of each supported
+      outlet, and one for the default parser) by the parser chosen by its url.
+      Pages are parsed in this process. Throughput in pages/s.
+    - ``google_routing``: Choose the local news of synthetic Google News
+      descriptions by ``GoogleFeedParser._get_description()``, without
+      retrieving them. Throughput in news/s.
+    - ``score/<N>_rules``: Score a synthetic corpus of Chinese news by N
+      synthetic rules (N = 10, 100, 1000, 10000) by ``NewsRSSEntry.set_rules()``,
+      without the score memo. Throughput in news/s.
+
+Synthetic corpora are generated by a fixed seed, so they are the same every time.
+Each benchmark is repeated, and the best throughput is compared with the
+baseline (``benchmarks/microbenchmarks_baseline.json``). If any throughput is
+lower than the baseline by more than the threshold, the exit status is 1.
+Baselines depend on the machine, so save one on the machine which compares
+against it.
+
+Example:
+    Run from the root of the repository:
+
+    .. code-block:: console
+
+        $ python -m benchmarks.microbenchmarks
+        $ python -m benchmarks.microbenchmarks --filter score --threshold 0.1
+        $ python -m benchmarks.microbenchmarks --save-baseline
+
+"""
+# Standard library
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import sys
+from collections import namedtuple
+from timeit import default_timer as timer
+from unittest.mock import patch
+from xml.sax.saxutils import escape
+# Local modules
+import rss_feed_parsers
+from local_news_parsers import (
+    DefaultHtmlNewsParser, extract_news_content, get_local_parser_registry
+)
+from rss_xml_reader import FeedDict
+from scraper_models import NewsRSSEntry, ScrapingRule
+from scraping_rules_compiler import compile_rules
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+ARTICLE_DIR = os.path.join(BENCHMARK_DIR, "corpus", "articles")
+BASELINE_FILE = os.path.join(BENCHMARK_DIR, "microbenchmarks_baseline.json")
+
+RULE_COUNTS = (10, 100, 1000, 10000)
+
+# Common characters of Chinese news, from which synthetic words are made
+_CHARACTERS = (
+    "的一是不了人我在有他這中大來上國個到說們為子和你地出道也時年得就那要下以生會自著去之過家學"
+    "對可她裡後小麼心多天而能好都然沒日於起還發成事只作當想看文無開手十用主行方又如前所本見經頭面"
+    "公同三已老從動兩長知民樣現分將外但身些與高意進把法此實回二理美點月明其種聲全工己話兒者向情部"
+    "正名定女問力機給等幾很業最間新什打便位因重被走電四第門相次東政海口使教西再平真聽世氣信北少關"
+    "並內加化由卻代軍產入先山五太水萬市眼體別處總才場師書比住員九笑性通目華報立馬命張活難神數件安"
+    "表原車白應路期叫死常提感金何更反合放做系計或司利受光王果親界及今京務制解各任至清物台灣股價院"
+)
+
+Benchmark = namedtuple("Benchmark", ("name", "unit", "items", "run"))
+Benchmark.__doc__ = """A microbenchmark.
+
+Attributes:
+    name (str): Name of the benchmark.
+    unit (str): Unit of the throughput, e.g. "pages/s".
+    items (int): Number of items processed by each call of ``run``.
+    run (callable): Process all items once.
+"""
+
+
+def get_parser_benchmarks():
+    """Benchmarks of extracting news contents from the saved pages.
+    """
+    with open(os.path.join(ARTICLE_DIR, "index.json")) as infile:
+        urls = json.load(infile)
+
+    registry = get_local_parser_registry()
+    benchmarks = []
+    for filename, url in sorted(urls.items()):
+        with open(os.path.join(ARTICLE_DIR, filename), "rb") as infile:
+            html = infile.read()
+
+        parser_class = next(
+            (registry[domain] for domain in registry if domain in url), DefaultHtmlNewsParser
+        )
+
+        def run(parser_class=parser_class, url=url, html=html):
+            html_parser = parser_class()
+            content, selector_results = extract_news_content(html_parser, url, html)
+            html_parser.record_selector_results(selector_results)
+            if not content:
+                raise AssertionError("No content is extracted from '%s'." % url)
+
+        benchmarks.append(Benchmark(
+            "parse/%s" % os.path.splitext(filename)[0], "pages/s", 1, run
+        ))
+
+    return benchmarks
+
+
+def get_routing_benchmark(news_count=200, seed=0):
+    """Benchmark of choosing local news of Google News by their descriptions.
+    """
+    rand = random.Random(seed)
+    domains = sorted(get_local_parser_registry()) + ["bepo.ctitv.com.tw", "www.storm.mg"]
+
+    entries = []
+    for index in range(news_count):
+        items = []
+        for _ in range(rand.randint(1, 3)):
+            url = "https://%s/news/%d" % (rand.choice(domains), rand.randint(1, 10 ** 7))
+            if rand.random() < 0.3:
+                # A redirect of Google News
+                url = "https://news.google.com/news/url?url=%s&ct=ga" % url
+            items.append(
+                '<li><a href="%s" target="_blank">%s</a>&nbsp;&nbsp;'
+                '<font color="#6f6f6f">%s</font></li>'
+                % (escape(url), _words(rand, 4, 8), _words(rand, 2, 3))
+            )
+        entries.append(FeedDict(
+            title="news %d" % index,
+            description=(
+                '<table border="0" cellpadding="2" cellspacing="3"><tr><td>'
+                '<img src="https://encrypted-tbn0.gstatic.com/images?q=%d" border="1"></td>'
+                '<td><ol style="list-style: none; margin: 0; padding: 0;">%s</ol></td></tr></table>'
+                % (index, "".join(items))
+            )
+        ))
+
+    def run():
+        # Local news are not retrieved, only chosen.
+        with patch("rss_feed_parsers._get_content_from_local_source",
+                   side_effect=lambda news_source, link, html_parser: link):
+            for entry in entries:
+                rss_feed_parsers.GoogleFeedParser._get_description(entry)
+
+    return Benchmark("google_routing", "news/s", news_count, run)
+
+
+def get_scoring_benchmarks(rule_counts=RULE_COUNTS, news_count=200, seed=0):
+    """Benchmarks of scoring synthetic news by synthetic rule sets of several sizes.
+    """
+    rand = random.Random(seed)
+    vocabulary = sorted({_words(rand, 1, 1) for _ in range(20000)})
+    news_texts = [
+        (_sentence(rand, vocabulary, 6, 12), _sentence(rand, vocabulary, 100, 300))
+        for _ in range(news_count)
+    ]
+
+    benchmarks = []
+    for rule_count in rule_counts:
+        rules = compile_rules(_make_rules(rand, vocabulary, rule_count))
+
+        def run(rules=rules):
+            rules.score_memo.clear()
+            for title, description in news_texts:
+                news = NewsRSSEntry(title, description, "", None, "benchmark")
+                news.set_rules(rules)
+
+        benchmarks.append(Benchmark("score/%d_rules" % rule_count, "news/s", news_count, run))
+
+    return benchmarks
+
+
+def get_benchmarks():
+    """Get all microbenchmarks.
+
+    Returns:
+        list(Benchmark): The benchmarks.
+
+    """
+    return get_parser_benchmarks() + [get_routing_benchmark()] + get_scoring_benchmarks()
+
+
+def measure(benchmark, repeat=5, min_time=0.2):
+    """Measure the best throughput of a benchmark.
+
+    Args:
+        benchmark (Benchmark): The benchmark.
+        repeat (int, optional): Number of measurements.
+        min_time (float, optional): Minimum seconds of a measurement. ``run``
+            is called as many times as needed.
+
+    Returns:
+        float: The best throughput, in items per second.
+
+    """
+    benchmark.run()  # Warm up
+
+    best = 0.0
+    for _ in range(repeat):
+        calls = 0
+        start_time = timer()
+        while True:
+            benchmark.run()
+            calls += 1
+            elapsed = timer() - start_time
+            if elapsed >= min_time:
+                break
+        best = max(best, calls * benchmark.items / elapsed)
+
+    return best
+
+
+def compare_with_baseline(results, baseline, threshold):
+    """Find benchmarks whose throughputs are lower than the baseline.
+
+    Args:
+        results (dict): <Name, {"throughput": float, "unit": str}>
+        baseline (dict): Results saved before.
+        threshold (float): The allowed ratio of regression, e.g. 0.2 for 20%.
+
+    Returns:
+        list(tuple(str, float, float)): <name, throughput, baseline throughput>
+            of the regressed benchmarks.
+
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+
+        expected = baseline[name]["throughput"]
+        if result["throughput"] < expected * (1 - threshold):
+            regressions.append((name, result["throughput"], expected))
+
+    return regressions
+
+
+def _make_rules(rand, vocabulary, rule_count):
+    rules = []
+    for index in range(rule_count):
+        include_groups = [
+            rand.sample(vocabulary, rand.randint(1, 2)) for _ in range(rand.randint(1, 2))
+        ]
+        rules.append(ScrapingRule(
+            "rule %d" % index,
+            excluded_keywords=rand.sample(vocabulary, 1) if rand.random() < 0.2 else None,
+            include_groups=include_groups,
+            include_any=rand.sample(vocabulary, 3) if rand.random() < 0.3 else None,
+            ensure_times_lower=1 if rand.random() < 0.1 else None,
+        ))
+    return rules
+
+
+def _words(rand, min_count, max_count):
+    return "".join(
+        "".join(rand.choices(_CHARACTERS, k=rand.randint(2, 3)))
+        for _ in range(rand.randint(min_count, max_count))
+    )
+
+
+def _sentence(rand, vocabulary, min_count, max_count):
+    return "".join(rand.choices(vocabulary, k=rand.randint(min_count, max_count)))
+
+
+def main():
+    """Run microbenchmarks, and compare them with the baseline.
+    """
+    arg_parser = argparse.ArgumentParser(description=main.__doc__)
+    arg_parser.add_argument("--filter", metavar="REGEX",
+                            help="Only run benchmarks whose names match REGEX")
+    arg_parser.add_argument("--repeat", type=int, default=5,
+                            help="Number of measurements of a benchmark (default: %(default)s)")
+    arg_parser.add_argument("--baseline", default=BASELINE_FILE,
+                            help="The baseline file (default: %(default)s)")
+    arg_parser.add_argument("--threshold", type=float, default=0.2,
+                            help="Allowed ratio of regression (default: %(default)s)")
+    arg_parser.add_argument("--save-baseline", action="store_true",
+                            help="Save the results as the baseline, instead of comparing")
+    args = arg_parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as infile:
+            baseline = json.load(infile)
+
+    results = {}
+    for benchmark in get_benchmarks():
+        if args.filter and not re.search(args.filter, benchmark.name):
+            continue
+
+        throughput = measure(benchmark, repeat=args.repeat)
+        results[benchmark.name] = {"throughput": throughput, "unit": benchmark.unit}
+
+        change = ""
+        if benchmark.name in baseline:
+            change = "%+.1f%%" % (
+                (throughput / baseline[benchmark.name]["throughput"] - 1) * 100
+            )
+        print("%-26s %12.1f %-8s %s" % (benchmark.name, throughput, benchmark.unit, change))
+
+    if args.save_baseline:
+        baseline.update(results)
+        with open(args.baseline, "w") as outfile:
+            json.dump(baseline, outfile, indent=4, sort_keys=True)
+            outfile.write("\n")
+        print("Saved the baseline to '%s'." % args.baseline)
+        return
+
+    regressions = compare_with_baseline(results, baseline, args.threshold)
+    for name, throughput, expected in regressions:
+        print("REGRESSION: %s %.1f < %.1f (baseline) by more than %d%%" % (
+            name, throughput, expected, args.threshold * 100
+        ))
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
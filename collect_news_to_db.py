@@ -10,35 +10,111 @@ Example:
 """
 # Standard library
 import logging
-from concurrent import futures
+import os
 from timeit import default_timer as timer
-from urllib.error import HTTPError, URLError
 # Local modules
+import response_archive
+import scraper_metrics
 import scraper_utils
-from settings import SCRAPER_CONFIG, DATABASE_CONFIG
+from settings import (
+    SCRAPER_CONFIG, DATABASE_CONFIG, FEED_PARSER_CONFIG, METRICS_CONFIG, ARCHIVE_CONFIG
+)
+from crawl_jobs import CrawlCoordinator
 from db_news_api import NewsDatabaseAPI
-from db_operation_api.mydb import get_database
+from db_writer import NewsDatabaseWriter
+from db_backends import get_database
+from db_indexes import check_conflict_indexes
 from local_news_parsers import update_local_news_sources_list
+from news_index import NewsInvertedIndex
+from news_pipeline import NewsPipeline
 from news_sources import get_news_source_registry
-from scraping_rules_reader import get_rules_from_file
+from scraping_rules_reader import get_compiled_rules_from_file
+from story_clusters import StoryClusterer
 
 
-def scrape_news_and_save_to_db():
+class ScraperState(object):
+    """State kept warm between runs of a long-lived process (See ``schedule.py``).
+
+    Compiled rules are reused until the rule file is modified, so memoized
+    scores stay in memory instead of being loaded for each run. The news index
+    is loaded once, and synchronized with DB by each run.
+    """
+
+    def __init__(self):
+        self._rules = None
+        self._rule_file_key = None
+        self._news_index = None
+
+    def get_compiled_rules(self, rule_file, score_memo_file=None):
+        """Get the compiled rules of a rule file, compiled again only if it is modified.
+
+        Args:
+            rule_file (str): File name of the rule file.
+            score_memo_file (str, optional): The file of memoized scores to load
+                when the rules are compiled.
+
+        Returns:
+            scraping_rules_compiler.CompiledRuleSet: The compiled rules.
+
+        """
+        file_stat = os.stat(rule_file)
+        rule_file_key = (rule_file, file_stat.st_mtime_ns, file_stat.st_size)
+        if self._rules is None or rule_file_key != self._rule_file_key:
+            rules = get_compiled_rules_from_file(rule_file)
+            rules.score_memo.max_size = SCRAPER_CONFIG["score_memo_size"]
+            if score_memo_file:
+                rules.score_memo.load(score_memo_file)
+            self._rules, self._rule_file_key = rules, rule_file_key
+
+        return self._rules
+
+    def get_news_index(self, news_index_file):
+        """Get the news index, loaded from the file by the first call.
+        """
+        if self._news_index is None:
+            self._news_index = NewsInvertedIndex.load(news_index_file)
+        return self._news_index
+
+
+def scrape_news_and_save_to_db(db_session=None, state=None, job_queue=None):
     """Collect news, filter them by rules, and store them to DB.
 
     This method does the following:
         1. Read scraping rules from file.
         2. Read scraping rules from DB.
         3. If rules have changed, update the the rules in DB by rules from file.
+           Only added or changed rules are stored again, and only the news
+           which may match them (by ``news_index``) are rescored.
         4. Retrieve news data from RSS news links.
         5. Filter the news by scraping rules, and save the result to DB.
+           Each news is retrieved, scored and written by a background writer
+           as soon as it is ready (See ``news_pipeline.py``). With a job queue,
+           news are retrieved by workers instead (See ``crawl_jobs.py``).
+           Responses are archived if ``ARCHIVE_CONFIG["capture"]`` is True.
+           Near-duplicates of a story seen in this run are not saved.
+        6. Write metrics of the stages of this run (See ``scraper_metrics.py``).
+
+    Args:
+        db_session (db_session.PostgresSession, optional): A long-lived session
+            to get the DB connection from. Defaults to None, which means a new
+            connection is opened by ``db_backends.get_database()``.
+
+        state (ScraperState, optional): State kept between runs. Defaults to
+            None, which means rules and the news index are loaded for this run.
+
+        job_queue (job_queue.JobQueue, optional): The queue shared with crawl
+            workers. Defaults to None, which means news are retrieved by this
+            process.
 
     """
     debug = SCRAPER_CONFIG["debug"]
     rule_file = SCRAPER_CONFIG["rule_file"]
     error_log = SCRAPER_CONFIG["error_log"]
+    score_memo_file = SCRAPER_CONFIG["score_memo_file"]
+    news_index_file = SCRAPER_CONFIG["news_index_file"]
 
     start_time = timer()
+    scraper_metrics.reset()
 
     # Set up loggers
     log_format = "[%(levelname)s] %(message)s\n"
@@ -51,35 +127,59 @@ def scrape_news_and_save_to_db():
     )
     logging.basicConfig(level=logging.INFO, format=log_format)
 
-    # Get scraping rules
-    rules_from_file = tuple(get_rules_from_file(rule_file))
+    if state is None:
+        state = ScraperState()
 
-    with get_database(DATABASE_CONFIG) as conn:
-        db_api = NewsDatabaseAPI(conn)
+    # Get scraping rules, and compile them once for all news
+    rules_from_file = state.get_compiled_rules(rule_file, score_memo_file)
 
-        rules_from_db = db_api.get_scraping_rules()
+    if db_session:
+        database = db_session.connection()
+    else:
+        database = get_database(DATABASE_CONFIG)
 
-        # If rules have changed ==> update scores in DB
-        if set(rules_from_file) != set(rules_from_db.values()):
-            logging.info("ScrapingRules have changed. Reload rules to DB.")
+    news_index = None
+    if news_index_file:
+        news_index = state.get_news_index(news_index_file)
 
-            db_api.remove_all_rules_and_relations()
-            _save_scraping_rules_to_db(db_api, rules_from_file)
+    with database as conn:
+        # Fail before scraping if scores could not be stored.
+        check_conflict_indexes(conn)
+        db_api = NewsDatabaseAPI(conn, news_index=news_index)
 
-            _update_scores_for_news_in_db(db_api, rules_from_file)
+        if news_index is not None:
+            news_index.sync(db_api)
 
-        # Get news from RSS feeds and apply rules
-        news_entries = _scrape_news_data_and_set_rules(rules_from_file)
+        sync_scraping_rules(db_api, rules_from_file)
 
-        # Filter the news by the rules (So target_news is the news of interest)
-        target_news = tuple(
-            news for news in news_entries if news.total_score > 0
-        )
+        # Get news from RSS feeds, apply rules, and save news of interest to db
+        clusterer = StoryClusterer() if FEED_PARSER_CONFIG["cluster_stories"] else None
+        if ARCHIVE_CONFIG["capture"]:
+            response_archive.start_capture(ARCHIVE_CONFIG["directory"])
+        try:
+            with NewsDatabaseWriter(db_api) as db_writer:
+                pipeline = NewsPipeline(rules_from_file, db_writer, clusterer, keep_news=debug)
+                if job_queue is None:
+                    pipeline.run(get_news_source_registry())
+                else:
+                    CrawlCoordinator(job_queue, pipeline).run(get_news_source_registry())
+        finally:
+            response_archive.stop_capture()
+
+        if clusterer is not None:
+            logging.info("Found %d near-duplicate news.", clusterer.duplicate_count)
 
-        # Save to db
-        _save_news_data_to_db(db_api, target_news)
+    if news_index_file:
+        news_index.save(news_index_file)
+
+    if score_memo_file:
+        rules_from_file.score_memo.save(
+            score_memo_file, max_size=SCRAPER_CONFIG["score_memo_size"]
+        )
 
     if debug:
+        news_entries = pipeline.news_entries
+
         # For future development
         logging.info("Updating 'local_news_sources.txt'...")
         update_local_news_sources_list(news_entries, "local_news_sources.txt")
@@ -89,93 +189,105 @@ def scrape_news_and_save_to_db():
             for news in news_entries:
                 print(repr(news), file=outfile)
 
-        for news in target_news:
+        for news in pipeline.stored_entries:
             print(repr(news))
 
     msg = (
         "Recorded %d news out of total %d news. Elapsed time: %f seconds"
-        % (len(target_news), len(news_entries), timer() - start_time)
+        % (pipeline.target_count, pipeline.news_count, timer() - start_time)
     )
     logging.info(msg)
 
+    scraper_metrics.write_reports(
+        METRICS_CONFIG["json_file"], METRICS_CONFIG["prometheus_file"],
+        news_count=pipeline.news_count, target_count=pipeline.target_count,
+        duplicate_count=clusterer.duplicate_count if clusterer is not None else 0,
+    )
 
-def _scrape_news_data_and_set_rules(scraping_rules):
-    """Retrieve news entries from the Internet, and set scraping rules to them.
-    """
-    feeds = _scrape_registered_news_by_rss()
-    news_entries = tuple(entry for feed in feeds for entry in feed.entries)
-    for news in news_entries:
-        news.set_rules(scraping_rules)
 
-    return news_entries
+def sync_scraping_rules(db_api, rules_from_file):
+    """Update rules in DB by rules from file, and rescore news in DB if they have changed.
 
+    Args:
+        db_api (db_news_api.NewsDatabaseAPI): The API of the DB.
+        rules_from_file (scraping_rules_compiler.CompiledRuleSet): Rules from the rule file.
 
-def _save_scraping_rules_to_db(db_api, scraping_rules):
-    for rule in scraping_rules:
-        db_api.store_a_scraping_rule(rule)
+    """
+    rules_from_db = db_api.get_scraping_rules()
 
+    # If rules have changed ==> update scores in DB
+    if set(rules_from_file.rules) != set(rules_from_db.values()):
+        logging.info("ScrapingRules have changed. Update rules in DB.")
+        _update_scraping_rules_in_db(db_api, rules_from_file, rules_from_db.values())
 
-def _update_scores_for_news_in_db(db_api, new_rules_to_apply):
-    """Update scores with scraping rules for all news data in DB.
-    """
-    rules_from_db = db_api.get_scraping_rules()  # read from db again to get id
-    rule_id_map = {value: key for key, value in rules_from_db.items()}
 
-    news_from_db = db_api.get_news_data_and_setup_rule(new_rules_to_apply)
+def _update_scraping_rules_in_db(db_api, rules_from_file, rules_from_db):
+    """Replace rules in DB which are removed or changed in the file, and add new rules.
 
-    for news_id, news in news_from_db.items():
-        for rule, score in news.rule_score_map.items():
-            rule_id = rule_id_map[rule]
-            db_api.setup_news_rule_relationship(news_id, rule_id, score)
+    Scores of news by unchanged rules are kept.
+    """
+    file_rules_by_name = {rule.name: rule for rule in rules_from_file}
+    db_rules_by_name = {rule.name: rule for rule in rules_from_db}
+
+    stale_rule_names = [
+        name for name, rule in db_rules_by_name.items()
+        if file_rules_by_name.get(name) != rule
+    ]
+    new_rules = [
+        rule for name, rule in file_rules_by_name.items()
+        if db_rules_by_name.get(name) != rule
+    ]
+    logging.info(
+        "Remove %d rules from DB, and add %d rules.", len(stale_rule_names), len(new_rules)
+    )
 
+    with db_api.transaction():
+        for rule_name in stale_rule_names:
+            db_api.remove_a_scraping_rule(rule_name)
 
-def _save_news_data_to_db(db_api, news_entries):
-    for news in news_entries:
-        db_api.store_a_news_data(news)
+        _save_scraping_rules_to_db(db_api, new_rules)
 
+        _update_scores_for_news_in_db(db_api, new_rules)
 
-def _scrape_registered_news_by_rss(
-        num_of_workers=SCRAPER_CONFIG["max_workers"],
-        worker_timeout=SCRAPER_CONFIG["rss_worker_timeout"]):
-    """Retrieve RSS news from the Internet with a thread pool.
-    """
 
-    with futures.ThreadPoolExecutor(max_workers=num_of_workers) as executor:
-        future_map = {}
+def _save_scraping_rules_to_db(db_api, scraping_rules):
+    for rule in scraping_rules:
+        db_api.store_a_scraping_rule(rule)
 
-        # For each registered news source, put it into thread pool
-        news_sources = get_news_source_registry()
-        for news_source_class in news_sources.values():
-            news_src = news_source_class()
 
-            for category in news_src.categories:
-                future_obj = executor.submit(news_src.get_raw_feed_object, category)
-                future_map[future_obj] = (news_src, category)
+def _update_scores_for_news_in_db(db_api, new_rules_to_apply):
+    """Update scores with scraping rules for news data in DB.
 
-        msg = "Retrieving %d RSS feeds concurrently." % len(future_map)
-        logging.info(msg)
+    Every news in DB gets a score by every rule. If ``db_api`` has a news
+    index, only the news which may get a non-zero score by the rules are read
+    and rescored, and the others get a score of zero without being read.
+    Otherwise, all news are read and rescored.
+    """
+    rules_from_db = db_api.get_scraping_rules()  # read from db again to get id
+    rule_id_map = {value: key for key, value in rules_from_db.items()}
 
-        done_iter = futures.as_completed(future_map, timeout=worker_timeout)
+    if db_api.news_index is None:
+        news_from_db = db_api.get_news_data_and_setup_rule(new_rules_to_apply)
+    else:
+        candidate_ids = set().union(
+            *(db_api.news_index.candidates_of_rule(rule) for rule in new_rules_to_apply)
+        )
+        logging.info(
+            "Rescore %d out of %d news in DB.", len(candidate_ids), len(db_api.news_index)
+        )
+        news_from_db = db_api.get_news_data_by_ids(candidate_ids, new_rules_to_apply)
 
-        try:
-            for future_obj in done_iter:
-                news_src, category = future_map[future_obj]
-                url = news_src.get_rss_url(category)
-                try:
-                    raw_feed = future_obj.result()
-                except HTTPError as err:
-                    scraper_utils.log_warning(
-                        "HTTP Error %d for RSS feed '%s'" % (err.code, url)
-                    )
-                except URLError as err:
-                    scraper_utils.log_warning(
-                        "URL Error [%s] for RSS feed '%s'" % (err.reason, url)
-                    )
-                else:
-                    yield news_src.parse_feed(raw_feed, category)
+        db_api.store_news_rule_scores(
+            (news_id, rule_id_map[rule], 0)
+            for news_id in db_api.news_index.news_ids - candidate_ids
+            for rule in new_rules_to_apply
+        )
 
-        except futures.TimeoutError as err:
-            scraper_utils.log_warning("Timeout in news_collector: %s" % str(err))
+    db_api.store_news_rule_scores(
+        (news_id, rule_id_map[rule], score)
+        for news_id, news in news_from_db.items()
+        for rule, score in news.rule_scores()
+    )
 
 
 if __name__ == '__main__':
@@ -0,0 +1,320 @@
+"""This module crawls news by workers which share a job queue (See ``job_queue.py``).
+
+    coordinator:  feed jobs --------------------------> score --> store
+                      |                                  ^   (NewsPipeline, NewsDatabaseWriter)
+                      v                                  |
+    workers:      fetch feed --> article jobs --> fetch news content
+
+The coordinator of a run puts a "feed" job for each feed of the registered
+news sources. A worker retrieves the feed, and returns its entries. The
+coordinator clusters the news by titles, and puts an "article" job for each
+news to retrieve. A worker retrieves the content of the news, and returns it.
+The coordinator scores the news, and stores news of interest by its single
+DB writer.
+
+Workers may run in several processes on several hosts (See
+``distributed_crawl.py``). A job which fails is retried by any worker, and a
+job whose worker dies is leased again after its lease expires.
+
+Example:
+    .. code-block:: python
+
+        # On each worker thread
+        run_worker(JobQueue(conn, backend), "host-1:1234:0")
+
+        # On the coordinator
+        with NewsDatabaseWriter(db_api) as db_writer:
+            pipeline = NewsPipeline(rules, db_writer, StoryClusterer())
+            CrawlCoordinator(job_queue, pipeline).run(get_news_source_registry())
+
+"""
+# Standard library
+import logging
+import time
+import uuid
+from timeit import default_timer as timer
+# Local modules
+import scraper_utils
+from news_sources import get_news_source_registry
+from rss_xml_reader import FeedDict
+from settings import DISTRIBUTED_CONFIG
+
+# Fields of a feed entry which feed parsers read
+_ENTRY_FIELDS = ("title", "link", "description", "published")
+
+
+def handle_job(job):
+    """Do a job of the crawl.
+
+    Args:
+        job (job_queue.Job): A "feed" or "article" job.
+
+    Returns:
+        dict: The result of the job.
+
+    Raises:
+        scraper_utils.NewsScrapperError: If the job is of an unknown kind
+            or news source.
+
+    """
+    news_source_class = get_news_source_registry().get(job.payload["source"])
+    if news_source_class is None:
+        raise scraper_utils.NewsScrapperError(
+            "Unknown news source '%s'." % job.payload["source"]
+        )
+    news_src = news_source_class()
+
+    if job.kind == "feed":
+        raw_feed = news_src.get_raw_feed_object(job.payload["category"])
+        return {
+            "feed_link": raw_feed.feed.link,
+            "entries": [
+                {name: getattr(entry, name) for name in _ENTRY_FIELDS if hasattr(entry, name)}
+                for entry in raw_feed.entries
+            ],
+        }
+
+    if job.kind == "article":
+        return {"content": news_src.feed_parser.get_news_content(FeedDict(job.payload["entry"]))}
+
+    raise scraper_utils.NewsScrapperError("Unknown kind of job '%s'." % job.kind)
+
+
+def run_worker(job_queue, worker_id, stop_event=None,
+               poll_interval=DISTRIBUTED_CONFIG["poll_interval"],
+               max_db_retry_delay=DISTRIBUTED_CONFIG["max_db_retry_delay"],
+               max_db_errors=DISTRIBUTED_CONFIG["max_db_errors"]):
+    """Lease and do jobs until stopped.
+
+    An error of the job queue (e.g. the DB is restarting) is logged, and the
+    operation is retried after a delay, which doubles with each error in a row.
+
+    Args:
+        job_queue (job_queue.JobQueue): The shared queue.
+
+        worker_id (str): Identity of the worker, unique among all hosts.
+
+        stop_event (threading.Event, optional): Set to stop the worker after
+            its current job. Defaults to None (run forever).
+
+        poll_interval (float, optional): Seconds to wait when no job is available,
+            and before the first retry after an error of the job queue.
+
+        max_db_retry_delay (float, optional): Maximum seconds to wait before a retry.
+
+        max_db_errors (int, optional): Number of errors of the job queue in a
+            row, after which the last error is raised, e.g. to reconnect to DB.
+
+    """
+    db_errors = 0
+
+    while not _is_stopped(stop_event):
+        try:
+            job = job_queue.lease(worker_id)
+        except Exception as err:  # pylint: disable=broad-except
+            db_errors = _wait_after_db_error(
+                err, "lease a job", db_errors, stop_event,
+                poll_interval, max_db_retry_delay, max_db_errors
+            )
+            continue
+
+        db_errors = 0
+        if job is None:
+            _wait(stop_event, poll_interval)
+            continue
+
+        try:
+            result = handle_job(job)
+            error = None
+        except Exception as err:  # pylint: disable=broad-except
+            # Logged by the coordinator if the job fails for good
+            logging.debug("Job %d (attempt %d) failed: %s", job.id, job.attempts, err)
+            result = None
+            error = "%s: %s" % (err.__class__.__name__, str(err))
+
+        # Otherwise the job is done again by another worker after its lease expires.
+        while not _is_stopped(stop_event):
+            try:
+                if error is not None:
+                    job_queue.fail(job, error)
+                elif not job_queue.complete(job, result):
+                    scraper_utils.log_warning(
+                        "Lease of job %d is lost. Its result is dropped." % job.id
+                    )
+            except Exception as err:  # pylint: disable=broad-except
+                db_errors = _wait_after_db_error(
+                    err, "finish job %d" % job.id, db_errors, stop_event,
+                    poll_interval, max_db_retry_delay, max_db_errors
+                )
+            else:
+                db_errors = 0
+                break
+
+
+def _is_stopped(stop_event):
+    return stop_event is not None and stop_event.is_set()
+
+
+def _wait(stop_event, seconds):
+    if stop_event is None:
+        time.sleep(seconds)
+    else:
+        stop_event.wait(seconds)
+
+
+def _wait_after_db_error(err, action, db_errors, stop_event,
+                         poll_interval, max_db_retry_delay, max_db_errors):
+    """Log an error of the job queue, and wait before a retry.
+
+    Returns:
+        int: Number of errors in a row, including this one.
+
+    Raises:
+        Exception: ``err``, if there have been ``max_db_errors`` errors in a row.
+
+    """
+    db_errors += 1
+    scraper_utils.log_warning(
+        "Fail to %s (error %d in a row): %s: %s"
+        % (action, db_errors, err.__class__.__name__, str(err))
+    )
+    if db_errors >= max_db_errors:
+        raise err
+
+    _wait(stop_event, min(poll_interval * 2 ** (db_errors - 1), max_db_retry_delay))
+    return db_errors
+
+
+class CrawlCoordinator(object):
+    """Puts jobs of a run to the queue, and passes the news retrieved by workers to a pipeline.
+
+    Args:
+        job_queue (job_queue.JobQueue): The shared queue. It is used only by
+            the thread of ``run()``.
+
+        pipeline (news_pipeline.NewsPipeline): The pipeline to score and store
+            news by ``NewsPipeline.score_a_news()``. Its clusterer is used to
+            skip retrieving near-duplicates by title.
+
+        poll_interval (float, optional): Seconds to wait when no job has finished.
+
+        run_timeout (float, optional): Seconds to wait for all jobs. Jobs which
+            are not finished by then are removed from the queue.
+
+    Attributes:
+        run_id (str): Id of the jobs of this run.
+
+    """
+
+    def __init__(self, job_queue, pipeline,
+                 poll_interval=DISTRIBUTED_CONFIG["poll_interval"],
+                 run_timeout=DISTRIBUTED_CONFIG["run_timeout"]):
+        self.job_queue = job_queue
+        self.pipeline = pipeline
+        self.poll_interval = poll_interval
+        self.run_timeout = run_timeout
+        self.run_id = uuid.uuid4().hex
+
+        self._feeds = {}  # Id of a feed job ==> (name, news source, category)
+        self._news = {}  # Id of an article job ==> news
+        self._entries = {}  # Duplicate by title ==> (name, feed entry)
+
+    def run(self, news_sources):
+        """Crawl all feeds of news sources by workers, and stream their news to the pipeline.
+
+        Args:
+            news_sources (dict): Registry of news source classes,
+                as returned by ``news_sources.get_news_source_registry()``.
+                Workers look up news sources in the registry by name.
+
+        """
+        start_time = timer()
+        for name, news_source_class in news_sources.items():
+            news_src = news_source_class()
+            job_ids = self.job_queue.put_many(
+                self.run_id, "feed",
+                ({"source": name, "category": category} for category in news_src.categories)
+            )
+            for job_id, category in zip(job_ids, news_src.categories):
+                self._feeds[job_id] = (name, news_src, category)
+
+        logging.info("Queued %d RSS feeds as run %s.", len(self._feeds), self.run_id)
+
+        try:
+            while self._feeds or self._news:
+                if timer() - start_time > self.run_timeout:
+                    scraper_utils.log_warning(
+                        "Timeout of run %s: %d feeds and %d news are dropped."
+                        % (self.run_id, len(self._feeds), len(self._news))
+                    )
+                    break
+
+                self.job_queue.expire_leases()
+                jobs = self.job_queue.take_finished(self.run_id)
+                for job in jobs:
+                    self._handle_finished_job(job)
+
+                if not jobs:
+                    time.sleep(self.poll_interval)
+        finally:
+            # Nothing of this run is left for workers.
+            self.job_queue.cancel(self.run_id)
+
+        logging.info(
+            "Run %s completed in %f seconds: %d news, %d of interest.", self.run_id,
+            timer() - start_time, self.pipeline.news_count, self.pipeline.target_count
+        )
+
+    def _handle_finished_job(self, job):
+        if job.kind == "feed":
+            name, news_src, category = self._feeds.pop(job.id)
+            if job.state == "failed":
+                scraper_utils.log_warning(
+                    "Fail to get RSS feed '%s' after %d attempts: %s"
+                    % (news_src.get_rss_url(category), job.attempts, job.error)
+                )
+            else:
+                self._queue_news_of_feed(name, news_src, category, job.result)
+
+        else:
+            news = self._news.pop(job.id)
+            if job.state == "failed":
+                scraper_utils.log_warning(
+                    "Fail to get the content of %s after %d attempts: %s"
+                    % (str(news), job.attempts, job.error)
+                )
+                new_representative = self.pipeline.reelect_representative(news)
+                if new_representative is not None:
+                    name, entry = self._entries.pop(new_representative)
+                    self._queue_news(name, [entry], [new_representative])
+            else:
+                news.description = job.result["content"]
+                self.pipeline.score_a_news(news, True)
+
+    def _queue_news_of_feed(self, name, news_src, category, feed_result):
+        """Put an article job for each news of a feed, except near-duplicates by title.
+        """
+        clusterer = self.pipeline.clusterer
+        entries = []
+        news_to_fetch = []
+        for entry in feed_result["entries"]:
+            news = news_src.feed_parser.get_news_entry(
+                FeedDict(entry), feed_result["feed_link"], category
+            )
+            if clusterer is not None and clusterer.add_by_title(news):
+                # Retrieved instead if its representative can not be retrieved.
+                self._entries[news] = (name, entry)
+                self.pipeline.score_a_news(news, False)
+                continue
+
+            entries.append(entry)
+            news_to_fetch.append(news)
+
+        self._queue_news(name, entries, news_to_fetch)
+
+    def _queue_news(self, name, entries, news_to_fetch):
+        job_ids = self.job_queue.put_many(
+            self.run_id, "article",
+            ({"source": name, "entry": entry} for entry in entries)
+        )
+        self._news.update(zip(job_ids, news_to_fetch))
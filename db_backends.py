@@ -0,0 +1,49 @@
+"""This module opens the database selected by ``settings.DATABASE_CONFIG["backend"]``.
+
+Backends:
+    * ``"postgresql"``: The PostgreSQL database of my_focus_news, opened by
+      ``db_operation_api.mydb.get_database()``.
+    * ``"sqlite"``: An embedded SQLite database (``db_sqlite.SQLiteDatabase``)
+      in the file ``DATABASE_CONFIG["sqlite_file"]``, which needs no server.
+
+Example:
+    .. code-block:: python
+
+        with get_database(DATABASE_CONFIG) as conn:
+            db_api = NewsDatabaseAPI(conn)
+
+"""
+# Local modules
+import scraper_utils
+
+
+def get_database(config):
+    """Open the database of a config.
+
+    Args:
+        config (dict): Database settings, in the form of ``settings.DATABASE_CONFIG``.
+
+    Returns:
+        A context manager which gives a connection for ``NewsDatabaseAPI``.
+
+    Raises:
+        scraper_utils.NewsScrapperError: If the backend is unknown.
+
+    """
+    backend = get_backend_name(config)
+
+    if backend == "sqlite":
+        from db_sqlite import SQLiteDatabase
+        return SQLiteDatabase(config["sqlite_file"])
+
+    if backend == "postgresql":
+        from db_operation_api.mydb import get_database as get_postgres_database
+        return get_postgres_database(config)
+
+    raise scraper_utils.NewsScrapperError("Unknown database backend '%s'." % backend)
+
+
+def get_backend_name(config):
+    """Get the backend of a config. Defaults to "postgresql".
+    """
+    return config.get("backend", "postgresql")
@@ -0,0 +1,329 @@
+"""Verify that the tables used by ``news_scraper`` have the indexes its queries need.
+
+The tables are created by the separate project my_focus_news, so this module
+inspects the PostgreSQL catalog, reports indexes missing for the query patterns
+of ``db_news_api``, and can create them with ``CREATE INDEX CONCURRENTLY``.
+It can also time each hot query with ``EXPLAIN ANALYZE``, so that regressions
+can be seen.
+
+Example:
+    This module can be executed directly:
+
+    .. code-block:: console
+
+        $ python db_indexes.py                  # Report missing indexes
+        $ python db_indexes.py --create         # Create missing indexes
+        $ python db_indexes.py --explain        # Time hot queries
+        $ python db_indexes.py --explain --report explain_history.jsonl
+
+Attributes:
+    REQUIRED_INDEXES (tuple(IndexSpec)): Indexes needed by ``db_news_api``.
+
+    CONFLICT_INDEXES (tuple(IndexSpec)): Unique indexes which are the conflict
+        targets of ``ON CONFLICT (...) DO UPDATE`` statements of ``db_news_api``.
+        Without them, the statements fail, so they are checked before news are stored.
+
+    HOT_QUERIES (tuple(HotQuery)): Queries of ``db_news_api`` to time.
+
+"""
+# Standard library
+import argparse
+import json
+from collections import namedtuple
+from datetime import datetime
+# PyPI
+import psycopg2
+# Local modules
+import scraper_utils
+from db_session import PostgresSession
+from db_sqlite import SQLiteDatabase
+from settings import DATABASE_CONFIG
+
+IndexSpec = namedtuple("IndexSpec", ("table", "columns", "unique", "reason"))
+HotQuery = namedtuple("HotQuery", ("name", "query", "sample_query", "is_write"))
+
+CONFLICT_INDEXES = (
+    IndexSpec("shownews_scoremap", ("news_id", "rule_id"), True,
+              "ON CONFLICT (news_id, rule_id) DO UPDATE of scores"),
+)
+
+REQUIRED_INDEXES = (
+    IndexSpec("shownews_newsdata", ("url",), True,
+              "news ids by url, ON CONFLICT of news inserts"),
+    IndexSpec("shownews_newsdata", ("creation_time",), False,
+              "expired news by creation time in get_expired_news_ids()"),
+    IndexSpec("shownews_scrapingrule", ("name",), True,
+              "rule ids by name"),
+    IndexSpec("shownews_newskeyword", ("name", "to_include"), True,
+              "keyword ids by (name, to_include)"),
+    IndexSpec("shownews_newscategory", ("name",), True,
+              "tag ids by name"),
+    IndexSpec("shownews_scrapingrule_keywords", ("scrapingrule_id", "newskeyword_id"), True,
+              "ON CONFLICT of rule-keyword relations"),
+    IndexSpec("shownews_scrapingrule_keywords", ("newskeyword_id",), False,
+              "join of keywords in _get_keywords_info()"),
+    IndexSpec("shownews_scrapingrule_tags", ("scrapingrule_id", "newscategory_id"), True,
+              "ON CONFLICT of rule-tag relations"),
+    IndexSpec("shownews_scrapingrule_tags", ("newscategory_id",), False,
+              "join of tags in _get_tags_info()"),
+    IndexSpec("shownews_newsdata_rules", ("newsdata_id", "scrapingrule_id"), True,
+              "ON CONFLICT of news-rule relations"),
+) + CONFLICT_INDEXES
+
+HOT_QUERIES = (
+    HotQuery(
+        "news id by url",
+        "SELECT url, id FROM shownews_newsdata WHERE url IN (%s);",
+        "SELECT url FROM shownews_newsdata LIMIT 1;",
+        False
+    ),
+    HotQuery(
+        "rule id by name",
+        "SELECT id FROM shownews_scrapingrule WHERE name = %s;",
+        "SELECT name FROM shownews_scrapingrule LIMIT 1;",
+        False
+    ),
+    HotQuery(
+        "keyword id by name",
+        "SELECT id FROM shownews_newskeyword WHERE name = %s AND to_include = %s;",
+        "SELECT name, to_include FROM shownews_newskeyword LIMIT 1;",
+        False
+    ),
+    HotQuery(
+        "keywords of rules",
+        "SELECT rule_kw.scrapingrule_id, kw.name, kw.to_include "
+        "FROM shownews_scrapingrule_keywords AS rule_kw "
+        "INNER JOIN shownews_newskeyword AS kw "
+        "ON rule_kw.newskeyword_id = kw.id;",
+        None,
+        False
+    ),
+    HotQuery(
+        "tags of rules",
+        "SELECT rule_tag.scrapingrule_id, tag.name "
+        "FROM shownews_scrapingrule_tags AS rule_tag "
+        "INNER JOIN shownews_newscategory AS tag "
+        "ON rule_tag.newscategory_id = tag.id;",
+        None,
+        False
+    ),
+    HotQuery(
+        "news-rule relation insert",
+        "INSERT INTO shownews_newsdata_rules (newsdata_id, scrapingrule_id) "
+        "VALUES (%s, %s) ON CONFLICT DO NOTHING;",
+        "SELECT newsdata_id, scrapingrule_id FROM shownews_newsdata_rules LIMIT 1;",
+        True
+    ),
+    HotQuery(
+        "score upsert",
+        "INSERT INTO shownews_scoremap (news_id, rule_id, weight) VALUES (%s, %s, %s) "
+        "ON CONFLICT (news_id, rule_id) DO UPDATE SET weight = EXCLUDED.weight;",
+        "SELECT news_id, rule_id, weight FROM shownews_scoremap LIMIT 1;",
+        True
+    ),
+)
+
+_INDEXES_QUERY = (
+    "SELECT t.relname, i.relname, ix.indisunique, "
+    "ARRAY(SELECT a.attname FROM unnest(ix.indkey) WITH ORDINALITY AS k(attnum, ord) "
+    "      JOIN pg_attribute AS a ON a.attrelid = t.oid AND a.attnum = k.attnum "
+    "      ORDER BY k.ord) "
+    "FROM pg_index AS ix "
+    "JOIN pg_class AS t ON t.oid = ix.indrelid "
+    "JOIN pg_class AS i ON i.oid = ix.indexrelid "
+    "WHERE t.relname = ANY(%s) AND ix.indisvalid;"
+)
+
+
+def find_missing_indexes(conn):
+    """Find required indexes which do not exist.
+
+    An existing index covers a requirement if its leading columns are the
+    required columns. A unique requirement needs a unique index on exactly
+    those columns (in any order).
+
+    Args:
+        conn (db_session.PooledConnection): A DB connection.
+
+    Returns:
+        list(IndexSpec): The missing indexes.
+
+    """
+    tables = sorted({spec.table for spec in REQUIRED_INDEXES})
+    existing = {}  # table ==> [(is_unique, columns)]
+    for table, _, is_unique, columns in conn.execute_sql_command(_INDEXES_QUERY, [tables]):
+        existing.setdefault(table, []).append((is_unique, tuple(columns)))
+
+    return [
+        spec for spec in REQUIRED_INDEXES
+        if not any(_covers(spec, is_unique, columns)
+                   for is_unique, columns in existing.get(spec.table, []))
+    ]
+
+
+def check_conflict_indexes(conn):
+    """Make sure that the unique indexes in ``CONFLICT_INDEXES`` exist.
+
+    A SQLite database is not checked, since its schema has the unique constraints.
+
+    Args:
+        conn (db_operation_api.mydb.MyDB): A DB connection.
+
+    Raises:
+        scraper_utils.NewsScrapperError: If any of the indexes is missing.
+
+    """
+    if isinstance(conn, SQLiteDatabase):
+        return
+
+    missing_indexes = [spec for spec in find_missing_indexes(conn) if spec in CONFLICT_INDEXES]
+    if missing_indexes:
+        raise scraper_utils.NewsScrapperError(
+            "Missing unique indexes: %s. Create them by `python db_indexes.py --create` "
+            "before storing news." % ", ".join(
+                "%s (%s)" % (spec.table, ", ".join(spec.columns)) for spec in missing_indexes
+            )
+        )
+
+
+def _covers(spec, is_unique, columns):
+    if spec.unique:
+        return is_unique and set(columns) == set(spec.columns)
+
+    return columns[:len(spec.columns)] == spec.columns
+
+
+def create_index(conn, spec):
+    """Create an index concurrently, so that writes to the table are not blocked.
+
+    Args:
+        conn (db_session.PooledConnection): A DB connection in autocommit mode.
+        spec (IndexSpec): The index to create.
+
+    """
+    index_name = "%s_%s_%s" % (
+        spec.table, "_".join(spec.columns), "uniq" if spec.unique else "idx"
+    )
+    conn.execute_sql_command(
+        "CREATE %sINDEX CONCURRENTLY IF NOT EXISTS %s ON %s (%s);" % (
+            "UNIQUE " if spec.unique else "",
+            index_name[:63],  # Max length of identifiers in PostgreSQL
+            spec.table,
+            ", ".join(spec.columns)
+        )
+    )
+
+
+def explain_hot_query(conn, hot_query):
+    """Time a hot query by ``EXPLAIN ANALYZE``.
+
+    Parameters of the query are sampled from the DB. Writes are rolled back.
+
+    Args:
+        conn (db_session.PooledConnection): A DB connection.
+        hot_query (HotQuery): The query to time.
+
+    Returns:
+        dict: Planning and execution time in milliseconds, and the scan types,
+            or None if there is no row to sample parameters from.
+
+    """
+    params = None
+    if hot_query.sample_query:
+        rows = conn.execute_sql_command(hot_query.sample_query)
+        if not rows:
+            return None
+        params = list(rows[0])
+
+    explain_query = "EXPLAIN (ANALYZE, FORMAT JSON) " + hot_query.query
+    if hot_query.is_write:
+        # EXPLAIN ANALYZE really executes the statement.
+        conn.execute_sql_command("BEGIN;")
+        try:
+            rows = conn.execute_sql_command(explain_query, params)
+        finally:
+            conn.execute_sql_command("ROLLBACK;")
+    else:
+        rows = conn.execute_sql_command(explain_query, params)
+
+    plan = rows[0][0][0]
+    return {
+        "planning_ms": plan.get("Planning Time"),
+        "execution_ms": plan.get("Execution Time"),
+        "scans": sorted(_find_scan_types(plan["Plan"])),
+    }
+
+
+def _find_scan_types(plan_node):
+    scans = set()
+    if plan_node["Node Type"].endswith("Scan"):
+        scans.add("%s on %s" % (plan_node["Node Type"], plan_node.get("Relation Name")))
+
+    for child in plan_node.get("Plans", []):
+        scans.update(_find_scan_types(child))
+
+    return scans
+
+
+def main():
+    """Report (and optionally create) missing indexes, and time hot queries.
+    """
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--create", action="store_true",
+                            help="create missing indexes concurrently")
+    arg_parser.add_argument("--explain", action="store_true",
+                            help="time hot queries with EXPLAIN ANALYZE")
+    arg_parser.add_argument("--report", metavar="FILE",
+                            help="append the timings to FILE as a JSON line")
+    args = arg_parser.parse_args()
+
+    db_session = PostgresSession(DATABASE_CONFIG, min_connections=1, max_connections=1)
+    try:
+        with db_session.connection() as conn:
+            missing_indexes = find_missing_indexes(conn)
+
+            for spec in missing_indexes:
+                print("[Missing] %s (%s)%s -- for %s" % (
+                    spec.table, ", ".join(spec.columns),
+                    " UNIQUE" if spec.unique else "", spec.reason
+                ))
+                if args.create:
+                    try:
+                        create_index(conn, spec)
+                    except psycopg2.Error as err:
+                        # e.g. duplicated rows prevent a unique index.
+                        print("          Fail to create: %s" % str(err).strip())
+                    else:
+                        print("          Created.")
+
+            if not missing_indexes:
+                print("All required indexes exist.")
+
+            if args.explain:
+                _explain_all_hot_queries(conn, args.report)
+    finally:
+        db_session.close()
+
+
+def _explain_all_hot_queries(conn, report_file):
+    timings = {}
+    for hot_query in HOT_QUERIES:
+        result = explain_hot_query(conn, hot_query)
+        timings[hot_query.name] = result
+
+        if result is None:
+            print("[Explain] %-28s skipped (no sample row)" % hot_query.name)
+        else:
+            print("[Explain] %-28s plan %8.3f ms  exec %8.3f ms  %s" % (
+                hot_query.name, result["planning_ms"], result["execution_ms"],
+                ", ".join(result["scans"])
+            ))
+
+    if report_file:
+        with open(report_file, "a") as outfile:
+            record = {"time": datetime.now().isoformat(), "timings": timings}
+            print(json.dumps(record, ensure_ascii=False), file=outfile)
+
+
+if __name__ == "__main__":
+    main()
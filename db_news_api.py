@@ -3,34 +3,159 @@
 Example:
     .. code-block:: python
 
-        with scraper_models.get_database(DATABASE_CONFIG) as conn:
+        with get_database(DATABASE_CONFIG) as conn:
             db_api = NewsDatabaseAPI(conn, table_prefix="my_focus_news")
             rules = db_api.get_scraping_rules()
             print(rules)
 
 """
-import logging
+import json
+from contextlib import contextmanager
 from datetime import datetime
 # PyPI
 import pytz
-from psycopg2 import IntegrityError
 # Local modules
 from scraper_models import NewsRSSEntry, ScrapingRule
+from scraping_rules_compiler import compile_rules
+import scraper_metrics
 import scraper_utils
 
+# Maximum number of rows (or values in an IN list) in one SQL statement
+_BULK_CHUNK_SIZE = 500
+
+# Unique fields of tables, used as the conflict target of upserts
+_SCOREMAP_KEY = ("news_id", "rule_id")
+
+# Tables whose ids are cached, and the fields identifying an entry in them
+_ID_CACHE_KEYS = {
+    "scrapingrule": ("name",),
+    "newskeyword": ("name", "to_include"),
+    "newscategory": ("name",),
+}
+
+
+# Definitions of rules which the shownews tables can not keep (include groups,
+# include_any and ensure_times_lower). The table is owned by the scraper.
+_RULE_DEFINITIONS_TABLE = "scraper_rule_definitions"
+_RULE_DEFINITIONS_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS scraper_rule_definitions ("
+    "name TEXT PRIMARY KEY, definition TEXT NOT NULL);"
+)
+
+
+def _ensure_autocommit(conn):
+    if hasattr(conn, "autocommit"):
+        if not conn.autocommit:
+            raise scraper_utils.NewsScrapperError(
+                "The database connection should be in autocommit mode."
+            )
+        return
+
+    # db_operation_api.mydb.MyDB wraps a psycopg2 connection, whose mode is set here.
+    raw_conn = getattr(conn, "conn", None)
+    if raw_conn is None or not hasattr(raw_conn, "autocommit"):
+        raise scraper_utils.NewsScrapperError(
+            "Cannot tell whether the database connection is in autocommit mode."
+        )
+    raw_conn.autocommit = True
+
+
+def _chunks(items, size=None):
+    size = size or _BULK_CHUNK_SIZE
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
 
 class NewsDatabaseAPI(object):
     """This class provides APIs to manipulate models in the database.
 
+    Ids of rules, keywords and tags are cached once they are read from or
+    inserted into the DB by this object, since they almost never change.
+
+    All writes are ``INSERT ... ON CONFLICT`` statements, so duplicates never
+    cause errors, and each batch of writes is done in one transaction.
+
+    The connection must provide:
+        * ``execute_sql_command(sql_command, params=None)``: Execute a statement
+          with ``%s`` placeholders and a sequence of parameters, and return all
+          result rows (as a list of tuples) if it returns rows, including those
+          of ``INSERT ... RETURNING`` and ``UPDATE ... RETURNING``. Otherwise,
+          it may return None.
+        * Autocommit mode: each statement is committed at once, unless it is
+          inside ``BEGIN``/``COMMIT`` (See ``transaction()``). A connection
+          whose ``autocommit`` attribute is False is rejected, since its
+          implicit transactions would never be committed. A connection without
+          the attribute should wrap a psycopg2 connection as ``conn``, which is
+          switched to autocommit mode; otherwise, it is rejected.
+        * ``get_fields_by_conditions()``, ``table_already_exists()``,
+          ``reset_table()`` and ``update_table()``, as ``db_operation_api.mydb.MyDB``.
+        * ``execute_prepared(sql_command, params=None)``, optionally: the same as
+          ``execute_sql_command()``, by a server-side prepared statement.
+
+    ``db_sqlite.SQLiteDatabase`` and ``db_session.PooledConnection`` provide them.
+
     Args:
         conn (db_operation_api.mydb.MyDB): A database connection.
 
+        news_index (news_index.NewsInvertedIndex, optional): An inverted index
+            which is kept up to date when news are stored or deleted.
+
+    Raises:
+        scraper_utils.NewsScrapperError: If the connection is not in autocommit mode,
+            or its mode is unknown.
+
     """
     _table_prefix = "shownews_"
 
-    def __init__(self, conn):
+    def __init__(self, conn, news_index=None):
+        _ensure_autocommit(conn)
+
         self.conn = conn
+        self.news_index = news_index
+        self._id_cache = {}  # table_name ==> {key fields ==> id}
+        self._transaction_depth = 0
+
+    @contextmanager
+    def transaction(self):
+        """Run the statements inside the ``with`` block in one transaction.
+
+        The transaction is controlled by ``BEGIN``/``COMMIT`` statements, which
+        needs the connection to be in autocommit mode (See the class docstring).
+        Nested ``transaction()`` blocks join the outermost transaction.
+        The transaction is rolled back if an exception is raised.
+
+        Example:
+            .. code-block:: python
 
+                with db_api.transaction():
+                    db_api.store_a_scraping_rule(rule1)
+                    db_api.store_a_scraping_rule(rule2)
+
+        """
+        if self._transaction_depth:
+            self._transaction_depth += 1
+            try:
+                yield
+            finally:
+                self._transaction_depth -= 1
+            return
+
+        self._execute("BEGIN;")
+        self._transaction_depth = 1
+        try:
+            yield
+        except BaseException:
+            self._transaction_depth = 0
+            self._execute("ROLLBACK;")
+            # Ids inserted in the transaction may have been rolled back.
+            self._id_cache.clear()
+            raise
+        else:
+            self._transaction_depth = 0
+            self._execute("COMMIT;")
+
+    @scraper_metrics.measured("db")
     def get_news_data_and_setup_rule(self, scraping_rules):
         """Read news data from DB and set scraping_rules to them.
 
@@ -44,6 +169,7 @@ class NewsDatabaseAPI(object):
                 <Value>: An instance of ``NewsRSSEntry``.
 
         """
+        scraping_rules = compile_rules(scraping_rules)
         rows = self.conn.get_fields_by_conditions(
             "shownews_newsdata",
             ("id", "title", "content", "url", "time",)
@@ -54,6 +180,46 @@ class NewsDatabaseAPI(object):
             for id, title, content, url, pub_time in rows
         }
 
+    @scraper_metrics.measured("db")
+    def get_news_data_by_ids(self, news_ids, scraping_rules=None):
+        """Read some news from DB, and set scraping_rules to them.
+
+        Args:
+            news_ids (Iterable(int)): Ids of the news to read.
+            scraping_rules (Iterable(ScrapingRule), optional): Scraping_rules to
+                set to the news. Defaults to None.
+
+        Returns:
+            dict: A dict that maps id to a news (``NewsRSSEntry``).
+
+        """
+        if scraping_rules is not None:
+            scraping_rules = compile_rules(scraping_rules)
+
+        news_map = {}
+        for ids_chunk in _chunks(news_ids):
+            query = (
+                "SELECT id, title, content, url, time FROM shownews_newsdata "
+                "WHERE id IN (%s);" % ", ".join(["%s"] * len(ids_chunk))
+            )
+            for news_id, title, content, url, pub_time in self._execute(query, ids_chunk):
+                news_map[news_id] = NewsRSSEntry(
+                    title, content, url, pub_time, '', rules=scraping_rules
+                )
+
+        return news_map
+
+    @scraper_metrics.measured("db")
+    def get_news_ids(self):
+        """Get ids of all news in DB.
+
+        Returns:
+            list(int): The ids.
+
+        """
+        return [row[0] for row in self._execute("SELECT id FROM shownews_newsdata;")]
+
+    @scraper_metrics.measured("db")
     def get_scraping_rules(self):
         """Read scraping rules from DB.
 
@@ -74,43 +240,212 @@ class NewsDatabaseAPI(object):
             ("*",)
         )
 
-        rules_map = {
-            rule_id: ScrapingRule(name=rule_name, is_active=is_active)
+        # Rules are immutable, so collect their attributes first.
+        rules_info = {
+            rule_id: {
+                "name": rule_name, "is_active": is_active,
+                "included_keywords": set(), "excluded_keywords": set(), "tags": set(),
+            }
             for (rule_id, is_active, rule_name) in rules_rows
         }
 
         for rule_id, keyword_name, to_include in self._get_keywords_info():
-            rules_map[rule_id].add_keyword(keyword_name, to_include)
+            if not isinstance(to_include, bool):
+                raise scraper_utils.NewsScrapperError(
+                    "Field to_include of keyword '%s' is invalid: '%s'"
+                    % (keyword_name, repr(to_include))
+                )
+            key = "included_keywords" if to_include else "excluded_keywords"
+            rules_info[rule_id][key].add(keyword_name)
 
         for rule_id, tag_name in self._get_tags_info():
-            rules_map[rule_id].tags.add(tag_name)
+            rules_info[rule_id]["tags"].add(tag_name)
+
+        self._apply_rule_definitions(rules_info)
 
-        return rules_map
+        return {rule_id: ScrapingRule(**info) for rule_id, info in rules_info.items()}
 
+    @scraper_metrics.measured("db")
     def remove_all_rules_and_relations(self):
         """Remove all scraping rules and relationship with NewsData from DB.
         """
-        # delete relationships
-        self._reset_table("newsdata_rules")
-        self._reset_table("scoremap")
-        self._reset_table("scrapingrule_keywords")
-        self._reset_table("scrapingrule_tags")
-        # delete rules
-        self._reset_table("newskeyword")
-        self._reset_table("newscategory")
-        self._reset_table("scrapingrule")
+        with self.transaction():
+            # delete relationships
+            self._reset_table("newsdata_rules")
+            self._reset_table("scoremap")
+            self._reset_table("scrapingrule_keywords")
+            self._reset_table("scrapingrule_tags")
+            # delete rules
+            self._reset_table("newskeyword")
+            self._reset_table("newscategory")
+            self._reset_table("scrapingrule")
+            if self.conn.table_already_exists(_RULE_DEFINITIONS_TABLE):
+                self._execute("DELETE FROM scraper_rule_definitions;")
+
+        self._id_cache.clear()
+
+    @scraper_metrics.measured("db")
+    def remove_a_scraping_rule(self, rule_name):
+        """Remove a scraping rule, and its relationships with news, keywords and tags.
+
+        Keywords and tags are kept, since they may be used by other rules.
 
+        Args:
+            rule_name (str): Name of the rule to remove.
+
+        """
+        rule_id = self._get_rule_ids().get(rule_name)
+        if rule_id is None:
+            return
+
+        with self.transaction():
+            self._execute("DELETE FROM shownews_scoremap WHERE rule_id = %s;", [rule_id])
+            self._execute(
+                "DELETE FROM shownews_newsdata_rules WHERE scrapingrule_id = %s;", [rule_id]
+            )
+            self._execute(
+                "DELETE FROM shownews_scrapingrule_keywords WHERE scrapingrule_id = %s;",
+                [rule_id]
+            )
+            self._execute(
+                "DELETE FROM shownews_scrapingrule_tags WHERE scrapingrule_id = %s;", [rule_id]
+            )
+            self._execute("DELETE FROM shownews_scrapingrule WHERE id = %s;", [rule_id])
+            if self.conn.table_already_exists(_RULE_DEFINITIONS_TABLE):
+                self._execute(
+                    "DELETE FROM scraper_rule_definitions WHERE name = %s;", [rule_name]
+                )
+
+        self._id_cache.get("scrapingrule", {}).pop((rule_name,), None)
+
+    @scraper_metrics.measured("db")
     def reset_news_data(self):
         """Remove all news data from DB.
         """
         self._reset_table("newsdata")
 
+        if self.news_index is not None:
+            self.news_index.clear()
+
+    @scraper_metrics.measured("db")
+    def get_expired_news_ids(self, created_before=None, keep_newest=None,
+                             limit=_BULK_CHUNK_SIZE):
+        """Get ids of the oldest news which are out of the retention limits.
+
+        Args:
+            created_before (datetime, optional): News created before this time are expired.
+            keep_newest (int, optional): Only this number of the newest news are
+                kept. The others are expired, and the oldest of them are returned first.
+            limit (int, optional): Maximum number of ids to return.
+
+        Returns:
+            list(int): Ids of expired news, sorted by id.
+
+        """
+        ids = set()
+        if created_before is not None:
+            query = (
+                "SELECT id FROM shownews_newsdata WHERE creation_time < %s "
+                "ORDER BY creation_time, id LIMIT %s;"
+            )
+            ids.update(row[0] for row in self._execute(
+                query, [created_before, limit], prepare=True
+            ))
+
+        if keep_newest is not None:
+            # The newest expired news is the first one after the kept news.
+            # It is NULL if no news is expired, so nothing is selected.
+            query = (
+                "SELECT id FROM shownews_newsdata WHERE (creation_time, id) <= ("
+                "    SELECT creation_time, id FROM shownews_newsdata"
+                "    ORDER BY creation_time DESC, id DESC LIMIT 1 OFFSET %s"
+                ") ORDER BY creation_time, id LIMIT %s;"
+            )
+            ids.update(row[0] for row in self._execute(
+                query, [keep_newest, limit], prepare=True
+            ))
+
+        return sorted(ids)[:limit]
+
+    @scraper_metrics.measured("db")
+    def get_news_rows_by_ids(self, news_ids):
+        """Read news and their scores from DB, e.g. to archive them.
+
+        Args:
+            news_ids (Iterable(int)): Ids of news to read.
+
+        Returns:
+            list(dict): Fields of each news, with a ``scores`` dict which maps
+                name of a rule to the score of the news.
+
+        """
+        news_rows = {}
+        for ids_chunk in _chunks(news_ids):
+            placeholders = ", ".join(["%s"] * len(ids_chunk))
+            query = (
+                "SELECT id, title, url, content, time, creation_time "
+                "FROM shownews_newsdata WHERE id IN (%s);" % placeholders
+            )
+            for news_id, title, url, content, pub_time, creation_time in self._execute(
+                    query, ids_chunk):
+                news_rows[news_id] = {
+                    "id": news_id, "title": title, "url": url, "content": content,
+                    "time": pub_time, "creation_time": creation_time, "scores": {},
+                }
+
+            query = (
+                "SELECT score.news_id, rule.name, score.weight "
+                "FROM shownews_scoremap AS score "
+                "INNER JOIN shownews_scrapingrule AS rule ON score.rule_id = rule.id "
+                "WHERE score.news_id IN (%s);" % placeholders
+            )
+            for news_id, rule_name, weight in self._execute(query, ids_chunk):
+                news_rows[news_id]["scores"][rule_name] = weight
+
+        return list(news_rows.values())
+
+    @scraper_metrics.measured("db")
+    def delete_news_data(self, news_ids):
+        """Delete news with their scores and relationships with rules.
+
+        Each chunk of ``_BULK_CHUNK_SIZE`` news is deleted in its own short
+        transaction, so that locks are not held for long.
+
+        Args:
+            news_ids (Iterable(int)): Ids of news to delete.
+
+        """
+        for ids_chunk in _chunks(news_ids):
+            placeholders = ", ".join(["%s"] * len(ids_chunk))
+            with self.transaction():
+                self._execute(
+                    "DELETE FROM shownews_scoremap WHERE news_id IN (%s);" % placeholders,
+                    ids_chunk
+                )
+                self._execute(
+                    "DELETE FROM shownews_newsdata_rules WHERE newsdata_id IN (%s);"
+                    % placeholders,
+                    ids_chunk
+                )
+                self._execute(
+                    "DELETE FROM shownews_newsdata WHERE id IN (%s);" % placeholders,
+                    ids_chunk
+                )
+
+            if self.news_index is not None:
+                self.news_index.remove(ids_chunk)
+
+    @scraper_metrics.measured("db")
     def store_a_scraping_rule(self, rule):
         """Store a scraping rule into DB.
 
         Note that this only stores <rule, keywords, tags> into DB, and does
         not handle relationship with NewsRSSEntry.
 
+        Keywords of ``include_any`` are stored as included keywords, and the
+        whole definition of the rule is kept in the ``scraper_rule_definitions``
+        table, so that the rule is read back as it is.
+
         Args:
             rule (ScrapingRule): The scraping rule to store to DB.
 
@@ -125,18 +460,29 @@ class NewsDatabaseAPI(object):
                 % repr(rule)
             )
 
-        self._insert_data_into_table("scrapingrule", name=rule.name, active=True)
-        rule_id = self._get_id_field("scrapingrule", name=rule.name)
+        with self.transaction():
+            self._insert_data_into_table("scrapingrule", name=rule.name, active=True)
+            rule_id = self._get_id_field("scrapingrule", name=rule.name)
+
+            for tag in rule.tags:
+                self._store_a_tag(tag, rule_id)
 
-        for tag in rule.tags:
-            self._store_a_tag(tag, rule_id)
-            self._insert_data_into_table("newscategory", name=tag)
+            for keyword in rule.included_keywords | rule.include_any:
+                self._store_a_keyword(keyword, to_include=True, rule_id=rule_id)
 
-        for keyword in rule.included_keywords:
-            self._store_a_keyword(keyword, to_include=True, rule_id=rule_id)
+            for keyword in rule.excluded_keywords:
+                self._store_a_keyword(keyword, to_include=False, rule_id=rule_id)
 
-        for keyword in rule.excluded_keywords:
-            self._store_a_keyword(keyword, to_include=False, rule_id=rule_id)
+            self._execute(_RULE_DEFINITIONS_SCHEMA)
+            self._execute(
+                "INSERT INTO scraper_rule_definitions (name, definition) VALUES (%s, %s) "
+                "ON CONFLICT (name) DO UPDATE SET definition = EXCLUDED.definition;",
+                [rule.name, json.dumps({
+                    "include_groups": sorted(sorted(group) for group in rule.include_groups),
+                    "include_any": sorted(rule.include_any),
+                    "ensure_times_lower": rule.ensure_times_lower,
+                }, ensure_ascii=False)]
+            )
 
     def store_a_news_data(self, news):
         """Store a news to DB, and setup score and relationships with ScrapingRules.
@@ -150,29 +496,266 @@ class NewsDatabaseAPI(object):
             scraper_utils.NewsScrapperError: If ``news`` is not instance of NewsRSSEntry.
 
         """
-        if not isinstance(news, NewsRSSEntry):
-            raise scraper_utils.NewsScrapperError(
-                "Parameter 'news' (%s) should be an instance of NewsRSSEntry"
-                % repr(news)
+        self.store_news_data([news])
+
+    @scraper_metrics.measured("db")
+    def store_news_data(self, news_entries, update_contents=False):
+        """Store news to DB, and setup scores and relationships with ScrapingRules in bulk.
+
+        The number of round-trips to the DB does not grow with the number of
+        news and rules (except that every ``_BULK_CHUNK_SIZE`` rows take
+        another statement), and all of them are done in one transaction.
+
+        News are stored by their canonical urls. A news whose url already exists
+        in DB, either canonical or original (as stored before urls were
+        canonicalized), is not stored again, but its scores are updated.
+
+        Note that scrapig rules should have exists in DB before this method is called.
+
+        Args:
+            news_entries (Iterable(NewsRSSEntry)): The news to store to DB.
+
+            update_contents (bool, optional): Whether to update the titles and
+                contents of news which already exist in DB, e.g. when news are
+                extracted again from archived pages. Defaults to False.
+
+        Returns:
+            dict: A dict that maps the link of each news to its id.
+
+        Raises:
+            scraper_utils.NewsScrapperError: If any news is not instance of NewsRSSEntry.
+
+        """
+        news_by_url = {}
+        for news in news_entries:
+            if not isinstance(news, NewsRSSEntry):
+                raise scraper_utils.NewsScrapperError(
+                    "Parameter 'news' (%s) should be an instance of NewsRSSEntry"
+                    % repr(news)
+                )
+            news_by_url.setdefault(news.canonical_link, news)
+
+        if not news_by_url:
+            return {}
+
+        curr_time = datetime.now(pytz.utc)
+
+        with self.transaction():
+            # News stored by their original urls are not stored again by canonical urls.
+            original_urls = {
+                news.link: url for url, news in news_by_url.items() if news.link != url
+            }
+            legacy_id_map = {
+                original_urls[original_url]: news_id
+                for original_url, news_id in self._get_news_ids_by_urls(list(original_urls)).items()
+            }
+            news_id_map = legacy_id_map.copy()
+
+            new_news = [
+                (news.title, url, news.description, news.published_time, curr_time, curr_time)
+                for url, news in news_by_url.items() if url not in news_id_map
+            ]
+            # Only newly inserted news are returned
+            inserted_id_map = dict(self._bulk_insert(
+                "newsdata",
+                ("title", "url", "content", "time", "creation_time", "last_modified_time"),
+                new_news,
+                returning=("url", "id")
+            ))
+            news_id_map.update(inserted_id_map)
+
+            if self.news_index is not None:
+                for url, news_id in inserted_id_map.items():
+                    news = news_by_url[url]
+                    self.news_index.add(
+                        news_id, news.normalized_title, news.normalized_description
+                    )
+
+            existing_urls = [url for url in news_by_url if url not in news_id_map]
+            existing_id_map = self._get_news_ids_by_urls(existing_urls)
+            existing_id_map.update(legacy_id_map)
+            news_id_map.update(existing_id_map)
+
+            if update_contents:
+                self._update_news_contents(
+                    (news_id, news_by_url[url]) for url, news_id in existing_id_map.items()
+                )
+
+            rule_id_map = self._get_rule_ids()
+            score_rows = [
+                (news_id_map[url], rule_id_map[rule.name], score)
+                for url, news in news_by_url.items()
+                for rule, score in news.rule_scores()
+            ]
+            self.store_news_rule_scores(score_rows)
+
+        return {news.link: news_id_map[url] for url, news in news_by_url.items()}
+
+    @scraper_metrics.measured("db")
+    def store_news_rule_scores(self, score_rows):
+        """Set up scores and relationships between news and rules in bulk.
+
+        Scores of pairs of <news, rule> which already exist in DB are updated.
+
+        Args:
+            score_rows (Iterable(tuple(int, int, int))): <news_id, rule_id, score> to store.
+
+        """
+        # A row can not be upserted twice by one statement, so the last score wins.
+        scores = {(news_id, rule_id): score for news_id, rule_id, score in score_rows}
+        if not scores:
+            return
+
+        with self.transaction():
+            self._bulk_insert(
+                "newsdata_rules", ("newsdata_id", "scrapingrule_id"), scores.keys()
+            )
+            self._bulk_insert(
+                "scoremap",
+                _SCOREMAP_KEY + ("weight",),
+                [key + (score,) for key, score in scores.items()],
+                update_on_conflict=_SCOREMAP_KEY
             )
 
+    def _update_news_contents(self, news_items):
         curr_time = datetime.now(pytz.utc)
+        query = (
+            "UPDATE shownews_newsdata SET title = %s, content = %s, last_modified_time = %s "
+            "WHERE id = %s;"
+        )
 
-        self._insert_data_into_table(
-            "newsdata",
-            title=news.title,
-            url=news.link,
-            content=news.description,
-            time=news.published_time,
-            creation_time=curr_time,
-            last_modified_time=curr_time
+        for news_id, news in news_items:
+            self._execute(
+                query, (news.title, news.description, curr_time, news_id), prepare=True
+            )
+
+            if self.news_index is not None:
+                # Grams of the old content stay, and the index is still a superset.
+                self.news_index.add(
+                    news_id, news.normalized_title, news.normalized_description
+                )
+
+    def _get_news_ids_by_urls(self, urls):
+        news_id_map = {}
+        if not urls:
+            return news_id_map
+
+        for urls_chunk in _chunks(urls):
+            query = (
+                "SELECT url, id FROM shownews_newsdata WHERE url IN (%s);"
+                % ", ".join(["%s"] * len(urls_chunk))
+            )
+            news_id_map.update(self._execute(
+                query, urls_chunk, prepare=len(urls_chunk) == _BULK_CHUNK_SIZE
+            ))
+
+        return news_id_map
+
+    def _get_rule_ids(self):
+        return {
+            name: rule_id
+            for (name,), rule_id in self._get_id_cache("scrapingrule").items()
+        }
+
+    def _bulk_insert(self, table_name, columns, rows,
+                     returning=None, update_on_conflict=None):
+        """Insert rows by multi-row ``INSERT ... ON CONFLICT`` statements.
+
+        Args:
+            update_on_conflict (tuple(str), optional): The unique fields.
+                If given, other columns of conflicting rows are updated.
+                Otherwise, conflicting rows are skipped.
+
+        Returns:
+            list: Rows of ``returning`` columns of the inserted (or updated) rows,
+                or an empty list if ``returning`` is not given.
+
+        """
+        table_name = self._add_table_prefix(table_name)
+        row_placeholder = "(%s)" % ", ".join(["%s"] * len(columns))
+        on_conflict = self._get_on_conflict_clause(columns, update_on_conflict)
+        returned_rows = []
+
+        for rows_chunk in _chunks(rows):
+            query = "INSERT INTO {0} ({1}) VALUES {2} {3}".format(
+                table_name,
+                ", ".join(columns),
+                ", ".join([row_placeholder] * len(rows_chunk)),
+                on_conflict
+            )
+            if returning:
+                query += " RETURNING " + ", ".join(returning)
+
+            # Only full chunks are prepared. A statement is prepared for each
+            # number of rows, and the last chunk may have any number of rows.
+            params = [value for row in rows_chunk for value in row]
+            result = self._execute(
+                query + ";", params, prepare=len(rows_chunk) == _BULK_CHUNK_SIZE
+            )
+
+            if returning:
+                returned_rows.extend(result)
+
+        return returned_rows
+
+    @staticmethod
+    def _get_on_conflict_clause(columns, update_on_conflict=None):
+        if not update_on_conflict:
+            return "ON CONFLICT DO NOTHING"
+
+        return "ON CONFLICT ({0}) DO UPDATE SET {1}".format(
+            ", ".join(update_on_conflict),
+            ", ".join(
+                "{0} = EXCLUDED.{0}".format(column)
+                for column in columns if column not in update_on_conflict
+            )
         )
 
-        for rule in news.rule_score_map:
-            news_id = self._get_id_field("newsdata", url=news.link)
-            rule_id = self._get_id_field("scrapingrule", name=rule.name)
-            score = news.rule_score_map[rule]
-            self.setup_news_rule_relationship(news_id, rule_id, score)
+    def _execute(self, query, params=None, prepare=False):
+        """Execute a SQL statement with parameters.
+
+        Args:
+            prepare (bool, optional): Whether this is a hot query which should be
+                a server-side prepared statement, if the connection supports it
+                (as ``db_session.PooledConnection``). Defaults to False.
+
+        Returns:
+            list(tuple): Result rows, or an empty list if the statement returns no rows.
+
+        """
+        if prepare and hasattr(self.conn, "execute_prepared"):
+            rows = self.conn.execute_prepared(query, params)
+        else:
+            rows = self.conn.execute_sql_command(query, params)
+
+        return rows or []
+
+    def _apply_rule_definitions(self, rules_info):
+        """Restore include groups, include_any and ensure_times_lower of rules.
+
+        A definition is ignored if its keywords are not those in the shownews
+        tables (e.g. the rule was edited by the website), so the rule is read
+        as an AND-only rule of its keywords.
+        """
+        if not self.conn.table_already_exists(_RULE_DEFINITIONS_TABLE):
+            return
+
+        definitions = dict(self._execute("SELECT name, definition FROM scraper_rule_definitions;"))
+        for info in rules_info.values():
+            if info["name"] not in definitions:
+                continue
+
+            definition = json.loads(definitions[info["name"]])
+            include_groups = [set(group) for group in definition["include_groups"]]
+            include_any = set(definition["include_any"])
+            if include_any.union(*include_groups) != info["included_keywords"]:
+                continue
+
+            del info["included_keywords"]
+            info.update(
+                include_groups=include_groups, include_any=include_any,
+                ensure_times_lower=definition["ensure_times_lower"]
+            )
 
     def _get_keywords_info(self):
         keywords_query = (
@@ -181,7 +764,7 @@ class NewsDatabaseAPI(object):
             "INNER JOIN shownews_newskeyword AS kw "
             "ON rule_kw.newskeyword_id = kw.id;"
         )
-        return self.conn.execute_sql_command(keywords_query)
+        return self._execute(keywords_query, prepare=True)
 
     def _get_tags_info(self):
         tags_query = (
@@ -190,23 +773,15 @@ class NewsDatabaseAPI(object):
             "INNER JOIN shownews_newscategory AS tag "
             "ON rule_tag.newscategory_id = tag.id;"
         )
-        return self.conn.execute_sql_command(tags_query)
+        return self._execute(tags_query, prepare=True)
 
+    @scraper_metrics.measured("db")
     def setup_news_rule_relationship(self, news_id, rule_id, score):
         """Set up score and relationship between a news and a rule.
-        """
-        self._insert_data_into_table(
-            "newsdata_rules",
-            newsdata_id=news_id,
-            scrapingrule_id=rule_id
-        )
 
-        self._insert_data_into_table(
-            "scoremap",
-            news_id=news_id,
-            rule_id=rule_id,
-            weight=score
-        )
+        The score is updated if the relationship already exists.
+        """
+        self.store_news_rule_scores([(news_id, rule_id, score)])
 
     def _store_a_keyword(self, keyword_name, to_include, rule_id):
         # Insert keyword to table
@@ -239,29 +814,72 @@ class NewsDatabaseAPI(object):
         )
 
     def _get_id_field(self, table_name, **kwargs):
-        table_name = self._add_table_prefix(table_name)
-        rows = self.conn.get_fields_by_conditions(table_name, ("id",), kwargs)
+        cache_key = self._get_id_cache_key(table_name, kwargs)
+        if cache_key is not None:
+            id_cache = self._get_id_cache(table_name)
+            if cache_key in id_cache:
+                return id_cache[cache_key]
+
+        prefixed_table_name = self._add_table_prefix(table_name)
+        query = "SELECT id FROM {0} WHERE {1};".format(
+            prefixed_table_name,
+            " AND ".join("%s = %%s" % field for field in kwargs)
+        )
+        rows = self._execute(query, list(kwargs.values()), prepare=True)
         if rows:
+            if cache_key is not None:
+                id_cache[cache_key] = rows[0][0]
             return rows[0][0]
         else:
             raise scraper_utils.NewsScrapperError(
                 "Can not get entry id from table '{}' with condition {}."
-                .format(table_name, kwargs)
+                .format(prefixed_table_name, kwargs)
+            )
+
+    def _get_id_cache(self, table_name):
+        """Get cached ids of a table. All ids are read by one query at the first time.
+        """
+        if table_name not in self._id_cache:
+            key_fields = _ID_CACHE_KEYS[table_name]
+            query = "SELECT id, {0} FROM {1};".format(
+                ", ".join(key_fields), self._add_table_prefix(table_name)
             )
+            rows = self._execute(query, prepare=True)
+            self._id_cache[table_name] = {tuple(row[1:]): row[0] for row in rows}
+
+        return self._id_cache[table_name]
+
+    @staticmethod
+    def _get_id_cache_key(table_name, conditions):
+        key_fields = _ID_CACHE_KEYS.get(table_name)
+        if key_fields is None or set(conditions) != set(key_fields):
+            return None
+
+        return tuple(conditions[field] for field in key_fields)
 
     def _reset_table(self, table_name):
         table_name = self._add_table_prefix(table_name)
         self.conn.reset_table(table_name)
 
     def _insert_data_into_table(self, table_name, **kwargs):
-        try:
-            table_name = self._add_table_prefix(table_name)
-            self.conn.insert_values_into_table(table_name, kwargs)
-        except IntegrityError as err:
-            if 'duplicate key value violates unique constraint' in str(err):
-                logging.debug(str(err))
-            else:
-                raise
+        """Insert a row, or do nothing if it conflicts with an existing row.
+        """
+        query = "INSERT INTO {0} ({1}) VALUES ({2}) ON CONFLICT DO NOTHING".format(
+            self._add_table_prefix(table_name),
+            ", ".join(kwargs),
+            ", ".join(["%s"] * len(kwargs))
+        )
+
+        cache_key = self._get_id_cache_key(table_name, kwargs)
+        if cache_key is None:
+            self._execute(query + ";", list(kwargs.values()), prepare=True)
+            return
+
+        rows = self._execute(query + " RETURNING id;", list(kwargs.values()), prepare=True)
+
+        # Nothing is returned if the row already exists.
+        if rows and table_name in self._id_cache:
+            self._id_cache[table_name][cache_key] = rows[0][0]
 
     def _update_table_entry(self, table_name, args_map, conditions):
         table_name = self._add_table_prefix(table_name)
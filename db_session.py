@@ -0,0 +1,242 @@
+"""This module provides a long-lived PostgreSQL session for scheduler mode.
+
+``db_operation_api.mydb.get_database()`` opens a new connection for every run.
+When news are collected periodically (by ``schedule.py``), a ``PostgresSession``
+keeps a small pool of connections open between runs instead, and prepares the
+hot queries of ``NewsDatabaseAPI`` on the server once per connection.
+
+Example:
+    .. code-block:: python
+
+        db_session = PostgresSession(DATABASE_CONFIG)
+
+        # For each run
+        with db_session.connection() as conn:
+            db_api = NewsDatabaseAPI(conn)
+            rules = db_api.get_scraping_rules()
+
+        db_session.close()
+
+"""
+# Standard library
+import hashlib
+import itertools
+import logging
+import re
+import threading
+from contextlib import contextmanager
+# PyPI
+import psycopg2
+from psycopg2 import extensions, pool
+# Local modules
+import scraper_utils
+from settings import DB_SESSION_CONFIG
+
+_PLACEHOLDER_PATTERN = re.compile(r"%s")
+
+# Maximum number of prepared statements on a connection. NewsDatabaseAPI only
+# prepares statements of fixed shapes (multi-row statements only for full
+# chunks), so this is a safety net: when it is reached, all are deallocated.
+_MAX_PREPARED_STATEMENTS = 200
+
+
+class _PreparingConnection(extensions.connection):
+    """A psycopg2 connection which remembers statements prepared on it.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements = set()
+
+
+class PostgresSession(object):
+    """A pool of PostgreSQL connections kept open between runs.
+
+    Args:
+        config (dict): Database settings, in the form of ``settings.DATABASE_CONFIG``.
+
+        min_connections (int, optional): Connections opened in advance.
+
+        max_connections (int, optional): Maximum number of connections.
+
+    """
+
+    def __init__(self, config,
+                 min_connections=DB_SESSION_CONFIG["min_connections"],
+                 max_connections=DB_SESSION_CONFIG["max_connections"]):
+        self._pool = pool.ThreadedConnectionPool(
+            min_connections,
+            max_connections,
+            host=config["db_host"],
+            port=config["db_port"],
+            user=config["db_user"],
+            password=config["db_password"],
+            dbname=config["database"],
+            connection_factory=_PreparingConnection
+        )
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        """Check out a healthy connection from the pool.
+
+        Yields:
+            PooledConnection: A connection with the interface of
+                ``db_operation_api.mydb.MyDB`` used by ``NewsDatabaseAPI``.
+
+        """
+        raw_conn = self._get_healthy_connection()
+        broken = False
+        try:
+            yield PooledConnection(raw_conn)
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            if not broken and not raw_conn.closed:
+                self._reset_connection(raw_conn)
+            self._pool.putconn(raw_conn, close=broken or bool(raw_conn.closed))
+
+    def close(self):
+        """Close all connections in the pool.
+        """
+        self._pool.closeall()
+
+    def _get_healthy_connection(self):
+        # Try a fresh connection once if a pooled connection is dead.
+        for _ in range(2):
+            with self._lock:
+                raw_conn = self._pool.getconn()
+
+            try:
+                raw_conn.autocommit = True
+                with raw_conn.cursor() as cursor:
+                    cursor.execute("SELECT 1;")
+                return raw_conn
+
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as err:
+                logging.info("Reconnect to DB since a pooled connection is broken: %s", err)
+                self._pool.putconn(raw_conn, close=True)
+
+        raise scraper_utils.NewsScrapperError("Fail to connect to the database.")
+
+    @staticmethod
+    def _reset_connection(raw_conn):
+        # Roll back what a failed run left behind, but keep prepared statements.
+        if raw_conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            with raw_conn.cursor() as cursor:
+                cursor.execute("ROLLBACK;")
+
+
+class PooledConnection(object):
+    """A connection checked out from ``PostgresSession``.
+
+    Statements are executed in autocommit mode, and transactions are
+    controlled by ``BEGIN``/``COMMIT`` statements (as ``NewsDatabaseAPI.transaction()``).
+
+    Args:
+        raw_conn (psycopg2.extensions.connection): The underlying connection.
+
+    """
+
+    def __init__(self, raw_conn):
+        self.raw_conn = raw_conn
+
+    @property
+    def autocommit(self):
+        """bool: Whether the underlying connection is in autocommit mode."""
+        return self.raw_conn.autocommit
+
+    def execute_sql_command(self, sql_command, params=None):
+        """Execute a SQL statement.
+
+        Returns:
+            list(tuple): Result rows, or None if the statement returns no rows.
+
+        """
+        with self.raw_conn.cursor() as cursor:
+            cursor.execute(sql_command, params)
+            return cursor.fetchall() if cursor.description else None
+
+    def execute_prepared(self, sql_command, params=None):
+        """Execute a SQL statement as a server-side prepared statement.
+
+        The statement is prepared the first time it is executed on this
+        connection, and only ``EXECUTE`` is sent afterwards. Statements are
+        identified by their text, so each distinct text is prepared once. If
+        ``_MAX_PREPARED_STATEMENTS`` have been prepared, all of them are
+        deallocated first.
+
+        Args:
+            sql_command (str): The statement, with ``%s`` placeholders.
+            params (Sequence, optional): Parameters of the statement, one for
+                each placeholder, in order.
+
+        Returns:
+            list(tuple): Result rows (including those of ``... RETURNING``),
+                or None if the statement returns no rows.
+
+        """
+        params = list(params) if params else []
+        name = "news_scraper_" + hashlib.sha1(sql_command.encode("utf-8")).hexdigest()[:16]
+
+        prepared_statements = self.raw_conn.prepared_statements
+
+        if name not in prepared_statements:
+            if len(prepared_statements) >= _MAX_PREPARED_STATEMENTS:
+                self.execute_sql_command("DEALLOCATE ALL;")
+                prepared_statements.clear()
+
+            counter = itertools.count(1)
+            server_side_query = _PLACEHOLDER_PATTERN.sub(
+                lambda _: "$%d" % next(counter), sql_command.rstrip(";")
+            )
+            self.execute_sql_command("PREPARE %s AS %s;" % (name, server_side_query))
+            prepared_statements.add(name)
+
+        if params:
+            query = "EXECUTE %s (%s);" % (name, ", ".join(["%s"] * len(params)))
+        else:
+            query = "EXECUTE %s;" % name
+
+        return self.execute_sql_command(query, params)
+
+    def get_fields_by_conditions(self, table_name, fields, conditions=None):
+        """Select fields of rows matching all conditions (field = value).
+        """
+        query = "SELECT %s FROM %s" % (", ".join(fields), table_name)
+        params = []
+        if conditions:
+            query += " WHERE " + " AND ".join("%s = %%s" % field for field in conditions)
+            params = list(conditions.values())
+
+        return self.execute_sql_command(query + ";", params)
+
+    def table_already_exists(self, table_name):
+        """Whether a table exists in the database.
+        """
+        rows = self.execute_sql_command("SELECT to_regclass(%s);", [table_name])
+        return rows[0][0] is not None
+
+    def reset_table(self, table_name):
+        """Delete all rows of a table.
+        """
+        self.execute_sql_command("DELETE FROM %s;" % table_name)
+
+    def insert_values_into_table(self, table_name, values):
+        """Insert a row given by a dict of <field, value>.
+        """
+        query = "INSERT INTO %s (%s) VALUES (%s);" % (
+            table_name, ", ".join(values), ", ".join(["%s"] * len(values))
+        )
+        self.execute_sql_command(query, list(values.values()))
+
+    def update_table(self, table_name, args_map, conditions):
+        """Update fields given by ``args_map`` of rows matching all conditions.
+        """
+        query = "UPDATE %s SET %s WHERE %s;" % (
+            table_name,
+            ", ".join("%s = %%s" % field for field in args_map),
+            " AND ".join("%s = %%s" % field for field in conditions)
+        )
+        self.execute_sql_command(query, list(args_map.values()) + list(conditions.values()))
@@ -0,0 +1,214 @@
+"""This module provides an embedded SQLite database for ``NewsDatabaseAPI``.
+
+It has the interface of ``db_operation_api.mydb.MyDB`` used by ``NewsDatabaseAPI``,
+and creates the ``shownews_*`` tables (normally created by my_focus_news) and
+their indexes itself, so that news can be collected on a single node without
+a database server.
+
+The database is opened in WAL mode, so readers are not blocked by the writer,
+and ``NewsDatabaseAPI`` batches writes by explicit ``BEGIN``/``COMMIT``.
+
+Example:
+    .. code-block:: python
+
+        with SQLiteDatabase("news_scraper.sqlite3") as conn:
+            db_api = NewsDatabaseAPI(conn)
+            rules = db_api.get_scraping_rules()
+
+"""
+# Standard library
+import re
+import sqlite3
+import threading
+from datetime import datetime
+# PyPI
+import pytz
+
+_PLACEHOLDER_PATTERN = re.compile(r"%s")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS shownews_newsdata (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL,
+    url TEXT NOT NULL UNIQUE,
+    content TEXT NOT NULL,
+    time TIMESTAMP,
+    creation_time TIMESTAMP NOT NULL,
+    last_modified_time TIMESTAMP NOT NULL
+);
+CREATE INDEX IF NOT EXISTS shownews_newsdata_creation_time_idx
+    ON shownews_newsdata (creation_time);
+
+CREATE TABLE IF NOT EXISTS shownews_scrapingrule (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    active BOOLEAN NOT NULL,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS shownews_newskeyword (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    to_include BOOLEAN NOT NULL,
+    UNIQUE (name, to_include)
+);
+
+CREATE TABLE IF NOT EXISTS shownews_newscategory (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS shownews_scrapingrule_keywords (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    scrapingrule_id INTEGER NOT NULL REFERENCES shownews_scrapingrule (id),
+    newskeyword_id INTEGER NOT NULL REFERENCES shownews_newskeyword (id),
+    UNIQUE (scrapingrule_id, newskeyword_id)
+);
+CREATE INDEX IF NOT EXISTS shownews_scrapingrule_keywords_newskeyword_id_idx
+    ON shownews_scrapingrule_keywords (newskeyword_id);
+
+CREATE TABLE IF NOT EXISTS shownews_scrapingrule_tags (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    scrapingrule_id INTEGER NOT NULL REFERENCES shownews_scrapingrule (id),
+    newscategory_id INTEGER NOT NULL REFERENCES shownews_newscategory (id),
+    UNIQUE (scrapingrule_id, newscategory_id)
+);
+CREATE INDEX IF NOT EXISTS shownews_scrapingrule_tags_newscategory_id_idx
+    ON shownews_scrapingrule_tags (newscategory_id);
+
+CREATE TABLE IF NOT EXISTS shownews_newsdata_rules (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    newsdata_id INTEGER NOT NULL REFERENCES shownews_newsdata (id),
+    scrapingrule_id INTEGER NOT NULL REFERENCES shownews_scrapingrule (id),
+    UNIQUE (newsdata_id, scrapingrule_id)
+);
+
+CREATE TABLE IF NOT EXISTS shownews_scoremap (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    news_id INTEGER NOT NULL REFERENCES shownews_newsdata (id),
+    rule_id INTEGER NOT NULL REFERENCES shownews_scrapingrule (id),
+    weight INTEGER NOT NULL,
+    UNIQUE (news_id, rule_id)
+);
+"""
+
+
+def _adapt_datetime(value):
+    # Aware times are stored in UTC, so that they compare correctly as text.
+    if value.tzinfo is not None:
+        value = value.astimezone(pytz.utc)
+    return value.isoformat(" ")
+
+
+def _convert_timestamp(value):
+    return datetime.fromisoformat(value.decode("utf-8"))
+
+
+sqlite3.register_adapter(datetime, _adapt_datetime)
+sqlite3.register_converter("TIMESTAMP", _convert_timestamp)
+sqlite3.register_converter("BOOLEAN", lambda value: bool(int(value)))
+
+
+class SQLiteDatabase(object):
+    """A SQLite database with the interface of ``db_operation_api.mydb.MyDB``.
+
+    Statements are executed in autocommit mode, and transactions are
+    controlled by ``BEGIN``/``COMMIT`` statements (as ``NewsDatabaseAPI.transaction()``).
+    The connection may be used by another thread (as ``db_writer.NewsDatabaseWriter``),
+    but only by one thread at a time.
+
+    Args:
+        filename (str): The database file, or ":memory:" for an in-memory database.
+
+        timeout (float, optional): Seconds to wait for a lock held by another
+            connection. Defaults to 30.
+
+    """
+
+    def __init__(self, filename, timeout=30):
+        self.filename = filename
+        self._conn = sqlite3.connect(
+            filename,
+            timeout=timeout,
+            isolation_level=None,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False
+        )
+        self._lock = threading.RLock()
+
+        self._conn.execute("PRAGMA journal_mode = WAL;")
+        self._conn.execute("PRAGMA synchronous = NORMAL;")
+        self._conn.execute("PRAGMA foreign_keys = ON;")
+        self._conn.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Roll back any unfinished transaction, and close the database.
+        """
+        with self._lock:
+            if self._conn.in_transaction:
+                self._conn.execute("ROLLBACK;")
+            self._conn.close()
+
+    @property
+    def autocommit(self):
+        """bool: Always True, since transactions are controlled by statements."""
+        return True
+
+    def execute_sql_command(self, sql_command, params=None):
+        """Execute a SQL statement with ``%s`` placeholders.
+
+        Returns:
+            list(tuple): Result rows, or None if the statement returns no rows.
+
+        """
+        sql_command = _PLACEHOLDER_PATTERN.sub("?", sql_command)
+        with self._lock:
+            cursor = self._conn.execute(sql_command, list(params) if params else [])
+            return cursor.fetchall() if cursor.description else None
+
+    def get_fields_by_conditions(self, table_name, fields, conditions=None):
+        """Select fields of rows matching all conditions (field = value).
+        """
+        query = "SELECT %s FROM %s" % (", ".join(fields), table_name)
+        params = []
+        if conditions:
+            query += " WHERE " + " AND ".join("%s = %%s" % field for field in conditions)
+            params = list(conditions.values())
+
+        return self.execute_sql_command(query + ";", params)
+
+    def table_already_exists(self, table_name):
+        """Whether a table exists in the database.
+        """
+        rows = self.execute_sql_command(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s;", [table_name]
+        )
+        return bool(rows)
+
+    def reset_table(self, table_name):
+        """Delete all rows of a table.
+        """
+        self.execute_sql_command("DELETE FROM %s;" % table_name)
+
+    def insert_values_into_table(self, table_name, values):
+        """Insert a row given by a dict of <field, value>.
+        """
+        query = "INSERT INTO %s (%s) VALUES (%s);" % (
+            table_name, ", ".join(values), ", ".join(["%s"] * len(values))
+        )
+        self.execute_sql_command(query, list(values.values()))
+
+    def update_table(self, table_name, args_map, conditions):
+        """Update fields given by ``args_map`` of rows matching all conditions.
+        """
+        query = "UPDATE %s SET %s WHERE %s;" % (
+            table_name,
+            ", ".join("%s = %%s" % field for field in args_map),
+            " AND ".join("%s = %%s" % field for field in conditions)
+        )
+        self.execute_sql_command(query, list(args_map.values()) + list(conditions.values()))
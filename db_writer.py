@@ -0,0 +1,154 @@
+"""This module stores news to DB in the background while news are being scraped.
+
+Example:
+    .. code-block:: python
+
+        with NewsDatabaseWriter(db_api) as writer:
+            for feed in feeds:
+                writer.put_many(news for news in feed.entries if news.total_score > 0)
+
+        # All news have been flushed to DB here.
+
+"""
+# Standard library
+import logging
+import queue
+import threading
+# Local modules
+import scraper_utils
+from settings import SCRAPER_CONFIG
+
+# Put into the queue to tell the writer thread to flush and stop.
+_STOP = object()
+
+
+class NewsDatabaseWriter(object):
+    """A write-behind writer which stores news to DB in a dedicated thread.
+
+    News are put into a bounded queue, and written by
+    ``NewsDatabaseAPI.store_news_data()`` in batches. If the DB falls behind,
+    the queue becomes full, and ``put()`` blocks the producers until there is
+    room again.
+
+    Args:
+        db_api (db_news_api.NewsDatabaseAPI): The API to store news with.
+            It should not be used by other threads while the writer is running.
+
+        batch_size (int, optional): Maximum number of news in a batch.
+
+        queue_size (int, optional): Maximum number of news waiting to be written.
+
+        flush_interval (float, optional): Seconds to wait for more news
+            before a partial batch is written.
+
+        update_contents (bool, optional): Whether to update the contents of news
+            which already exist in DB. See ``NewsDatabaseAPI.store_news_data()``.
+
+    Attributes:
+        stored_count (int): Number of news which have been written.
+
+    """
+
+    def __init__(self, db_api,
+                 batch_size=SCRAPER_CONFIG["db_writer_batch_size"],
+                 queue_size=SCRAPER_CONFIG["db_writer_queue_size"],
+                 flush_interval=SCRAPER_CONFIG["db_writer_flush_interval"],
+                 update_contents=False):
+        self.db_api = db_api
+        self.update_contents = update_contents
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.stored_count = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._error = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Flush what has been scraped even if the producer failed.
+        self.close(raise_error=exc_type is None)
+
+    def start(self):
+        """Start the writer thread.
+        """
+        self._thread = threading.Thread(
+            target=self._write_news_in_batches, name="NewsDatabaseWriter", daemon=True
+        )
+        self._thread.start()
+
+    def put(self, news):
+        """Queue a news to be stored. Blocks while the queue is full.
+
+        Args:
+            news (scraper_models.NewsRSSEntry): The news to store.
+
+        """
+        self._queue.put(news)
+
+    def put_many(self, news_entries):
+        """Queue news to be stored. Blocks while the queue is full.
+
+        Args:
+            news_entries (Iterable(scraper_models.NewsRSSEntry)): The news to store.
+
+        """
+        for news in news_entries:
+            self._queue.put(news)
+
+    def close(self, raise_error=True):
+        """Flush all queued news to DB, and stop the writer thread.
+
+        Args:
+            raise_error (bool, optional): Whether to re-raise the first error
+                raised when writing to DB. Defaults to True.
+
+        """
+        if self._thread is None:
+            return
+
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+
+        if self._error is not None and raise_error:
+            raise self._error
+
+    def _write_news_in_batches(self):
+        batch = []
+        stopping = False
+
+        while not stopping:
+            try:
+                news = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                news = None
+
+            if news is _STOP:
+                stopping = True
+            elif news is not None:
+                batch.append(news)
+                if len(batch) < self.batch_size:
+                    continue
+
+            if batch:
+                self._write_a_batch(batch)
+                batch = []
+
+    def _write_a_batch(self, batch):
+        if self._error is not None:
+            # Keep draining the queue so that producers are not blocked forever.
+            return
+
+        try:
+            self.db_api.store_news_data(batch, update_contents=self.update_contents)
+        except Exception as err:  # pylint: disable=broad-except
+            self._error = err
+            scraper_utils.log_warning(
+                "Fail to store %d news to DB: %s" % (len(batch), str(err)), is_error=True
+            )
+        else:
+            self.stored_count += len(batch)
+            logging.debug("Stored %d news to DB.", len(batch))
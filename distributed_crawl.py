@@ -0,0 +1,152 @@
+"""Crawl news by workers on one or more hosts, which share a job queue in DB.
+
+The coordinator collects news as ``collect_news_to_db.py`` does, except that
+feeds and news contents are retrieved by workers (See ``crawl_jobs.py``), and
+it stores the news of interest as the only writer of news to DB. Workers
+only read and write the job queue (See ``job_queue.py``).
+
+With the PostgreSQL backend, workers may run on any host which can connect to
+the database. With the SQLite backend, workers run on the host of the
+database file.
+
+Example:
+    Start workers on each host, and then run the coordinator (e.g. by cron):
+
+    .. code-block:: console
+
+        $ python distributed_crawl.py worker --processes 4 --threads 10
+        $ python distributed_crawl.py coordinator
+
+"""
+# Standard library
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+# Local modules
+import response_archive
+import rss_feed_parsers
+import scraper_utils
+from collect_news_to_db import scrape_news_and_save_to_db
+from crawl_jobs import run_worker
+from db_backends import get_backend_name, get_database
+from job_queue import JobQueue
+from settings import ARCHIVE_CONFIG, DATABASE_CONFIG, DISTRIBUTED_CONFIG, SCRAPER_CONFIG
+
+
+def run_coordinator():
+    """Collect news once, retrieved by the workers.
+    """
+    with get_database(DATABASE_CONFIG) as conn:
+        scrape_news_and_save_to_db(
+            job_queue=JobQueue(conn, get_backend_name(DATABASE_CONFIG))
+        )
+
+
+def run_worker_process(threads):
+    """Run worker threads in this process, each with its own DB connection.
+
+    The threads run until the process is interrupted or terminated. Jobs left
+    by a stopped worker are leased by other workers after their leases expire.
+
+    Args:
+        threads (int): Number of worker threads.
+
+    """
+    signal.signal(signal.SIGTERM, _exit_on_signal)
+    _setup_loggers()
+    if ARCHIVE_CONFIG["capture"]:
+        response_archive.start_capture(ARCHIVE_CONFIG["directory"])
+
+    worker_threads = [
+        threading.Thread(target=_run_worker_thread, args=(index,), daemon=True)
+        for index in range(1, threads)
+    ]
+    for thread in worker_threads:
+        thread.start()
+
+    try:
+        _run_worker_thread(0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Otherwise the HTML parser processes outlive this process.
+        rss_feed_parsers.shutdown_parser_pool()
+
+
+def _run_worker_thread(index):
+    worker_id = "%s:%d:%d" % (socket.gethostname(), os.getpid(), index)
+
+    # run_worker() retries errors of the job queue, and raises after too many in a row.
+    while True:
+        try:
+            with get_database(DATABASE_CONFIG) as conn:
+                run_worker(JobQueue(conn, get_backend_name(DATABASE_CONFIG)), worker_id)
+        except Exception as err:  # pylint: disable=broad-except
+            scraper_utils.log_warning(
+                "Worker %s reconnects to DB after: %s: %s"
+                % (worker_id, err.__class__.__name__, str(err))
+            )
+            time.sleep(DISTRIBUTED_CONFIG["max_db_retry_delay"])
+
+
+def _exit_on_signal(signum, frame):
+    sys.exit(0)
+
+
+def _setup_loggers():
+    log_format = "[%(levelname)s] %(message)s\n"
+    scraper_utils.setup_logger(
+        "error_log", level=logging.WARNING, logfile=SCRAPER_CONFIG["error_log"],
+        to_console=False, log_format=log_format
+    )
+    logging.basicConfig(level=logging.INFO, format=log_format)
+
+
+def main():
+    """Run the coordinator or workers of a distributed crawl.
+    """
+    arg_parser = argparse.ArgumentParser(description=main.__doc__)
+    subparsers = arg_parser.add_subparsers(dest="role", required=True)
+    subparsers.add_parser("coordinator", help="Collect news once, retrieved by the workers")
+    worker_parser = subparsers.add_parser("worker", help="Run workers on this host")
+    worker_parser.add_argument(
+        "--processes", type=int, default=DISTRIBUTED_CONFIG["worker_processes"],
+        help="Number of worker processes (default: %(default)s)"
+    )
+    worker_parser.add_argument(
+        "--threads", type=int, default=DISTRIBUTED_CONFIG["worker_threads"],
+        help="Number of worker threads in each process (default: %(default)s)"
+    )
+    args = arg_parser.parse_args()
+
+    if args.role == "coordinator":
+        run_coordinator()
+        return
+
+    processes = [
+        multiprocessing.Process(target=run_worker_process, args=(args.threads,))
+        for _ in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+
+    signal.signal(signal.SIGTERM, _exit_on_signal)
+    try:
+        for process in processes:
+            process.join()
+    except (KeyboardInterrupt, SystemExit):
+        # Worker processes are interrupted along with this one, or terminated here.
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""This module reads extraction profiles of local news sources from a file.
+
+A profile tells where the news content lies in the pages of a local news
+source, so that a new source can be supported without writing a parser.
+A profile in the profile file looks like this:
+
+    .. code-block:: json
+
+        {
+            "name": "自由時報 (LTN)",
+            "domains": ["ltn.com.tw"],
+            "selectors": [
+                {"tag": "div", "attrs": {"class": "text"}},
+                {"tag": "div", "attrs": {"class": "news_content"}}
+            ],
+            "fallback_meta": ["description", "Description"]
+        }
+
+    - The news content is the text of <p> tags inside the first tag found by
+      a selector (``BeautifulSoup.find(tag, attrs)``).
+    - If no selector works, the content of <meta name="..."> tags in
+      "fallback_meta" is used.
+
+Selectors are tried in the order of their success rates, which are updated
+while news are parsed, so that the layout used by most pages is tried first.
+The order in the file is kept until there are enough results.
+
+Domain names in "local_news_sources.txt" (See ``SCRAPER_CONFIG["debug"]``)
+which are not supported yet can be listed by:
+
+    .. code-block:: bash
+
+        python3 extraction_profiles.py --missing local_news_sources.txt
+
+Attributes:
+    ESSENTIAL_ATTRIBUTES (tuple(str)) Attributes that a profile must have.
+    OPTIONAL_ATTRIBUTES (dict): Attributes that are optional, and their default values.
+
+"""
+# Standard library
+import argparse
+import threading
+from collections import namedtuple
+from functools import lru_cache
+# Local modules
+import scraper_utils
+
+ESSENTIAL_ATTRIBUTES = ("name", "domains", "selectors")
+OPTIONAL_ATTRIBUTES = {
+    "fallback_meta": ["description", "Description"],
+}
+
+Selector = namedtuple("Selector", ("tag", "attrs"))
+
+
+class ExtractionProfileFormatError(scraper_utils.NewsScrapperError):
+    """Indicates that a profile has invalid format.
+    """
+    pass
+
+
+class ExtractionProfile(object):
+    """Extraction profile of a local news source.
+
+    Args:
+        name (str): Name of the local news source.
+        domains (Iterable(str)): Domain names of the local news source.
+        selectors (Iterable(Selector)): Tags in which the news content may lie.
+        fallback_meta (Iterable(str)): Names of <meta> tags to get the news
+            content from, if no selector works.
+
+    """
+
+    def __init__(self, name, domains, selectors, fallback_meta):
+        self.name = name
+        self.domains = tuple(domains)
+        self.selectors = tuple(selectors)
+        self.fallback_meta = tuple(fallback_meta)
+        self._attempts = [0] * len(self.selectors)
+        self._successes = [0] * len(self.selectors)
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Profiles are sent to the processes parsing HTML.
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<ExtractionProfile '%s' %s>" % (self.name, list(self.domains))
+
+    def ordered_selectors(self):
+        """Get the selectors, the most likely to work first.
+
+        Returns:
+            list(tuple(int, Selector)): <Index of the selector, the selector>
+                by descending success rates.
+
+        """
+        with self._lock:
+            # Laplace smoothing: (successes + 1) / (attempts + 2)
+            rates = [
+                (successes + 1) / (attempts + 2)
+                for attempts, successes in zip(self._attempts, self._successes)
+            ]
+
+        order = sorted(range(len(self.selectors)), key=lambda index: -rates[index])
+        return [(index, self.selectors[index]) for index in order]
+
+    def record(self, index, success):
+        """Record whether the selector at ``index`` found the news content.
+        """
+        with self._lock:
+            self._attempts[index] += 1
+            if success:
+                self._successes[index] += 1
+
+
+@lru_cache(maxsize=None)
+def get_extraction_profiles(filename):
+    """Read extraction profiles from a file. Profiles are read once for each file.
+
+    Args:
+        filename (str): File name of the profile file.
+
+    Returns:
+        tuple(ExtractionProfile): The profiles.
+
+    Raises:
+        ExtractionProfileFormatError: If a profile has invalid format.
+
+    """
+    configs = scraper_utils.read_json_from_file(filename)
+    profiles = []
+    domain_set = set()
+
+    for config in configs:
+        _check_attributes(config)
+
+        domains = _get_strings(config, "domains")
+        if domain_set.intersection(domains):
+            raise ExtractionProfileFormatError("Domains of profiles must be unique.")
+        domain_set.update(domains)
+
+        profiles.append(ExtractionProfile(
+            name=_get_attribute(config, "name", str),
+            domains=domains,
+            selectors=_get_selectors(config),
+            fallback_meta=_get_strings(config, "fallback_meta"),
+        ))
+
+    return tuple(profiles)
+
+
+def find_unsupported_domains(local_sources_file, supported_domains):
+    """Find domain names of local news sources which are not supported.
+
+    Args:
+        local_sources_file (str): The file written by
+            ``local_news_parsers.update_local_news_sources_list()``.
+        supported_domains (Iterable(str)): Domain names which have parsers.
+
+    Returns:
+        list(tuple(str, int)): <Domain name, number of news> by descending number of news.
+
+    """
+    local_news_sources = scraper_utils.read_json_from_file(local_sources_file)
+    supported_domains = tuple(supported_domains)
+
+    return sorted(
+        (
+            (domain_name, count) for domain_name, count in local_news_sources.items()
+            if domain_name and not any(source in domain_name for source in supported_domains)
+        ),
+        key=lambda item: item[1], reverse=True
+    )
+
+
+def _check_attributes(config):
+    if not isinstance(config, dict):
+        raise ExtractionProfileFormatError("A profile must be a JSON object.")
+
+    for attr_name in config:
+        if attr_name not in ESSENTIAL_ATTRIBUTES and attr_name not in OPTIONAL_ATTRIBUTES:
+            raise ExtractionProfileFormatError(
+                "Attribute '%s' in the profile file is unknown." % attr_name
+            )
+
+    for attr_name in ESSENTIAL_ATTRIBUTES:
+        if attr_name not in config:
+            raise ExtractionProfileFormatError(
+                "Attribute '%s' must be given in a profile." % attr_name
+            )
+
+
+def _get_attribute(config, attr_name, attr_type):
+    value = config.get(attr_name, OPTIONAL_ATTRIBUTES.get(attr_name))
+
+    if not isinstance(value, attr_type):
+        raise ExtractionProfileFormatError(
+            "'%s' attribute must be of type %s." % (attr_name, attr_type.__name__)
+        )
+
+    return value
+
+
+def _get_strings(config, attr_name):
+    values = _get_attribute(config, attr_name, list)
+
+    if not all(isinstance(value, str) and value for value in values):
+        raise ExtractionProfileFormatError(
+            "'%s' attribute must be a list of non-empty strings." % attr_name
+        )
+
+    return values
+
+
+def _get_selectors(config):
+    selectors = []
+
+    for selector in _get_attribute(config, "selectors", list):
+        if (not isinstance(selector, dict)
+                or not isinstance(selector.get("tag"), str)
+                or not isinstance(selector.get("attrs", {}), dict)
+                or set(selector) - {"tag", "attrs"}):
+            raise ExtractionProfileFormatError(
+                "A selector must be like {\"tag\": \"div\", \"attrs\": {\"class\": \"text\"}}."
+            )
+
+        selectors.append(Selector(selector["tag"], selector.get("attrs", {})))
+
+    if not selectors:
+        raise ExtractionProfileFormatError("'selectors' attribute must not be empty.")
+
+    return selectors
+
+
+def main():
+    """List domain names of local news sources which are not supported.
+    """
+    # Avoid circular imports: local_news_parsers uses this module.
+    from local_news_parsers import get_local_parser_registry
+
+    arg_parser = argparse.ArgumentParser(description=main.__doc__)
+    arg_parser.add_argument(
+        "--missing", metavar="FILE", default="local_news_sources.txt",
+        help="The list of local news sources (default: %(default)s)"
+    )
+    args = arg_parser.parse_args()
+
+    scraper_utils.setup_logger("error_log", to_console=True)
+    for domain_name, count in find_unsupported_domains(args.missing, get_local_parser_registry()):
+        print("%6d  %s" % (count, domain_name))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+"""This module provides a job queue in DB, shared by crawl workers on one or more hosts.
+
+Jobs are rows of the ``scraper_jobs`` table. A worker leases a pending job for
+``lease_seconds``, and completes it with a result, or fails it. A failed job
+is retried after a delay, which doubles with each attempt, until it has been
+attempted ``max_attempts`` times. A job whose lease expires (e.g. its worker
+was killed) can be leased by another worker. Finished jobs are taken by the
+coordinator of their run, and deleted.
+
+Backends:
+    * ``"postgresql"``: Workers on any host lease jobs concurrently by
+      ``SELECT ... FOR UPDATE SKIP LOCKED``, so they never wait for each other.
+    * ``"sqlite"``: Workers on the host of the database file lease jobs by
+      one ``UPDATE ... RETURNING`` statement. Writes are serialized by SQLite.
+
+Lease times are taken from the clocks of the workers, so the clocks of all
+hosts should be synchronized.
+
+Example:
+    .. code-block:: python
+
+        with get_database(DATABASE_CONFIG) as conn:
+            job_queue = JobQueue(conn, get_backend_name(DATABASE_CONFIG))
+
+            job = job_queue.lease("worker-1")
+            if job is not None:
+                job_queue.complete(job, {"content": "..."})
+
+"""
+# Standard library
+import json
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+# Local modules
+import scraper_utils
+from settings import DISTRIBUTED_CONFIG
+
+_SCHEMA = {
+    "postgresql": """
+        CREATE TABLE IF NOT EXISTS scraper_jobs (
+            id BIGSERIAL PRIMARY KEY,
+            run_id TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            state TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            available_at DOUBLE PRECISION NOT NULL,
+            lease_owner TEXT,
+            lease_expires DOUBLE PRECISION,
+            result TEXT,
+            error TEXT
+        );
+    """,
+    "sqlite": """
+        CREATE TABLE IF NOT EXISTS scraper_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            state TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            available_at DOUBLE PRECISION NOT NULL,
+            lease_owner TEXT,
+            lease_expires DOUBLE PRECISION,
+            result TEXT,
+            error TEXT
+        );
+    """,
+}
+
+_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS scraper_jobs_state_idx ON scraper_jobs (state, available_at);",
+    "CREATE INDEX IF NOT EXISTS scraper_jobs_run_id_idx ON scraper_jobs (run_id, state);",
+)
+
+# Row locks are not supported (nor needed) by SQLite.
+_LOCK_CLAUSE = {
+    "postgresql": " FOR UPDATE SKIP LOCKED",
+    "sqlite": "",
+}
+
+_JOB_FIELDS = "id, run_id, kind, payload, attempts, state, result, error"
+
+# Maximum number of jobs added by one INSERT statement, within the limit of
+# parameters of a statement (999 for old versions of SQLite)
+_INSERT_CHUNK_SIZE = 100
+
+Job = namedtuple("Job", ("id", "run_id", "kind", "payload", "attempts", "state", "result", "error"))
+Job.__doc__ = """A job in the queue.
+
+Attributes:
+    id (int): Id of the job.
+    run_id (str): The run which the job belongs to.
+    kind (str): Kind of the job, e.g. "feed" or "article".
+    payload (dict): Input of the job.
+    attempts (int): Number of times the job has been leased.
+    state (str): "pending", "leased", "done" or "failed".
+    result (dict): Output of a done job. Otherwise None.
+    error (str): The last error of the job, or None.
+"""
+
+
+class JobQueue(object):
+    """A job queue in the ``scraper_jobs`` table of a DB.
+
+    The table is created if it does not exist. A connection should be used by
+    one thread at a time, so each worker thread needs its own ``JobQueue``.
+
+    Args:
+        conn: A DB connection (as given by ``db_backends.get_database()``).
+
+        backend (str, optional): "postgresql" or "sqlite".
+
+        lease_seconds (float, optional): Seconds a worker has to finish a job.
+
+        max_attempts (int, optional): Maximum number of times a job is leased.
+
+        retry_delay (float, optional): Seconds before the first retry of a failed job.
+
+    Raises:
+        scraper_utils.NewsScrapperError: If the backend is unknown.
+
+    """
+
+    def __init__(self, conn, backend="postgresql",
+                 lease_seconds=DISTRIBUTED_CONFIG["lease_seconds"],
+                 max_attempts=DISTRIBUTED_CONFIG["max_attempts"],
+                 retry_delay=DISTRIBUTED_CONFIG["retry_delay"]):
+        if backend not in _SCHEMA:
+            raise scraper_utils.NewsScrapperError("Unknown database backend '%s'." % backend)
+
+        self.conn = conn
+        self.backend = backend
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+
+        self.conn.execute_sql_command(_SCHEMA[backend])
+        for sql_command in _INDEXES:
+            self.conn.execute_sql_command(sql_command)
+
+    def put(self, run_id, kind, payload):
+        """Add a job to the queue.
+
+        Returns:
+            int: Id of the job.
+
+        """
+        return self.put_many(run_id, kind, [payload])[0]
+
+    def put_many(self, run_id, kind, payloads):
+        """Add jobs of the same kind to the queue in one transaction.
+
+        Args:
+            run_id (str): The run which the jobs belong to.
+            kind (str): Kind of the jobs.
+            payloads (Iterable(dict)): Inputs of the jobs, which are JSON serializable.
+
+        Returns:
+            list(int): Ids of the jobs, in the order of ``payloads``.
+
+        """
+        now = time.time()
+        rows = [
+            (run_id, kind, json.dumps(payload, ensure_ascii=False), "pending", now)
+            for payload in payloads
+        ]
+        job_ids = []
+
+        with self._transaction():
+            for start in range(0, len(rows), _INSERT_CHUNK_SIZE):
+                chunk = rows[start:start + _INSERT_CHUNK_SIZE]
+                returned_rows = self.conn.execute_sql_command(
+                    "INSERT INTO scraper_jobs (run_id, kind, payload, state, available_at) "
+                    "VALUES %s RETURNING id;" % ", ".join(["(%s, %s, %s, %s, %s)"] * len(chunk)),
+                    [value for row in chunk for value in row]
+                )
+                # Ids increase in the order of rows, while RETURNING has no guaranteed order.
+                job_ids.extend(sorted(job_id for job_id, in returned_rows))
+
+        return job_ids
+
+    def lease(self, worker_id):
+        """Lease the oldest available job.
+
+        A job is available if it is pending and its retry delay has passed,
+        or its lease has expired.
+
+        Args:
+            worker_id (str): Identity of the worker, unique among all hosts.
+
+        Returns:
+            Job: The leased job, or None if no job is available.
+
+        """
+        now = time.time()
+        rows = self.conn.execute_sql_command(
+            "UPDATE scraper_jobs "
+            "SET state = 'leased', lease_owner = %s, lease_expires = %s, attempts = attempts + 1 "
+            "WHERE id = ("
+            "    SELECT id FROM scraper_jobs"
+            "    WHERE ((state = 'pending' AND available_at <= %s)"
+            "           OR (state = 'leased' AND lease_expires < %s))"
+            "      AND attempts < %s"
+            "    ORDER BY id LIMIT 1" + _LOCK_CLAUSE[self.backend] +
+            ") RETURNING " + _JOB_FIELDS + ";",
+            [worker_id, now + self.lease_seconds, now, now, self.max_attempts]
+        )
+        return _to_job(rows[0]) if rows else None
+
+    def complete(self, job, result):
+        """Complete a leased job with its result.
+
+        Args:
+            job (Job): The job returned by ``lease()``.
+            result (dict): Output of the job, which is JSON serializable.
+
+        Returns:
+            bool: False if the lease has been lost (expired, and leased by
+                another worker), so the result is dropped.
+
+        """
+        rows = self.conn.execute_sql_command(
+            "UPDATE scraper_jobs SET state = 'done', result = %s, lease_owner = NULL "
+            "WHERE id = %s AND state = 'leased' AND attempts = %s RETURNING id;",
+            [json.dumps(result, ensure_ascii=False), job.id, job.attempts]
+        )
+        return bool(rows)
+
+    def fail(self, job, error):
+        """Fail a leased job. It is retried later, or fails for good after ``max_attempts``.
+
+        Args:
+            job (Job): The job returned by ``lease()``.
+            error (str): Description of the error.
+
+        Returns:
+            bool: False if the lease has been lost.
+
+        """
+        rows = self.conn.execute_sql_command(
+            "UPDATE scraper_jobs "
+            "SET state = CASE WHEN attempts >= %s THEN 'failed' ELSE 'pending' END, "
+            "    available_at = %s, error = %s, lease_owner = NULL "
+            "WHERE id = %s AND state = 'leased' AND attempts = %s RETURNING id;",
+            [self.max_attempts, time.time() + self.retry_delay * 2 ** (job.attempts - 1),
+             error, job.id, job.attempts]
+        )
+        return bool(rows)
+
+    def expire_leases(self):
+        """Fail jobs for good whose last lease has expired.
+
+        Jobs whose leases expire before ``max_attempts`` are leased again by
+        ``lease()`` instead.
+        """
+        self.conn.execute_sql_command(
+            "UPDATE scraper_jobs SET state = 'failed', error = 'Lease expired', "
+            "    lease_owner = NULL "
+            "WHERE state = 'leased' AND lease_expires < %s AND attempts >= %s;",
+            [time.time(), self.max_attempts]
+        )
+
+    def take_finished(self, run_id, limit=500):
+        """Take done and failed jobs of a run out of the queue.
+
+        Args:
+            run_id (str): The run.
+            limit (int, optional): Maximum number of jobs to take.
+
+        Returns:
+            list(Job): The jobs, in the order they were added.
+
+        """
+        with self._transaction():
+            rows = self.conn.execute_sql_command(
+                "SELECT " + _JOB_FIELDS + " FROM scraper_jobs "
+                "WHERE run_id = %s AND state IN ('done', 'failed') ORDER BY id LIMIT %s;",
+                [run_id, limit]
+            )
+            jobs = [_to_job(row) for row in rows]
+            if jobs:
+                self.conn.execute_sql_command(
+                    "DELETE FROM scraper_jobs WHERE id IN (%s);" % ", ".join(["%s"] * len(jobs)),
+                    [job.id for job in jobs]
+                )
+
+        return jobs
+
+    def cancel(self, run_id):
+        """Remove all jobs of a run from the queue.
+        """
+        self.conn.execute_sql_command("DELETE FROM scraper_jobs WHERE run_id = %s;", [run_id])
+
+    def count(self, run_id=None):
+        """Count jobs in the queue.
+
+        Args:
+            run_id (str, optional): Only jobs of this run. Defaults to all runs.
+
+        Returns:
+            dict: <state, number of jobs>
+
+        """
+        if run_id is None:
+            rows = self.conn.execute_sql_command(
+                "SELECT state, COUNT(*) FROM scraper_jobs GROUP BY state;"
+            )
+        else:
+            rows = self.conn.execute_sql_command(
+                "SELECT state, COUNT(*) FROM scraper_jobs WHERE run_id = %s GROUP BY state;",
+                [run_id]
+            )
+        return dict(rows)
+
+    @contextmanager
+    def _transaction(self):
+        # SQLite takes the write lock at once, so that two writers never
+        # deadlock when both upgrade from reading.
+        self.conn.execute_sql_command(
+            "BEGIN IMMEDIATE;" if self.backend == "sqlite" else "BEGIN;"
+        )
+        try:
+            yield
+        except BaseException:
+            self.conn.execute_sql_command("ROLLBACK;")
+            raise
+        self.conn.execute_sql_command("COMMIT;")
+
+
+def _to_job(row):
+    job_id, run_id, kind, payload, attempts, state, result, error = row
+    return Job(
+        job_id, run_id, kind, json.loads(payload), attempts, state,
+        json.loads(result) if result is not None else None, error
+    )
@@ -13,6 +13,11 @@ Purpose:
     The purpose of this module is to grab the news content from
     the actual news source.
 
+    Most local news sources are described by extraction profiles in
+    ``FEED_PARSER_CONFIG["extraction_profile_file"]``, and parsed by
+    ``ProfileHtmlNewsParser``. Sources which need code can still have a
+    subclass of ``HtmlNewsParser``, which takes precedence over profiles.
+
 Attributes:
     _PARSER_REGISTRY (dict): Maps domain names to local news parsers.
         <Key>: The domain name of the local news source.
@@ -24,12 +29,16 @@ Attributes:
 """
 # Standard library
 import json
+import logging
 from collections import OrderedDict
-from urllib.request import urlopen
+from functools import lru_cache, partial
 # PyPI
 from bs4 import BeautifulSoup
 # Local modules
+from settings import FEED_PARSER_CONFIG, SCRAPER_CONFIG
 import scraper_utils
+from extraction_profiles import get_extraction_profiles
+from url_canonicalizer import canonicalize_url
 
 _PARSER_REGISTRY = {}
 
@@ -69,14 +78,58 @@ def update_local_news_sources_list(news_entries, filename):
         outfile.write(json.dumps(sorted_local_news_sources, indent=True))
 
 
+def extract_news_content(html_parser, url, html):
+    """Extract the news content from a retrieved local news page.
+
+    This is run in worker processes, so that parsing HTML is not limited by the GIL.
+
+    Args:
+        html_parser (HtmlNewsParser): The local news parser.
+        url (str): The link of the local news.
+        html (bytes): The page retrieved from ``url``.
+
+    Returns:
+        tuple(str, list): News content of the local news, and
+            ``html_parser.selector_results`` to be recorded by
+            ``html_parser.record_selector_results()`` in the main process.
+
+    """
+    news_content = html_parser.get_news_content_from_html(url, html).strip()
+    return news_content, html_parser.selector_results
+
+
+def init_parser_process():
+    """Set up a worker process of ``extract_news_content()``.
+
+    Worker processes which are not forked do not have the 'error_log' logger.
+    """
+    if 'error_log' not in logging.Logger.manager.loggerDict:
+        scraper_utils.setup_logger(
+            'error_log', level=logging.WARNING,
+            logfile=SCRAPER_CONFIG["error_log"], to_console=False
+        )
+
+
 def get_local_parser_registry():
     """Get the dict mapping domain names to local news parsers.
 
     Returns:
-        dict: A copy of ``_PARSER_REGISTRY``.
+        dict: A copy of ``_PARSER_REGISTRY``, with parsers of extraction profiles.
+            Values are callables which return a parser without arguments.
 
     """
-    return _PARSER_REGISTRY.copy()
+    registry = _get_profile_parser_registry(FEED_PARSER_CONFIG["extraction_profile_file"]).copy()
+    registry.update(_PARSER_REGISTRY)
+    return registry
+
+
+@lru_cache(maxsize=None)
+def _get_profile_parser_registry(filename):
+    return {
+        domain_name: partial(ProfileHtmlNewsParser, profile)
+        for profile in get_extraction_profiles(filename)
+        for domain_name in profile.domains
+    }
 
 
 def _register_local_source(name, cls):
@@ -114,6 +167,14 @@ class HtmlNewsParser(object, metaclass=LocalNewsMeta):
     """
     source_base_urls = []
 
+    def __init__(self):
+        # Pages already retrieved by this parser: <url, BeautifulSoup object>
+        # A parser may look for the news content in several tags of the same page.
+        self._bsobj_cache = {}
+
+        # <index of selector, whether it works> (See ProfileHtmlNewsParser)
+        self.selector_results = []
+
     def get_news_content_from_url(self, url):
         """Get news content from the local news source.
 
@@ -126,6 +187,29 @@ class HtmlNewsParser(object, metaclass=LocalNewsMeta):
         """
         return self._get_news_content(url)
 
+    def get_news_content_from_html(self, url, html):
+        """Get news content from a page already retrieved from the local news source.
+
+        Args:
+            url (str): The link of the local news.
+            html (bytes): The page retrieved from ``url``.
+
+        Returns:
+            str: News content of the local news.
+
+        """
+        self._check_url(url)
+        self._bsobj_cache[canonicalize_url(url)] = BeautifulSoup(html, "html.parser")
+
+        return self.get_news_content_from_url(url)
+
+    def record_selector_results(self, selector_results):
+        """Record results of selectors returned by ``extract_news_content()``.
+
+        Only parsers of extraction profiles have selectors, so this does nothing by default.
+        """
+        pass
+
     def _get_news_content(self, url, ancestor_tag=None,
                           dict_ancestor_attr=None, raise_error=False):
         """Get news content from url.
@@ -183,23 +267,21 @@ class HtmlNewsParser(object, metaclass=LocalNewsMeta):
 
         return news_content
 
-    def _get_news_content_by_default(self, url):
-        try:
-            news_content = self._get_news_content_by_meta_name(url, "description")
-        except (TypeError, KeyError):
+    def _get_news_content_by_default(self, url, meta_names=("description", "Description")):
+        for meta_name in meta_names:
             try:
-                news_content = self._get_news_content_by_meta_name(url, "Description")
+                return self._get_news_content_by_meta_name(url, meta_name)
             except (TypeError, KeyError):
-                msg = (
-                    "Try to get news content by meta description from [%s], but fail."
-                    % url
-                )
-                scraper_utils.log_warning(msg)
+                continue
 
-                # news_content = self._get_beautifulsoup_obj(url).get_text()
-                news_content = "<Fail to get news_content>"
+        msg = (
+            "Try to get news content by meta description from [%s], but fail."
+            % url
+        )
+        scraper_utils.log_warning(msg)
 
-        return news_content
+        # news_content = self._get_beautifulsoup_obj(url).get_text()
+        return "<Fail to get news_content>"
 
     def _get_news_content_by_p_tags(self, url, ancestor_tag, dict_ancestor_attr):
 
@@ -221,7 +303,7 @@ class HtmlNewsParser(object, metaclass=LocalNewsMeta):
             msg = (
                 "Get empty or non-string news content by meta '%s' from [%s]. "
                 "Currently null string is returned as a workaround."
-                % url
+                % (meta_name, url)
             )
             scraper_utils.log_warning(msg)
 
@@ -229,13 +311,18 @@ class HtmlNewsParser(object, metaclass=LocalNewsMeta):
 
     def _get_beautifulsoup_obj(self, url):
 
+        canonical_url = canonicalize_url(url)
+        if canonical_url in self._bsobj_cache:
+            return self._bsobj_cache[canonical_url]
+
         # check whether the URL belong to this local news source
         self._check_url(url)
 
         # May raise HTTPError, URLError
         # Should be handled by caller
-        html = urlopen(url)
+        html = scraper_utils.fetch_url(url, FEED_PARSER_CONFIG["http_timeout"])
         bsobj = BeautifulSoup(html, "html.parser")
+        self._bsobj_cache[canonical_url] = bsobj
         return bsobj
 
     def _check_url(self, url):
@@ -260,19 +347,26 @@ class DefaultHtmlNewsParser(HtmlNewsParser):
         pass
 
 
-class LtnHtmlNewsParser(HtmlNewsParser):
-    """Parser for the local news source "自由時報 (LTN)".
+class ProfileHtmlNewsParser(HtmlNewsParser):
+    """Parser for a local news source described by an extraction profile.
 
-    Attributes:
-        source_base_urls (list(str)): Posible domain names for this local news source.
+    Profiles are read from ``FEED_PARSER_CONFIG["extraction_profile_file"]``
+    (See ``extraction_profiles.py``), so no parser class has to be written.
+
+    Args:
+        profile (extraction_profiles.ExtractionProfile): The profile of the source.
 
     """
 
-    source_base_urls = ['ltn.com.tw']
+    def __init__(self, profile):
+        super().__init__()
+        self.profile = profile
 
     def get_news_content_from_url(self, url):
         """Get news content from the news link.
 
+        Selectors of the profile are tried by their success rates.
+
         Args:
             url (str): The link of the local news.
 
@@ -280,84 +374,39 @@ class LtnHtmlNewsParser(HtmlNewsParser):
             str: News content of the local news.
 
         """
-        # Ltn has many common html formats...
-        possible_class_names = ["text", "news_content", "boxTitle", "conbox", "content"]
-
-        for class_name in possible_class_names[:-1]:
+        for index, selector in self.profile.ordered_selectors():
             try:
-                return self._get_news_content(
-                    url, "div", {"class": class_name}, raise_error=True
+                news_content = self._get_news_content(
+                    url, selector.tag, selector.attrs, raise_error=True
                 )
             except AttributeError:
-                continue
-
-        # The last one should not have to raise Attrubute errors, so handle it seperately.
-        return self._get_news_content(
-            url, "div", {"class": possible_class_names[-1]}  # No 'raise_error=True' here
-        )
+                news_content = ""
 
+            self.selector_results.append((index, bool(news_content.strip())))
+            if news_content.strip():
+                return news_content
 
-class CnaHtmlNewsParser(HtmlNewsParser):
-    """Parser for the local news source "中央通訊社 (CNA)".
-
-    Attributes:
-        source_base_urls (list(str)): Posible domain names for this local news source.
-
-    """
-    source_base_urls = ['cna.com.tw']
-
-    def get_news_content_from_url(self, url):
-        """Get news content from the news link.
-
-        Args:
-            url (str): The link of the local news.
-
-        Returns:
-            str: News content of the local news.
-
-        """
-        return self._get_news_content(url, "div", {"class": "article_box"})
-
-
-class UdnHtmlNewsParser(HtmlNewsParser):
-    """Parser for the local news source "聯合新聞網 (UDN)".
-
-    Attributes:
-        source_base_urls (list(str)): Posible domain names for this local news source.
-
-    """
-    source_base_urls = ['udn.com']
-
-    def get_news_content_from_url(self, url):
-        """Get news content from the news link.
-
-        Args:
-            url (str): The link of the local news.
+        msg = (
+            "No selector of profile '%s' works for [%s]. "
+            "Maybe the html content of the local news source has been changed."
+            % (self.profile.name, url)
+        )
+        scraper_utils.log_warning(msg)
 
-        Returns:
-            str: News content of the local news.
+        return self._get_news_content_by_default(url, self.profile.fallback_meta)
 
+    def record_selector_results(self, selector_results):
+        """Update success rates of selectors of the profile.
         """
-        return self._get_news_content(url, "div", {"id": "story_body_content"})
-
-
-class EtodayHtmlNewsParser(HtmlNewsParser):
-    """Parser for the local news source "ETtoday 新聞雲".
-
-    Attributes:
-        source_base_urls (list(str)): Posible domain names for this local news source.
-
-    """
-    source_base_urls = ['ettoday.net']
+        for index, success in selector_results:
+            self.profile.record(index, success)
 
-    def get_news_content_from_url(self, url):
-        """Get news content from the news link.
-
-        Args:
-            url (str): The link of the local news.
+    def _check_url(self, url):
 
-        Returns:
-            str: News content of the local news.
+        target_base_url = scraper_utils.extract_domain_name_from_url(url)
 
-        """
-        return self._get_news_content(url, "div", {"class": "story"})
+        if not any(domain in target_base_url for domain in self.profile.domains):
+            raise scraper_utils.NewsScrapperError(
+                "URL [%s] does not match any of domains of profile '%s': %s"
+                % (url, self.profile.name, list(self.profile.domains))
+            )
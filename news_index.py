@@ -0,0 +1,220 @@
+"""This module keeps an inverted index over the news stored in DB.
+
+Chinese text has no word boundaries, and keywords of scraping rules are
+matched as substrings, so the index maps every character unigram and bigram
+of the normalized title and description to the ids of news containing it.
+A keyword can only appear in a news which contains all of its bigrams, so the
+intersection of their posting lists is a (small) superset of the news
+containing the keyword.
+
+When scraping rules are added or changed, only the news which may get a
+non-zero score by them (``candidates_of_rule()``) are read from DB and rescored,
+instead of every stored news.
+
+The index is kept up to date by ``NewsDatabaseAPI`` when news are stored or
+deleted, saved to a file between runs, and synchronized with the news in DB
+by ``sync()`` (e.g. when news have been stored by another process).
+
+"""
+# Standard library
+import json
+import logging
+import os
+import threading
+# Local modules
+import scraper_utils
+from text_normalizer import normalize_text
+
+_INDEX_VERSION = 1
+
+
+def _grams_of(text):
+    grams = set(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+
+class NewsInvertedIndex(object):
+    """An inverted index from unigrams and bigrams to ids of news in DB.
+
+    Deleted news are only removed from the set of indexed ids at once, and
+    their ids are dropped from the posting lists when the index is saved.
+
+    Attributes:
+        news_ids (set(int)): Ids of indexed news.
+
+    """
+
+    def __init__(self):
+        self.news_ids = set()
+        self._postings = {}  # gram ==> set(news_id)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.news_ids)
+
+    def add(self, news_id, normalized_title, normalized_description):
+        """Index a news.
+
+        Args:
+            news_id (int): Id of the news in DB.
+            normalized_title (str): Title normalized by ``normalize_text()``.
+            normalized_description (str): Description normalized by ``normalize_text()``.
+
+        """
+        grams = _grams_of(normalized_title) | _grams_of(normalized_description)
+        with self._lock:
+            self.news_ids.add(news_id)
+            for gram in grams:
+                self._postings.setdefault(gram, set()).add(news_id)
+
+    def remove(self, news_ids):
+        """Remove news from the index.
+
+        Args:
+            news_ids (Iterable(int)): Ids of the news to remove.
+
+        """
+        with self._lock:
+            self.news_ids.difference_update(news_ids)
+
+    def clear(self):
+        """Remove all news from the index.
+        """
+        with self._lock:
+            self.news_ids.clear()
+            self._postings.clear()
+
+    def candidates_of_keyword(self, keyword):
+        """Get ids of news which may contain a keyword.
+
+        Args:
+            keyword (str): The keyword (not normalized yet).
+
+        Returns:
+            set(int): Ids of all news containing the keyword, and maybe some others.
+
+        """
+        keyword = normalize_text(keyword)
+        if not keyword:
+            return set(self.news_ids)
+
+        grams = [keyword] if len(keyword) == 1 else _grams_of(keyword) - set(keyword)
+
+        with self._lock:
+            postings = [self._postings.get(gram, ()) for gram in grams]
+            # Intersect from the rarest gram, so the intermediate sets stay small.
+            postings.sort(key=len)
+            result = set(postings[0])
+            for posting in postings[1:]:
+                if not result:
+                    break
+                result.intersection_update(posting)
+
+            return result & self.news_ids
+
+    def candidates_of_rule(self, rule):
+        """Get ids of news which may get a non-zero score by a rule.
+
+        Args:
+            rule (scraper_models.ScrapingRule): The rule.
+
+        Returns:
+            set(int): Ids of news to rescore by the rule.
+
+        """
+        # Positive scores need all keywords of an include group
+        # and one of include_any.
+        included = None
+        for group in rule.include_groups:
+            if not group:
+                continue
+            in_group = set.intersection(
+                *(self.candidates_of_keyword(keyword) for keyword in group)
+            )
+            included = in_group if included is None else included | in_group
+
+        if rule.include_any:
+            with_any = set().union(
+                *(self.candidates_of_keyword(keyword) for keyword in rule.include_any)
+            )
+            included = with_any if included is None else included & with_any
+
+        # Negative scores need one of the excluded keywords.
+        excluded = set().union(
+            *(self.candidates_of_keyword(keyword) for keyword in rule.excluded_keywords)
+        )
+
+        return (included or set()) | excluded
+
+    def sync(self, db_api):
+        """Index news which are in DB but not in the index, and remove the others.
+
+        Args:
+            db_api (db_news_api.NewsDatabaseAPI): The API to read news with.
+
+        """
+        ids_in_db = set(db_api.get_news_ids())
+        deleted_ids = self.news_ids - ids_in_db
+        missing_ids = ids_in_db - self.news_ids
+
+        self.remove(deleted_ids)
+        for news_id, news in db_api.get_news_data_by_ids(missing_ids).items():
+            self.add(news_id, news.normalized_title, news.normalized_description)
+
+        if deleted_ids or missing_ids:
+            logging.info(
+                "Synchronized the news index with DB: %d added, %d removed.",
+                len(missing_ids), len(deleted_ids)
+            )
+
+    @classmethod
+    def load(cls, filename):
+        """Load an index saved by ``save()``.
+
+        Args:
+            filename (str): The file to load.
+
+        Returns:
+            NewsInvertedIndex: The index, or an empty one if the file does not
+                exist or is saved by another version.
+
+        """
+        index = cls()
+        if not os.path.exists(filename):
+            return index
+
+        data = scraper_utils.read_json_from_file(filename)
+        if not data or data.get("version") != _INDEX_VERSION:
+            return index
+
+        index.news_ids = set(data["news_ids"])
+        index._postings = {gram: set(ids) for gram, ids in data["postings"].items()}
+        return index
+
+    def save(self, filename):
+        """Save the index to a file. Ids of removed news are dropped first.
+
+        Args:
+            filename (str): The file to write.
+
+        """
+        with self._lock:
+            postings = {}
+            for gram, ids in self._postings.items():
+                ids &= self.news_ids
+                if ids:
+                    postings[gram] = ids
+            self._postings = postings
+
+            data = {
+                "version": _INDEX_VERSION,
+                "news_ids": sorted(self.news_ids),
+                "postings": {gram: sorted(ids) for gram, ids in postings.items()},
+            }
+
+        tmp_filename = filename + ".tmp"
+        with open(tmp_filename, "w") as outfile:
+            json.dump(data, outfile, ensure_ascii=False)
+
+        os.replace(tmp_filename, filename)
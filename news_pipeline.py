@@ -0,0 +1,366 @@
+"""This module streams news from RSS feeds to DB through bounded stages.
+
+    fetch feeds --> fetch news contents --> score --> filter --> store
+    (threads)       (threads)               (a thread)           (NewsDatabaseWriter)
+
+Each news moves to the next stage as soon as it is ready, instead of waiting
+for its whole feed (or all feeds) to be done. So the first news are stored
+within seconds, and contents of all feeds are retrieved by one shared pool.
+
+The number of news being retrieved or waiting to be scored is bounded by
+``max_pending_news``, and news waiting to be stored by the queue of the
+``NewsDatabaseWriter``. So the memory used does not grow with the number of
+feeds. If a later stage falls behind, the earlier stages wait for it.
+
+Example:
+    .. code-block:: python
+
+        with NewsDatabaseWriter(db_api) as db_writer:
+            pipeline = NewsPipeline(rules, db_writer, StoryClusterer())
+            pipeline.run(get_news_source_registry())
+
+        logging.info("Stored %d out of %d news", pipeline.target_count, pipeline.news_count)
+
+"""
+# Standard library
+import logging
+import queue
+import threading
+from concurrent import futures
+from timeit import default_timer as timer
+from urllib.error import HTTPError, URLError
+# Local modules
+import scraper_metrics
+import scraper_utils
+from settings import SCRAPER_CONFIG, FEED_PARSER_CONFIG
+
+# Put into the score queue to tell the scorer thread to stop.
+_STOP = object()
+
+
+def is_news_to_store(news, clusterer=None):
+    """Whether a scored news should be stored to DB.
+
+    Only one news of a story is stored (See ``StoryClusterer.claim()``).
+    """
+    if news.total_score <= 0:
+        return False
+
+    return clusterer is None or clusterer.claim(news)
+
+
+class NewsPipeline(object):
+    """Retrieves, scores and stores news of registered news sources as a stream.
+
+    Args:
+        scraping_rules (scraping_rules_compiler.CompiledRuleSet): Rules to score news.
+
+        db_writer (db_writer.NewsDatabaseWriter): The writer to store news of interest.
+
+        clusterer (story_clusters.StoryClusterer, optional): Clusters of stories
+            of this run. Defaults to None, which means news are not clustered.
+
+        keep_news (bool, optional): Whether to keep all scored news in
+            ``self.news_entries`` (for debugging). Defaults to False.
+
+        feed_workers (int, optional): Number of threads to retrieve feeds.
+
+        news_workers (int, optional): Number of threads to retrieve news contents.
+
+        max_pending_news (int, optional): Maximum number of news which are
+            being retrieved or waiting to be scored.
+
+        feed_timeout (float, optional): Seconds to wait for all feeds.
+
+        news_timeout (float, optional): Seconds to wait for the remaining news
+            contents after all feeds are retrieved.
+
+        fetch_url (callable, optional): A function with the interface of
+            ``scraper_utils.fetch_url()`` to retrieve feeds and news contents
+            by, e.g. ``response_archive.ResponseArchive.fetch_url``. It is used
+            only by the threads of this pipeline. Defaults to None, which means
+            they are retrieved from the network.
+
+    Attributes:
+        news_count (int): Number of news scored.
+        target_count (int): Number of news put to ``db_writer``.
+        news_entries (list(scraper_models.NewsRSSEntry)): All scored news,
+            if ``keep_news`` is True.
+        stored_entries (list(scraper_models.NewsRSSEntry)): News put to
+            ``db_writer``, if ``keep_news`` is True.
+
+    """
+
+    def __init__(self, scraping_rules, db_writer, clusterer=None, keep_news=False,
+                 feed_workers=SCRAPER_CONFIG["max_workers"],
+                 news_workers=FEED_PARSER_CONFIG["max_workers"],
+                 max_pending_news=SCRAPER_CONFIG["pipeline_max_pending_news"],
+                 feed_timeout=SCRAPER_CONFIG["rss_worker_timeout"],
+                 news_timeout=FEED_PARSER_CONFIG["html_parser_worker_timeout"],
+                 fetch_url=None):
+        self.scraping_rules = scraping_rules
+        self.db_writer = db_writer
+        self.clusterer = clusterer
+        self.keep_news = keep_news
+        self.feed_workers = feed_workers
+        self.news_workers = news_workers
+        self.feed_timeout = feed_timeout
+        self.news_timeout = news_timeout
+        self.fetch_url = fetch_url
+
+        self.news_count = 0
+        self.target_count = 0
+        self.news_entries = []
+        self.stored_entries = []
+
+        self._pending = threading.BoundedSemaphore(max_pending_news)
+        self._score_queue = queue.Queue()
+        self._news_executor = None
+        self._news_futures = set()
+        self._entries = {}  # Duplicate by title ==> (feed parser, feed entry)
+        self._lock = threading.Lock()
+        self._scorer_error = None
+
+    def run(self, news_sources):
+        """Retrieve all feeds of news sources, and stream their news to DB.
+
+        Args:
+            news_sources (dict): Registry of news source classes,
+                as returned by ``news_sources.get_news_source_registry()``.
+
+        """
+        start_time = timer()
+        scorer = threading.Thread(target=self._score_news, name="NewsScorer", daemon=True)
+        scorer.start()
+
+        self._news_executor = futures.ThreadPoolExecutor(max_workers=self.news_workers)
+        try:
+            with futures.ThreadPoolExecutor(max_workers=self.feed_workers) as feed_executor:
+                for news_src, category, raw_feed in self._fetch_feeds(feed_executor, news_sources):
+                    self._submit_news_of_feed(news_src, category, raw_feed)
+
+            self._wait_for_news()
+        finally:
+            self._news_executor.shutdown(wait=False, cancel_futures=True)
+            self._score_queue.put(_STOP)
+            scorer.join()
+
+        if self._scorer_error is not None:
+            raise self._scorer_error
+
+        logging.info(
+            "Pipeline completed in %f seconds: %d news, %d of interest.",
+            timer() - start_time, self.news_count, self.target_count
+        )
+
+    def _fetch_feeds(self, executor, news_sources):
+        """Stage 1: Retrieve feeds by threads, and yield them as they are done.
+        """
+        future_map = {}
+        for news_source_class in news_sources.values():
+            news_src = news_source_class()
+
+            for category in news_src.categories:
+                future_obj = executor.submit(
+                    self._call_with_fetcher, news_src.get_raw_feed_object, category
+                )
+                future_map[future_obj] = (news_src, category)
+
+        logging.info("Retrieving %d RSS feeds concurrently.", len(future_map))
+
+        try:
+            for future_obj in futures.as_completed(future_map, timeout=self.feed_timeout):
+                news_src, category = future_map[future_obj]
+                url = news_src.get_rss_url(category)
+                try:
+                    raw_feed = future_obj.result()
+                except HTTPError as err:
+                    scraper_utils.log_warning(
+                        "HTTP Error %d for RSS feed '%s'" % (err.code, url)
+                    )
+                except URLError as err:
+                    scraper_utils.log_warning(
+                        "URL Error [%s] for RSS feed '%s'" % (err.reason, url)
+                    )
+                except OSError as err:
+                    # e.g. socket.timeout when reading the response
+                    scraper_utils.log_warning(
+                        "Error [%s] for RSS feed '%s'" % (err, url)
+                    )
+                else:
+                    yield news_src, category, raw_feed
+
+        except futures.TimeoutError as err:
+            scraper_utils.log_warning("Timeout in news_collector: %s" % str(err))
+            for future_obj in future_map:
+                future_obj.cancel()
+
+    def _submit_news_of_feed(self, news_src, category, raw_feed):
+        """Stage 2: Retrieve contents of news of a feed by the shared thread pool.
+
+        News whose titles are near-duplicates of news seen before are not retrieved.
+        """
+        feed_parser = news_src.feed_parser
+        feed_link = raw_feed.feed.link
+
+        for entry in raw_feed.entries:
+            news = feed_parser.get_news_entry(entry, feed_link, category)
+
+            # Blocks while too many news are pending.
+            self._pending.acquire()
+
+            if self.clusterer is not None and self.clusterer.add_by_title(news):
+                # Fetched instead if its representative can not be fetched.
+                with self._lock:
+                    self._entries[news] = (feed_parser, entry)
+                self._score_queue.put((news, False))
+                continue
+
+            self._submit_news(feed_parser, entry, news)
+
+    def _submit_news(self, feed_parser, entry, news):
+        future_obj = self._news_executor.submit(self._fetch_news_content, feed_parser, entry, news)
+        with self._lock:
+            self._news_futures.add(future_obj)
+        future_obj.add_done_callback(self._discard_future)
+
+    def _call_with_fetcher(self, func, *args):
+        if self.fetch_url is None:
+            return func(*args)
+
+        with scraper_utils.use_fetcher(self.fetch_url):
+            return func(*args)
+
+    def _fetch_news_content(self, feed_parser, entry, news):
+        try:
+            news.description = self._call_with_fetcher(feed_parser.get_news_content, entry)
+        except Exception as err:  # pylint: disable=broad-except
+            scraper_utils.log_warning(
+                "Fail to get the content of %s: %s" % (str(news), str(err))
+            )
+            new_representative = self.reelect_representative(news)
+            if new_representative is None:
+                self._pending.release()
+                return
+
+            # The pending slot is passed on to the new representative.
+            with self._lock:
+                feed_parser, entry = self._entries.pop(new_representative)
+            try:
+                self._submit_news(feed_parser, entry, new_representative)
+            except RuntimeError:
+                # The executor has been shut down at the end of the run.
+                self._pending.release()
+        else:
+            self._score_queue.put((news, True))
+
+    def _discard_future(self, future_obj):
+        with self._lock:
+            self._news_futures.discard(future_obj)
+
+        if future_obj.cancelled():
+            self._pending.release()
+
+    def _wait_for_news(self):
+        # News may be submitted while waiting, in place of news which fail.
+        deadline = timer() + self.news_timeout
+        while True:
+            with self._lock:
+                remaining = set(self._news_futures)
+            if not remaining:
+                return
+
+            _, not_done = futures.wait(remaining, timeout=max(deadline - timer(), 0))
+            if not_done:
+                scraper_utils.log_warning(
+                    "Timeout when retrieving news contents: %d news are dropped." % len(not_done)
+                )
+                return
+
+    def _score_news(self):
+        """Stage 3 and 4: Score news, and put news of interest to the DB writer.
+        """
+        while True:
+            item = self._score_queue.get()
+            if item is _STOP:
+                return
+
+            news, fetched = item
+            try:
+                self.score_a_news(news, fetched)
+            except Exception as err:  # pylint: disable=broad-except
+                self._scorer_error = self._scorer_error or err
+                scraper_utils.log_warning(
+                    "Fail to score %s: %s" % (str(news), str(err)), is_error=True
+                )
+            finally:
+                self._pending.release()
+
+    def score_a_news(self, news, fetched):
+        """Score a news, and put it to the DB writer if it is of interest.
+
+        It is called by the scorer thread of ``run()``, or by another source
+        of news instead of ``run()`` (See ``crawl_jobs.CrawlCoordinator``).
+
+        Args:
+            news (scraper_models.NewsRSSEntry): The news.
+            fetched (bool): Whether its content has been retrieved. If not, it
+                is a near-duplicate by title, and gets the content of its story
+                when its representative is scored.
+
+        """
+        if self.clusterer is None:
+            self._score_news_entries([news])
+            return
+
+        if not fetched:
+            if self.clusterer.defer(news):
+                return
+            news.description = news.duplicate_of.description
+            self._score_news_entries([news])
+            return
+
+        self.clusterer.add_by_content(news)
+        duplicates = self.clusterer.resolve(news)
+        for duplicate in duplicates:
+            duplicate.description = news.description
+
+        self._score_news_entries([news] + duplicates)
+
+    def reelect_representative(self, news):
+        """Elect another news of a story whose representative can not be retrieved.
+
+        Args:
+            news (scraper_models.NewsRSSEntry): The news whose content can not be retrieved.
+
+        Returns:
+            scraper_models.NewsRSSEntry: A duplicate of the news, whose content
+                should be retrieved and scored instead, or None.
+
+        """
+        if self.clusterer is None:
+            return None
+
+        return self.clusterer.reelect(news)
+
+    def _score_news_entries(self, news_entries):
+        """Score news of a story, and put the best-scoring one to the DB writer if it is of interest.
+        """
+        with self._lock:
+            for news in news_entries:
+                self._entries.pop(news, None)
+
+        for news in news_entries:
+            with scraper_metrics.measure("score"):
+                news.set_rules(self.scraping_rules)
+            self.news_count += 1
+            if self.keep_news:
+                self.news_entries.append(news)
+
+        # The first one wins a tie, i.e. the representative.
+        best = max(news_entries, key=lambda news: news.total_score)
+        if is_news_to_store(best, self.clusterer):
+            self.db_writer.put(best)  # Blocks while the writer is full.
+            self.target_count += 1
+            if self.keep_news:
+                self.stored_entries.append(best)
@@ -0,0 +1,118 @@
+"""Prune old news, with their scores and relationships, from the database.
+
+News out of the retention limits of ``settings.RETENTION_CONFIG`` (older than
+``max_age_days``, or beyond the newest ``max_rows`` news) are deleted in small
+batches, each in its own short transaction, so that the tables are never locked
+for long. If ``archive_file`` is set, the news are appended to that gzipped
+JSON lines file before they are deleted.
+
+Example:
+    This module can be executed directly:
+
+    .. code-block:: console
+
+        $ python prune_news_data.py
+
+"""
+# Standard library
+import gzip
+import json
+import logging
+import time
+from datetime import date, datetime, timedelta
+# PyPI
+import pytz
+# Local modules
+from db_news_api import NewsDatabaseAPI
+from db_backends import get_database
+from settings import DATABASE_CONFIG, RETENTION_CONFIG
+
+
+def prune_news_data(db_session=None, config=RETENTION_CONFIG):
+    """Delete news out of the retention limits from DB.
+
+    Args:
+        db_session (db_session.PostgresSession, optional): A long-lived session
+            to get the DB connection from. Defaults to None, which means a new
+            connection is opened by ``db_backends.get_database()``.
+
+        config (dict, optional): Retention settings, in the form of
+            ``settings.RETENTION_CONFIG``.
+
+    Returns:
+        int: Number of deleted news.
+
+    """
+    if config["max_age_days"] is None and config["max_rows"] is None:
+        return 0
+
+    created_before = None
+    if config["max_age_days"] is not None:
+        created_before = datetime.now(pytz.utc) - timedelta(days=config["max_age_days"])
+
+    if db_session:
+        database = db_session.connection()
+    else:
+        database = get_database(DATABASE_CONFIG)
+
+    deleted_count = 0
+    with database as conn:
+        db_api = NewsDatabaseAPI(conn)
+
+        while True:
+            news_ids = db_api.get_expired_news_ids(
+                created_before=created_before,
+                keep_newest=config["max_rows"],
+                limit=config["batch_size"]
+            )
+            if not news_ids:
+                break
+
+            if config["archive_file"]:
+                archive_news_data(db_api.get_news_rows_by_ids(news_ids), config["archive_file"])
+
+            db_api.delete_news_data(news_ids)
+            deleted_count += len(news_ids)
+
+            if len(news_ids) < config["batch_size"]:
+                break
+
+            # Let other writers in between batches.
+            time.sleep(config["batch_pause"])
+
+    logging.info("Pruned %d old news from DB.", deleted_count)
+    return deleted_count
+
+
+def archive_news_data(news_rows, filename):
+    """Append news to a gzipped JSON lines file, one news per line.
+
+    Each call appends a new gzip member, and the file can be read as a whole
+    by ``gzip.open()``.
+
+    Args:
+        news_rows (Iterable(dict)): News read by ``NewsDatabaseAPI.get_news_rows_by_ids()``.
+        filename (str): The archive file.
+
+    """
+    with gzip.open(filename, "at", encoding="utf-8") as outfile:
+        for news_row in news_rows:
+            print(json.dumps(news_row, ensure_ascii=False, default=_to_json), file=outfile)
+
+
+def _to_json(obj):
+    if isinstance(obj, (date, datetime)):
+        return obj.isoformat()
+
+    raise TypeError("%r is not JSON serializable" % obj)
+
+
+def main():
+    """Prune news out of the retention limits of ``settings.RETENTION_CONFIG``.
+    """
+    logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s\n")
+    prune_news_data()
+
+
+if __name__ == "__main__":
+    main()
@@ -10,7 +10,7 @@ Example:
 """
 # Local modules
 from db_news_api import NewsDatabaseAPI
-from db_operation_api.mydb import get_database
+from db_backends import get_database
 from settings import DATABASE_CONFIG
 
 
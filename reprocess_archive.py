@@ -0,0 +1,210 @@
+"""Extract, score and store news again from archived responses, without a network.
+
+Feeds captured in the archive (See ``response_archive.py``) are parsed again,
+and their news contents are extracted from the archived local news by the
+current parsers and extraction profiles. News are scored by the current rule
+file, and stored to DB. News which already exist in DB get the new contents.
+
+Each captured feed is processed as it was at the time of capture, and news of
+all of them are deduplicated as in a scrape run. Local news are read from the
+latest capture of their urls. Nothing is retrieved from the network: a local
+news which is not in the archive is skipped. Other threads of the process
+(e.g. of the daemon in ``schedule.py``) still retrieve news from the network.
+
+If ``SCRAPER_CONFIG["news_index_file"]`` is set, the news index is updated
+with the new contents, so that later rule changes rescore the right news.
+
+Example:
+    This module can be executed directly:
+
+    .. code-block:: console
+
+        $ python reprocess_archive.py --since 2018-02-19 --until 2018-02-20
+
+"""
+# Standard library
+import argparse
+import logging
+from datetime import datetime, timezone
+from functools import partial
+# Local modules
+import rss_feed_parsers
+import scraper_utils
+from collect_news_to_db import ScraperState, sync_scraping_rules
+from db_backends import get_database
+from db_indexes import check_conflict_indexes
+from db_news_api import NewsDatabaseAPI
+from db_writer import NewsDatabaseWriter
+from news_pipeline import NewsPipeline
+from news_sources import get_news_source_registry
+from response_archive import ResponseArchive
+from scraping_rules_reader import get_compiled_rules_from_file
+from settings import ARCHIVE_CONFIG, DATABASE_CONFIG, FEED_PARSER_CONFIG, SCRAPER_CONFIG
+from story_clusters import StoryClusterer
+
+
+class ArchivedNewsSource(object):
+    """A captured feed of a news source, in the interface of ``news_sources.NewsSource``.
+
+    Args:
+        archive (response_archive.ResponseArchive): The archive.
+        entry (dict): Index entry of the captured feed.
+        news_src (news_sources.NewsSource): The news source of the feed.
+        category (str): Category of the feed.
+
+    """
+
+    def __init__(self, archive, entry, news_src, category):
+        self.archive = archive
+        self.entry = entry
+        self.categories = [category]
+        self.feed_parser = news_src.feed_parser
+
+    def get_rss_url(self, category):
+        return self.entry["url"]
+
+    def get_raw_feed_object(self, category):
+        raw_feed = rss_feed_parsers.parse_raw_feed(
+            self.entry["url"], self.archive.read(self.entry)
+        )
+        # See news_sources.NewsSource.get_raw_feed_object()
+        raw_feed.feed.link = self.entry["url"]
+        return raw_feed
+
+
+def get_archived_news_sources(archive, since=None, until=None):
+    """Get captured feeds of registered news sources.
+
+    Args:
+        archive (response_archive.ResponseArchive): The archive.
+        since (datetime, optional): Only feeds captured at or after this time.
+        until (datetime, optional): Only feeds captured before this time.
+
+    Returns:
+        dict: A registry of news sources for ``NewsPipeline.run()``, with one
+            source for each captured feed.
+
+    """
+    feeds_by_url = {}
+    for news_source_class in get_news_source_registry().values():
+        news_src = news_source_class()
+        for category in news_src.categories:
+            feeds_by_url[news_src.get_rss_url(category)] = (news_src, category)
+
+    news_sources = {}
+    for entry in archive.entries(kind="feed", since=since, until=until):
+        if entry["url"] not in feeds_by_url:
+            scraper_utils.log_warning(
+                "Skip the archived feed '%s' of no registered news source." % entry["url"]
+            )
+            continue
+
+        news_src, category = feeds_by_url[entry["url"]]
+        name = "%s %s %s" % (news_src.__class__.__name__, category, entry["time"])
+        news_sources[name] = partial(ArchivedNewsSource, archive, entry, news_src, category)
+
+    return news_sources
+
+
+def reprocess_archive(archive, since=None, until=None, db_session=None, state=None):
+    """Extract, score and store news of captured feeds again.
+
+    Args:
+        archive (response_archive.ResponseArchive): The archive.
+
+        since (datetime, optional): Only feeds captured at or after this time.
+
+        until (datetime, optional): Only feeds captured before this time.
+
+        db_session (db_session.PostgresSession, optional): A long-lived session
+            to get the DB connection from. Defaults to None, which means a new
+            connection is opened by ``db_backends.get_database()``.
+
+        state (collect_news_to_db.ScraperState, optional): State kept between
+            runs, whose news index is updated. Defaults to None, which means the
+            news index is loaded from its file.
+
+    Returns:
+        news_pipeline.NewsPipeline: The pipeline which has been run.
+
+    """
+    news_sources = get_archived_news_sources(archive, since, until)
+    logging.info("Reprocess %d archived feeds.", len(news_sources))
+
+    rules_from_file = get_compiled_rules_from_file(SCRAPER_CONFIG["rule_file"])
+    news_index_file = SCRAPER_CONFIG["news_index_file"]
+
+    if state is None:
+        state = ScraperState()
+
+    if db_session:
+        database = db_session.connection()
+    else:
+        database = get_database(DATABASE_CONFIG)
+
+    news_index = None
+    if news_index_file:
+        news_index = state.get_news_index(news_index_file)
+
+    with database as conn:
+        check_conflict_indexes(conn)
+        # Contents of news which already exist in DB are indexed again when updated.
+        db_api = NewsDatabaseAPI(conn, news_index=news_index)
+
+        if news_index is not None:
+            news_index.sync(db_api)
+
+        sync_scraping_rules(db_api, rules_from_file)
+
+        clusterer = StoryClusterer() if FEED_PARSER_CONFIG["cluster_stories"] else None
+        with NewsDatabaseWriter(db_api, update_contents=True) as db_writer:
+            # Local news are read from the archive instead of the network.
+            pipeline = NewsPipeline(
+                rules_from_file, db_writer, clusterer, fetch_url=archive.fetch_url
+            )
+            pipeline.run(news_sources)
+
+    if news_index_file:
+        news_index.save(news_index_file)
+
+    logging.info(
+        "Stored %d news out of total %d archived news.", pipeline.target_count, pipeline.news_count
+    )
+    return pipeline
+
+
+def _parse_time(value):
+    parsed_time = datetime.fromisoformat(value)
+    return parsed_time if parsed_time.tzinfo else parsed_time.replace(tzinfo=timezone.utc)
+
+
+def main():
+    """Extract, score and store news again from archived responses.
+    """
+    arg_parser = argparse.ArgumentParser(description=main.__doc__)
+    arg_parser.add_argument(
+        "--archive", default=ARCHIVE_CONFIG["directory"],
+        help="Directory of the archive (default: %(default)s)"
+    )
+    arg_parser.add_argument(
+        "--since", type=_parse_time,
+        help="Only feeds captured at or after this time (ISO 8601, UTC by default)"
+    )
+    arg_parser.add_argument(
+        "--until", type=_parse_time,
+        help="Only feeds captured before this time (ISO 8601, UTC by default)"
+    )
+    args = arg_parser.parse_args()
+
+    log_format = "[%(levelname)s] %(message)s\n"
+    scraper_utils.setup_logger(
+        "error_log", level=logging.WARNING, logfile=SCRAPER_CONFIG["error_log"],
+        to_console=False, log_format=log_format
+    )
+    logging.basicConfig(level=logging.INFO, format=log_format)
+
+    reprocess_archive(ResponseArchive(args.archive), args.since, args.until)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""This module archives raw responses of feeds and local news in WARC files.
+
+In capture mode (``ARCHIVE_CONFIG["capture"]``), every feed and local news
+retrieved by ``rss_feed_parsers`` is appended to the archive, so that past
+pages can be extracted, scored and stored again after a parser is fixed or
+added, without retrieving them again (See ``reprocess_archive.py``).
+
+An archive is a directory of:
+
+    - ``responses-YYYYMMDD.warc.gz``: Append-only WARC/1.1 files, one per day.
+      Each response is a "resource" record compressed as its own gzip member,
+      so a record can be read without decompressing the others, and the file
+      can be read as a whole by WARC tools.
+    - ``index.jsonl``: One line per record, in the order of capture:
+
+      .. code-block:: json
+
+          {"kind": "article", "url": "https://www.cna.com.tw/news/aopl/1.aspx",
+           "time": "2018-02-19T09:00:00Z", "file": "responses-20180219.warc.gz",
+           "offset": 1024, "length": 2048, "digest": "sha1:..."}
+
+Example:
+    .. code-block:: python
+
+        response_archive.start_capture("response_archive")
+        ...  # Responses retrieved here are archived by capture()
+        response_archive.stop_capture()
+
+        archive = ResponseArchive("response_archive")
+        for entry in archive.entries(kind="feed"):
+            print(entry["url"], len(archive.read(entry)))
+
+"""
+# Standard library
+import base64
+import gzip
+import hashlib
+import json
+import os
+import threading
+import uuid
+from datetime import datetime, timezone
+from urllib.error import URLError
+# Local modules
+import scraper_utils
+from url_canonicalizer import canonicalize_url
+
+# Kinds of responses, and their content types
+KINDS = {
+    "feed": "application/rss+xml",
+    "article": "text/html",
+}
+
+_INDEX_FILE = "index.jsonl"
+_TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+class ResponseArchive(object):
+    """An append-only archive of raw responses, indexed by url and time.
+
+    Args:
+        directory (str): Directory of the archive. It is created if needed.
+
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._index = None
+        self._latest = None  # (kind, url) ==> the latest entry
+        os.makedirs(directory, exist_ok=True)
+
+    def append(self, kind, url, content, captured_at=None):
+        """Append a response to the archive.
+
+        Args:
+            kind (str): "feed" or "article".
+            url (str): The url which was retrieved.
+            content (bytes): The response body.
+            captured_at (datetime, optional): When the response was retrieved.
+                Defaults to now.
+
+        Returns:
+            dict: The index entry of the response.
+
+        """
+        if kind not in KINDS:
+            raise scraper_utils.NewsScrapperError("Unknown kind of response '%s'." % kind)
+
+        captured_at = (captured_at or datetime.now(timezone.utc)).astimezone(timezone.utc)
+        digest = "sha1:" + base64.b32encode(hashlib.sha1(content).digest()).decode("ascii")
+        headers = (
+            "WARC/1.1\r\n"
+            "WARC-Type: resource\r\n"
+            "WARC-Record-ID: <urn:uuid:%s>\r\n"
+            "WARC-Date: %s\r\n"
+            "WARC-Target-URI: %s\r\n"
+            "WARC-Payload-Digest: %s\r\n"
+            "Content-Type: %s\r\n"
+            "Content-Length: %d\r\n"
+            "\r\n"
+        ) % (
+            uuid.uuid4(), captured_at.strftime(_TIME_FORMAT), url, digest, KINDS[kind],
+            len(content)
+        )
+        record = gzip.compress(headers.encode("utf-8") + content + b"\r\n\r\n")
+
+        entry = {
+            "kind": kind,
+            "url": url,
+            "time": captured_at.strftime(_TIME_FORMAT),
+            "file": "responses-%s.warc.gz" % captured_at.strftime("%Y%m%d"),
+            "offset": 0,
+            "length": len(record),
+            "digest": digest,
+        }
+
+        with self._lock:
+            with open(os.path.join(self.directory, entry["file"]), "ab") as outfile:
+                entry["offset"] = outfile.tell()
+                outfile.write(record)
+
+            # The record is written before it is indexed, so that an entry
+            # always points to a complete record.
+            with open(os.path.join(self.directory, _INDEX_FILE), "a", encoding="utf-8") as outfile:
+                print(json.dumps(entry, ensure_ascii=False), file=outfile)
+
+            if self._index is not None:
+                self._add_to_index(entry)
+
+        return entry
+
+    def entries(self, kind=None, since=None, until=None):
+        """Get index entries of responses, in the order of capture.
+
+        Args:
+            kind (str, optional): Only responses of this kind. Defaults to all kinds.
+            since (datetime, optional): Only responses captured at or after this time.
+            until (datetime, optional): Only responses captured before this time.
+
+        Returns:
+            list(dict): The index entries.
+
+        """
+        with self._lock:
+            index = self._get_index()
+
+        return [
+            entry for entry in index
+            if (kind is None or entry["kind"] == kind)
+            and (since is None or _parse_time(entry["time"]) >= since)
+            and (until is None or _parse_time(entry["time"]) < until)
+        ]
+
+    def latest(self, kind, url):
+        """Get the index entry of the latest response of a url.
+
+        Returns:
+            dict: The index entry, or None if the url is not in the archive.
+
+        """
+        with self._lock:
+            self._get_index()
+            return self._latest.get((kind, url))
+
+    def read(self, entry):
+        """Read the response body of an index entry.
+
+        Args:
+            entry (dict): An entry returned by ``entries()`` or ``latest()``.
+
+        Returns:
+            bytes: The response body.
+
+        """
+        with open(os.path.join(self.directory, entry["file"]), "rb") as infile:
+            infile.seek(entry["offset"])
+            record = gzip.decompress(infile.read(entry["length"]))
+
+        headers, _, body = record.partition(b"\r\n\r\n")
+        for line in headers.decode("utf-8").split("\r\n"):
+            name, _, value = line.partition(":")
+            if name.lower() == "content-length":
+                return body[:int(value)]
+
+        raise scraper_utils.NewsScrapperError(
+            "Record of '%s' in '%s' has no Content-Length." % (entry["url"], entry["file"])
+        )
+
+    def fetch_url(self, url, timeout=None):
+        """Get the latest archived local news of a url, instead of retrieving it.
+
+        It has the interface of ``scraper_utils.fetch_url()``.
+
+        Raises:
+            URLError: If the url is not in the archive.
+
+        """
+        entry = self.latest("article", canonicalize_url(url))
+        if entry is None:
+            raise URLError("'%s' is not in the archive" % url)
+
+        return self.read(entry)
+
+    def _get_index(self):
+        if self._index is None:
+            self._index = []
+            self._latest = {}
+
+            try:
+                with open(os.path.join(self.directory, _INDEX_FILE), encoding="utf-8") as infile:
+                    for line in infile:
+                        try:
+                            self._add_to_index(json.loads(line))
+                        except json.decoder.JSONDecodeError:
+                            # A line which was being written when the process was killed
+                            scraper_utils.log_warning(
+                                "Skip a broken line in the index of archive '%s'."
+                                % self.directory
+                            )
+            except FileNotFoundError:
+                pass
+
+        return self._index
+
+    def _add_to_index(self, entry):
+        self._index.append(entry)
+        self._latest[(entry["kind"], entry["url"])] = entry
+
+
+def _parse_time(value):
+    return datetime.strptime(value, _TIME_FORMAT).replace(tzinfo=timezone.utc)
+
+
+# The archive which responses are captured to, if capture mode is on.
+_CAPTURE_ARCHIVE = None
+
+
+def start_capture(directory):
+    """Start to archive all responses of feeds and local news to a directory.
+    """
+    global _CAPTURE_ARCHIVE  # pylint: disable=global-statement
+    _CAPTURE_ARCHIVE = ResponseArchive(directory)
+
+
+def stop_capture():
+    """Stop archiving responses.
+    """
+    global _CAPTURE_ARCHIVE  # pylint: disable=global-statement
+    _CAPTURE_ARCHIVE = None
+
+
+def capture(kind, url, content):
+    """Archive a response if capture mode is on.
+
+    Failures are logged, so that they never break scraping.
+
+    Args:
+        kind (str): "feed" or "article".
+        url (str): The url which was retrieved.
+        content (bytes): The response body.
+
+    """
+    archive = _CAPTURE_ARCHIVE
+    if archive is None:
+        return
+
+    try:
+        archive.append(kind, url, content)
+    except OSError as err:
+        scraper_utils.log_warning("Fail to archive '%s': %s" % (url, str(err)))
@@ -2,25 +2,36 @@
 """
 # Standard library
 import logging
+import threading
+from collections import OrderedDict
 from concurrent import futures
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
 from timeit import default_timer as timer
 from urllib.error import HTTPError, URLError
-from urllib.request import urlopen
 # PyPI
 import feedparser
 from bs4 import BeautifulSoup
-from dateutil import parser as date_parser
 # Local modules
 from settings import FEED_PARSER_CONFIG
-from local_news_parsers import DefaultHtmlNewsParser, get_local_parser_registry
+from local_news_parsers import (
+    DefaultHtmlNewsParser, extract_news_content, get_local_parser_registry,
+    init_parser_process
+)
+import response_archive
+import scraper_metrics
 import scraper_utils
 from scraper_models import NewsRSSEntry, RssFeed
+from rss_xml_reader import parse_rss_date, read_feed
+from url_canonicalizer import canonicalize_url, unwrap_redirect
 
 
 def get_raw_feed_obj(url):
     """Checks that the url is valid, and retrieves the RSS feed by the url.
 
+    The feed is retrieved once, and parsed by ``rss_xml_reader.read_feed()``
+    (or by feedparser if FEED_PARSER_CONFIG["native_rss_parser"] is False).
+
     Args:
         url (str): The RSS link to retrieve.
 
@@ -38,11 +49,32 @@ def get_raw_feed_obj(url):
     """
 
     # 'feedparser' does not raise exceptions when RSS url returns 404 Error
-    # So use urlopen() to force raising HTTPError or URLError
-    with urlopen(url):
-        pass
+    # So retrieve the feed by fetch_url() to force raising HTTPError or URLError
+    domain_name = scraper_utils.extract_domain_name_from_url(url)
+    with scraper_metrics.measure("feed_fetch", domain_name) as measurement:
+        data = scraper_utils.fetch_url(url, FEED_PARSER_CONFIG["http_timeout"])
+        measurement.add_bytes(len(data))
+
+    response_archive.capture("feed", url, data)
+    return parse_raw_feed(url, data)
+
 
-    return feedparser.parse(url)
+def parse_raw_feed(url, data):
+    """Parse a retrieved RSS feed.
+
+    Args:
+        url (str): The RSS link where the feed was retrieved.
+        data (bytes): The content of the feed.
+
+    Returns:
+        dict: A dictionary representing the RSS feed. See ``get_raw_feed_obj()``.
+
+    """
+    with scraper_metrics.measure("feed_parse", scraper_utils.extract_domain_name_from_url(url)):
+        if FEED_PARSER_CONFIG["native_rss_parser"]:
+            return read_feed(data)
+
+        return feedparser.parse(data)
 
 
 def _get_rss_source_name_by_title(title):
@@ -59,13 +91,132 @@ def _get_rss_source_name_by_title(title):
         return 'others'
 
 
+class _ContentCache(object):
+    """A thread-safe LRU cache of news contents, keyed by canonical urls.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._contents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        with self._lock:
+            content = self._contents.get(url)
+            if content is not None:
+                self._contents.move_to_end(url)
+            return content
+
+    def put(self, url, content):
+        with self._lock:
+            self._contents[url] = content
+            self._contents.move_to_end(url)
+            while len(self._contents) > self.max_size:
+                self._contents.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._contents.clear()
+
+
+class _HtmlParserPool(object):
+    """Parses HTML of local news in worker processes.
+
+    Retrieving local news is I/O bound and stays in the threads which retrieve
+    news (e.g. of ``news_pipeline.NewsPipeline``), while parsing HTML by
+    BeautifulSoup is CPU bound and can not scale across threads under the GIL.
+    A thread retrieves the page, and waits for a worker process to parse it.
+
+    Args:
+        processes (int): Number of worker processes. None means the number of
+            CPUs, and 0 means to parse in the calling thread.
+
+    """
+
+    def __init__(self, processes):
+        self.processes = processes
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def extract(self, html_parser, url, html):
+        """Extract the news content by ``local_news_parsers.extract_news_content()``.
+        """
+        if self.processes == 0:
+            news_content, selector_results = extract_news_content(html_parser, url, html)
+        else:
+            try:
+                future_obj = self._get_executor().submit(
+                    extract_news_content, html_parser, url, html
+                )
+                news_content, selector_results = future_obj.result()
+            except BrokenProcessPool:
+                # A worker died. Parse here, and start a new pool for next news.
+                scraper_utils.log_warning("HTML parser pool is broken when parsing '%s'" % url)
+                self.shutdown()
+                news_content, selector_results = extract_news_content(html_parser, url, html)
+
+        # Success rates of selectors are kept in this process.
+        html_parser.record_selector_results(selector_results)
+        return news_content
+
+    def shutdown(self):
+        """Stop the worker processes. They will be started again when needed.
+        """
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = futures.ProcessPoolExecutor(
+                    max_workers=self.processes, initializer=init_parser_process
+                )
+            return self._executor
+
+
+_CONTENT_CACHE = _ContentCache(FEED_PARSER_CONFIG["content_cache_size"])
+_PARSER_POOL = _HtmlParserPool(FEED_PARSER_CONFIG["html_parser_processes"])
+
+
+def shutdown_parser_pool():
+    """Stop the processes which parse HTML of local news.
+
+    They are started again when needed. A long-running process should call
+    this before it exits, so that the parser processes do not outlive it.
+    """
+    _PARSER_POOL.shutdown()
+
+
+def clear_content_cache():
+    """Forget the contents of local news cached by previous runs.
+    """
+    _CONTENT_CACHE.clear()
+
+
 def _get_content_from_local_source(
         news_source, local_news_link, html_parser):
     """Get news content from a local news link.
+
+    The page is retrieved by the link in this thread, and parsed by a worker
+    process. Contents are cached by the canonical url of the link. Failures are
+    not cached, nor are pages retrieved by another fetcher than the network
+    (See ``scraper_utils.use_fetcher()``), which are not captured either.
     """
 
+    canonical_link = canonicalize_url(local_news_link)
+    domain_name = scraper_utils.extract_domain_name_from_url(canonical_link)
+    from_network = scraper_utils.get_fetcher() is None
+    content = _CONTENT_CACHE.get(canonical_link) if from_network else None
+    if content is not None:
+        scraper_metrics.record("article_cache", domain_name)
+        return content
+
     try:
-        description = html_parser.get_news_content_from_url(local_news_link).strip()
+        with scraper_metrics.measure("article_fetch", domain_name) as measurement:
+            html = scraper_utils.fetch_url(local_news_link, FEED_PARSER_CONFIG["http_timeout"])
+            measurement.add_bytes(len(html))
     except HTTPError as err:
         scraper_utils.log_warning(
             "HTTP Error %d for local news '%s'" % (err.code, local_news_link)
@@ -76,8 +227,22 @@ def _get_content_from_local_source(
             "URL Error [%s] for local news '%s'" % (err.reason, local_news_link)
         )
         return None
+    except OSError as err:
+        # e.g. socket.timeout when reading the response
+        scraper_utils.log_warning(
+            "Error [%s] for local news '%s'" % (err, local_news_link)
+        )
+        return None
 
-    return "(Extracted from '%s')\n%s" % (news_source, description)
+    if from_network:
+        response_archive.capture("article", canonical_link, html)
+
+    with scraper_metrics.measure("html_parse", domain_name):
+        description = _PARSER_POOL.extract(html_parser, local_news_link, html)
+    content = "(Extracted from '%s')\n%s" % (news_source, description)
+    if from_network:
+        _CONTENT_CACHE.put(canonical_link, content)
+    return content
 
 
 def _pickle_feed_object_to_file(url, feed):
@@ -143,6 +308,9 @@ class RSSFeedParser(object):
         one of the local news sources.
 
         Therefore, retrieve entries in parallel.
+
+        Near-duplicates of a story are not skipped here. ``news_pipeline.NewsPipeline``
+        clusters stories while retrieving news.
         """
         start_time = timer()
         news_source = _get_rss_source_name_by_title(feed_link)
@@ -158,15 +326,8 @@ class RSSFeedParser(object):
 
             for entry in entries:
                 # For description
-                future_obj = executor.submit(cls._get_description, entry)
-                future_url_map[future_obj] = NewsRSSEntry(
-                    cls._get_title(entry),
-                    "",
-                    cls._get_link(entry),
-                    cls._get_time(entry),
-                    news_source,
-                    category
-                )
+                future_obj = executor.submit(cls.get_news_content, entry)
+                future_url_map[future_obj] = cls.get_news_entry(entry, feed_link, category)
 
             done_iter = futures.as_completed(
                 future_url_map,
@@ -195,6 +356,43 @@ class RSSFeedParser(object):
             )
             logging.debug(msg)
 
+    @classmethod
+    def get_news_entry(cls, entry, feed_link, category=None):
+        """Get a news from an entry of a raw RSS feed, without its content.
+
+        The content is retrieved by ``get_news_content(entry)``, which may take time.
+
+        Args:
+            entry (dict): An entry in ``raw_feed.entries``.
+            feed_link (str): Url of the feed.
+            category (str, optional): Category of the RSS source.
+
+        Returns:
+            NewsRSSEntry: The news, whose description is "".
+
+        """
+        return NewsRSSEntry(
+            cls._get_title(entry),
+            "",
+            cls._get_link(entry),
+            cls._get_time(entry),
+            _get_rss_source_name_by_title(feed_link),
+            category
+        )
+
+    @classmethod
+    def get_news_content(cls, entry):
+        """Get the content of the news of an entry of a raw RSS feed.
+
+        Args:
+            entry (dict): An entry in ``raw_feed.entries``.
+
+        Returns:
+            str: The news content.
+
+        """
+        return cls._get_description(entry)
+
     @staticmethod
     def _get_title(feed):
         return feed.title
@@ -224,9 +422,10 @@ class RSSFeedParser(object):
             # Using datetime.datetime(*feed.feed.published_parsed[:-3]) can not
             # preserve original timezone information
             # So use dateutil.parser().parse(feed.feed.published) instead
+            # (parse_rss_date() parses common RFC 822 dates faster, then falls back to it)
             # Reference:
             # https://stackoverflow.com/questions/20867795/python-how-to-get-timezone-from-rss-feed
-            published_time = date_parser.parse(feed.published)
+            published_time = parse_rss_date(feed.published)
 
         except AttributeError:
             # feed.published is not provided
@@ -285,7 +484,8 @@ class GoogleFeedParser(RSSFeedParser):
             news_title = local_src.a.get_text()
             news_source = local_src.font.get_text()
             try:
-                news_link = local_src.a["href"]
+                # Links of Google News redirect to the local news.
+                news_link = unwrap_redirect(local_src.a["href"])
             except AttributeError:
                 continue
 
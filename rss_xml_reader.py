@@ -0,0 +1,199 @@
+"""This module reads RSS 2.0 feeds of news sources without ``feedparser``.
+
+``feedparser`` handles every feed format, but it is slow for the plain RSS 2.0
+feeds of Google News and Yahoo News. ``read_feed()`` parses such feeds
+incrementally by ``xml.etree.ElementTree.XMLPullParser``, and returns an object
+with the fields read by ``rss_feed_parsers.RSSFeedParser``, accessible in the
+same way as the result of ``feedparser.parse()``:
+
+    feed.feed.{title, subtitle, link, language, published}
+    feed.entries[i].{title, link, description, published}
+
+Anything unusual (other formats, relative links, text which ``feedparser``
+would rewrite, malformed XML, ...) is handed over to ``feedparser``, so that
+the result is the same with either parser.
+
+Example:
+    .. code-block:: python
+
+        feed = read_feed(scraper_utils.fetch_url(rss_url))
+        published_time = parse_rss_date(feed.entries[0].published)
+
+"""
+# Standard library
+import re
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from functools import lru_cache
+# PyPI
+import feedparser
+from dateutil import parser as date_parser
+from dateutil import tz
+try:
+    from feedparser.sanitizer import _sanitize_html
+except ImportError:  # feedparser < 6, as pinned in requirements.txt
+    from feedparser import _sanitizeHTML as _sanitize_html
+
+_CHUNK_SIZE = 64 * 1024
+
+# <tag in RSS> ==> <key in feedparser>
+_CHANNEL_FIELDS = {
+    "title": "title", "description": "subtitle", "link": "link",
+    "language": "language", "pubDate": "published",
+}
+_ITEM_FIELDS = {
+    "title": "title", "description": "description", "link": "link", "pubDate": "published",
+}
+# Fields containing HTML, sanitized in the same way as feedparser
+_HTML_FIELDS = {"description"}
+
+# Text that feedparser would not keep as it is, e.g. "&#39;" or "Q&A <i>x</i>"
+_ENTITY_PATTERN = re.compile(r"&#?\w+;")
+
+_RFC822_PATTERN = re.compile(
+    r"^(?:[A-Za-z]{3},\s*)?(\d{1,2})\s+([A-Za-z]{3})\s+(\d{4})\s+"
+    r"(\d{2}):(\d{2})(?::(\d{2}))?\s+(GMT|UTC|Z|[+-]\d{4})$"
+)
+_MONTHS = {
+    name: number for number, name in enumerate(
+        ("Jan", "Feb", "Mar", "Apr", "May", "Jun",
+         "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"), 1
+    )
+}
+
+
+class FeedDict(dict):
+    """A dict whose keys are also accessible as attributes, like ``feedparser.FeedParserDict``.
+
+    Accessing a missing attribute raises AttributeError.
+    """
+
+    def __getattr__(self, key):
+        try:
+            return self[key]
+        except KeyError:
+            raise AttributeError(key)
+
+    def __setattr__(self, key, value):
+        self[key] = value
+
+
+class _UnusualFeedError(Exception):
+    """The feed should be parsed by feedparser.
+    """
+    pass
+
+
+def read_feed(data):
+    """Parse a RSS feed.
+
+    Args:
+        data (bytes): The raw RSS feed.
+
+    Returns:
+        FeedDict or feedparser.FeedParserDict: The parsed feed, with fields
+            ``feed`` and ``entries``.
+
+    """
+    try:
+        return _read_rss(data)
+    except (ET.ParseError, _UnusualFeedError):
+        return feedparser.parse(data)
+
+
+@lru_cache(maxsize=4096)
+def parse_rss_date(value):
+    """Parse a date in RSS feeds, e.g. "Mon, 19 Feb 2018 08:15:52 GMT".
+
+    Dates in RFC 822 format with a numeric or UTC timezone are parsed directly.
+    Others are parsed by ``dateutil``. Feeds repeat the same dates, so results are cached.
+
+    Args:
+        value (str): The date.
+
+    Returns:
+        datetime.datetime: The date.
+
+    Raises:
+        ValueError: If ``value`` is not a date.
+
+    """
+    match = _RFC822_PATTERN.match(value.strip())
+    if match is None or match.group(2).title() not in _MONTHS:
+        return date_parser.parse(value)
+
+    day, month, year, hour, minute, second, zone = match.groups()
+    if zone in ("GMT", "UTC", "Z"):
+        tzinfo = tz.tzutc()
+    else:
+        offset = int(zone[1:3]) * 3600 + int(zone[3:]) * 60
+        tzinfo = tz.tzutc() if offset == 0 else tz.tzoffset(None, -offset if zone[0] == "-" else offset)
+
+    return datetime(
+        int(year), _MONTHS[month.title()], int(day),
+        int(hour), int(minute), int(second or 0), tzinfo=tzinfo
+    )
+
+
+def _read_rss(data):
+    parser = ET.XMLPullParser(events=("start", "end"))
+    feed = FeedDict(feed=FeedDict(), entries=[])
+    path = []
+
+    for start in range(0, len(data), _CHUNK_SIZE):
+        parser.feed(data[start:start + _CHUNK_SIZE])
+        _handle_events(parser.read_events(), path, feed)
+
+    parser.close()
+    _handle_events(parser.read_events(), path, feed)
+
+    if "link" not in feed.feed:
+        raise _UnusualFeedError("No link in channel")
+
+    return feed
+
+
+def _handle_events(events, path, feed):
+    for event, element in events:
+        if event == "start":
+            path.append(element.tag)
+            if len(path) == 1 and (element.tag != "rss" or element.get("version") != "2.0"):
+                raise _UnusualFeedError("Not a RSS 2.0 feed")
+            continue
+
+        path.pop()
+        depth = len(path)
+
+        if depth == 2 and element.tag == "item":
+            feed.entries.append(_read_fields(element, _ITEM_FIELDS))
+            element.clear()  # Items are no longer needed
+
+        elif depth == 1 and element.tag == "channel":
+            feed.feed.update(_read_fields(element, _CHANNEL_FIELDS, skip="item"))
+
+
+def _read_fields(element, fields, skip=None):
+    values = FeedDict()
+
+    for child in element:
+        if child.tag == skip or child.tag not in fields:
+            continue  # Including tags in namespaces, such as "{...}content"
+        if len(child):
+            raise _UnusualFeedError("Markup in <%s>" % child.tag)
+
+        key = fields[child.tag]
+        value = (child.text or "").strip()
+
+        if key in _HTML_FIELDS:
+            if "<" in value or "&" in value:
+                value = _sanitize_html(value, "utf-8", "text/html")
+
+        elif _ENTITY_PATTERN.search(value) or ("&" in value and "<" in value):
+            raise _UnusualFeedError("Text to be rewritten in <%s>" % child.tag)
+
+        values[key] = value
+
+    if fields is _ITEM_FIELDS and not values.get("link", "").startswith(("http://", "https://")):
+        raise _UnusualFeedError("No absolute link in item")
+
+    return values
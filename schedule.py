@@ -1,6 +1,20 @@
 """Schedule when to collect news (by collect_news_to_db.py).
 
-If execute directly, will collect news immediately, and then periodically collects news.
+If execute directly, runs as a long-lived daemon: collects news immediately,
+and then periodically collects news. If a retention limit is set in
+``settings.RETENTION_CONFIG``, old news are also deleted from DB periodically
+(See ``prune_news_data.py``).
+
+State is kept warm between runs: with the PostgreSQL backend, all runs share
+one long-lived DB session (``db_session.PostgresSession``), so connections and
+prepared statements are reused instead of set up for each run. Compiled rules,
+memoized scores and the news index are kept by ``ScraperState``, and local news
+contents and the HTML parser processes by ``rss_feed_parsers``.
+
+Jobs never overlap: they run one at a time, a job which is still running is
+not started again, and runs missed while the daemon was busy are coalesced
+into one run. A run can be triggered at once by ``SIGUSR1``, or through the
+control socket (``DAEMON_CONFIG["control_socket"]``).
 
 Example:
     This module can be executed directly:
@@ -8,25 +22,192 @@ Example:
     .. code-block:: console
 
         $ python schedule.py
+        $ python schedule.py --run-now  # Trigger a run of the running daemon
 
 """
+# Standard library
+import argparse
+import logging
+import os
+import signal
+import socket
+import socketserver
+import threading
+from datetime import datetime, timezone
 # PyPI
+from apscheduler.executors.pool import ThreadPoolExecutor
 from apscheduler.schedulers.blocking import BlockingScheduler
 # Local modules
-from collect_news_to_db import scrape_news_and_save_to_db
+import scraper_utils
+from collect_news_to_db import ScraperState, scrape_news_and_save_to_db
+from db_backends import get_backend_name
+from db_session import PostgresSession
+from prune_news_data import prune_news_data
+from settings import DAEMON_CONFIG, DATABASE_CONFIG, RETENTION_CONFIG
+
+_SCRAPE_JOB_ID = "scrape_news"
+_PRUNE_JOB_ID = "prune_news"
+
+
+class ScraperDaemon(object):
+    """Collect news periodically in one long-lived process.
 
+    Args:
+        db_session (db_session.PostgresSession, optional): The DB session shared
+            by all runs. Defaults to None (each run opens its own connection).
+
+        control_socket (str, optional): Path of the Unix socket to accept
+            "run" commands from. Defaults to None (no control socket).
 
-def schedule_once_an_hour():
-    """Run scrape_news_and_save_to_db() once an hour.
     """
-    scheduler = BlockingScheduler()
-    scheduler.add_job(scrape_news_and_save_to_db, 'interval', hours=1)
-    scheduler.start()
 
+    def __init__(self, db_session=None, control_socket=None):
+        self.db_session = db_session
+        self.control_socket = control_socket
+        self.state = ScraperState()
 
-if __name__ == "__main__":
-    # Runs once immediately.
-    scrape_news_and_save_to_db()
+        # One worker thread, so that scraping and pruning never share the DB
+        # session at the same time.
+        self.scheduler = BlockingScheduler(
+            executors={"default": ThreadPoolExecutor(1)},
+            job_defaults={"coalesce": True, "max_instances": 1, "misfire_grace_time": None},
+        )
+        self.scheduler.add_job(
+            self.scrape, "interval", hours=DAEMON_CONFIG["interval_hours"],
+            id=_SCRAPE_JOB_ID, next_run_time=datetime.now(timezone.utc)
+        )
+        # Pruning deletes news, so it is scheduled only if a retention limit is set.
+        if RETENTION_CONFIG["max_age_days"] is not None or RETENTION_CONFIG["max_rows"] is not None:
+            self.scheduler.add_job(
+                prune_news_data, "interval", hours=RETENTION_CONFIG["schedule_hours"],
+                id=_PRUNE_JOB_ID, kwargs={"db_session": db_session}
+            )
+        self._control_server = None
+
+    def scrape(self):
+        """Run scrape_news_and_save_to_db() with the warm state.
+        """
+        scrape_news_and_save_to_db(self.db_session, self.state)
+
+    def run_now(self):
+        """Trigger a run as soon as possible.
+
+        If a run is in progress, the trigger is coalesced into it.
+        """
+        logging.info("A run is triggered.")
+        self.scheduler.modify_job(_SCRAPE_JOB_ID, next_run_time=datetime.now(timezone.utc))
 
-    # Then runs periodically.
-    schedule_once_an_hour()
+    def start(self):
+        """Start the daemon. It blocks until the scheduler is shut down.
+        """
+        if hasattr(signal, "SIGUSR1"):
+            # The scheduler is not modified inside the signal handler, which
+            # may interrupt the scheduler itself.
+            signal.signal(
+                signal.SIGUSR1,
+                lambda signum, frame: threading.Thread(target=self.run_now).start()
+            )
+
+        if self.control_socket:
+            self._start_control_server()
+
+        try:
+            self.scheduler.start()
+        finally:
+            self._stop_control_server()
+
+    def _start_control_server(self):
+        if not hasattr(socket, "AF_UNIX"):
+            scraper_utils.log_warning("Control socket is not supported on this platform.")
+            return
+
+        if os.path.exists(self.control_socket):
+            try:
+                request_run_now(self.control_socket, command="ping")
+            except OSError:
+                # Left by a daemon which was killed
+                os.remove(self.control_socket)
+            else:
+                raise scraper_utils.NewsScrapperError(
+                    "Another daemon is listening on '%s'." % self.control_socket
+                )
+
+        self._control_server = socketserver.UnixStreamServer(
+            self.control_socket, _ControlRequestHandler
+        )
+        self._control_server.scraper_daemon = self
+        threading.Thread(target=self._control_server.serve_forever, daemon=True).start()
+
+    def _stop_control_server(self):
+        if self._control_server is not None:
+            self._control_server.shutdown()
+            self._control_server.server_close()
+            os.remove(self.control_socket)
+            self._control_server = None
+
+
+class _ControlRequestHandler(socketserver.StreamRequestHandler):
+    """Handle a command of the control socket: "run" or "ping".
+    """
+
+    def handle(self):
+        command = self.rfile.readline().decode("utf-8").strip()
+        if command == "run":
+            self.server.scraper_daemon.run_now()
+            reply = "ok"
+        elif command == "ping":
+            reply = "ok"
+        else:
+            reply = "unknown command '%s'" % command
+
+        self.wfile.write((reply + "\n").encode("utf-8"))
+
+
+def request_run_now(control_socket, command="run"):
+    """Send a command to the control socket of a running daemon.
+
+    Args:
+        control_socket (str): Path of the control socket.
+        command (str, optional): "run" to trigger a run, or "ping".
+
+    Returns:
+        str: The reply of the daemon.
+
+    Raises:
+        OSError: If no daemon is listening on the socket.
+
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(control_socket)
+        sock.sendall((command + "\n").encode("utf-8"))
+        with sock.makefile("rb") as infile:
+            return infile.readline().decode("utf-8").strip()
+
+
+def main():
+    """Collect news immediately, and then periodically with warm state.
+    """
+    arg_parser = argparse.ArgumentParser(description=main.__doc__)
+    arg_parser.add_argument(
+        "--run-now", action="store_true",
+        help="Trigger a run of the running daemon through its control socket"
+    )
+    args = arg_parser.parse_args()
+
+    if args.run_now:
+        print(request_run_now(DAEMON_CONFIG["control_socket"]))
+        return
+
+    db_session = None
+    if get_backend_name(DATABASE_CONFIG) == "postgresql":
+        db_session = PostgresSession(DATABASE_CONFIG)
+
+    try:
+        ScraperDaemon(db_session, DAEMON_CONFIG["control_socket"]).start()
+    finally:
+        if db_session:
+            db_session.close()
+
+
+if __name__ == "__main__":
+    main()
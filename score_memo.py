@@ -0,0 +1,125 @@
+"""This module memoizes scores of news computed by a set of scraping rules.
+
+The same news often appears in several categories or feeds, and comes back in
+every scheduled run. Scores only depend on the text of the news and on the
+rules, so they are memoized by the hash of the text, for a rule set
+identified by its fingerprint.
+
+A memo belongs to one rule set (``CompiledRuleSet.score_memo``), so it is
+cleared whenever the rules change. It can also be saved to a file between
+runs, and will be ignored when loaded by a rule set with another fingerprint.
+
+"""
+# Standard library
+import json
+import os
+import threading
+from collections import OrderedDict
+# Local modules
+import scraper_utils
+
+
+class ScoreMemo(object):
+    """A LRU memo mapping a content hash to the scores by a rule set.
+
+    Args:
+        fingerprint (str): Fingerprint of the rule set whose scores are memoized.
+
+        max_size (int, optional): Maximum number of entries kept in memory.
+            Defaults to None (no limit).
+
+    """
+
+    def __init__(self, fingerprint, max_size=None):
+        self.fingerprint = fingerprint
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._scores = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._scores)
+
+    def get(self, content_hash):
+        """Get memoized scores.
+
+        Args:
+            content_hash (str): Hash of the title and description of a news.
+
+        Returns:
+            tuple(int): The scores, or None if they are not memoized yet.
+
+        """
+        with self._lock:
+            scores = self._scores.get(content_hash)
+            if scores is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._scores.move_to_end(content_hash)
+
+            return scores
+
+    def put(self, content_hash, scores):
+        """Memoize scores of a news.
+
+        Args:
+            content_hash (str): Hash of the title and description of a news.
+            scores (Iterable(int)): Scores of the news by the rule set.
+
+        """
+        with self._lock:
+            self._scores[content_hash] = tuple(scores)
+            self._scores.move_to_end(content_hash)
+
+            if self.max_size is not None:
+                while len(self._scores) > self.max_size:
+                    self._scores.popitem(last=False)
+
+    def clear(self):
+        """Remove all memoized scores.
+        """
+        with self._lock:
+            self._scores.clear()
+
+    def load(self, filename):
+        """Load memoized scores saved by ``save()``.
+
+        Scores memoized for another rule set are ignored.
+
+        Args:
+            filename (str): The file to load.
+
+        """
+        if not os.path.exists(filename):
+            return
+
+        data = scraper_utils.read_json_from_file(filename)
+
+        if not data or data.get("fingerprint") != self.fingerprint:
+            return
+
+        for content_hash, scores in data.get("scores", []):
+            self.put(content_hash, scores)
+
+    def save(self, filename, max_size=None):
+        """Save the most recently used scores to a file.
+
+        Args:
+            filename (str): The file to write.
+            max_size (int, optional): Maximum number of entries to save.
+                Defaults to None (all entries).
+
+        """
+        with self._lock:
+            items = list(self._scores.items())
+
+        if max_size is not None:
+            items = items[-max_size:] if max_size > 0 else []
+
+        tmp_filename = filename + ".tmp"
+        with open(tmp_filename, "w") as outfile:
+            json.dump({"fingerprint": self.fingerprint, "scores": items}, outfile)
+
+        os.replace(tmp_filename, filename)
@@ -0,0 +1,449 @@
+"""This module records timing and throughput metrics of the stages of a run.
+
+Stages and their targets:
+
+    ==============  =========================================
+    Stage           Target
+    ==============  =========================================
+    feed_fetch      Domain name of the RSS feed
+    feed_parse      Domain name of the RSS feed
+    article_fetch   Domain name of the local news
+    article_cache   Domain name of the local news (cache hits)
+    html_parse      Domain name of the local news
+    score           (none)
+    db              Method of ``NewsDatabaseAPI``
+    ==============  =========================================
+
+For each stage and target, the number of operations, the number of failed
+operations, the bytes received, and a histogram of latencies are recorded.
+Note that the latency of html_parse includes waiting for a free worker process.
+
+At the end of a run, the metrics are written to a JSON report and to a file
+for the textfile collector of the Prometheus node exporter, so that runs can
+be compared (See ``METRICS_CONFIG``).
+
+Example:
+    .. code-block:: python
+
+        scraper_metrics.reset()
+
+        with scraper_metrics.measure("feed_fetch", "news.google.com") as measurement:
+            data = fetch_url(url)
+            measurement.add_bytes(len(data))
+
+        scraper_metrics.write_reports("scraper_metrics.json", "news_scraper.prom")
+
+"""
+# Standard library
+import bisect
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from timeit import default_timer as timer
+# Local modules
+from settings import METRICS_CONFIG
+
+_PROMETHEUS_PREFIX = "news_scraper"
+
+
+class LatencyHistogram(object):
+    """A histogram of latencies in seconds, with fixed upper bounds of buckets.
+
+    Args:
+        bounds (Iterable(float)): Upper bounds of buckets, in ascending order.
+            Latencies larger than the last bound are counted in the "+Inf" bucket.
+
+    """
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.bucket_counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.bucket_counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def merge(self, other):
+        """Add latencies of another histogram with the same bounds.
+        """
+        for index, count in enumerate(other.bucket_counts):
+            self.bucket_counts[index] += count
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def cumulative_counts(self):
+        """Get the number of latencies less than or equal to each bound.
+
+        Returns:
+            list(tuple(float, int)): <Upper bound, count>, the last bound is ``math.inf``.
+
+        """
+        counts = []
+        total = 0
+        for bound, count in zip(self.bounds + (math.inf,), self.bucket_counts):
+            total += count
+            counts.append((bound, total))
+        return counts
+
+    def quantile(self, q):
+        """Estimate a quantile by linear interpolation inside its bucket.
+
+        It is estimated in the same way as ``histogram_quantile()`` of
+        Prometheus, except that the "+Inf" bucket is bounded by the maximum.
+
+        Args:
+            q (float): The quantile, between 0 and 1.
+
+        Returns:
+            float: The estimated latency, or None if nothing is observed.
+
+        """
+        if not self.count:
+            return None
+
+        rank = q * self.count
+        lower_bound, lower_count = 0.0, 0
+        for bound, count in self.cumulative_counts():
+            if count >= rank and count > lower_count:
+                upper_bound = min(bound, self.max)
+                lower_bound = min(lower_bound, upper_bound)
+                return lower_bound + (upper_bound - lower_bound) * (
+                    (rank - lower_count) / (count - lower_count)
+                )
+            lower_bound, lower_count = bound, count
+
+        return self.max
+
+
+class StageMetrics(object):
+    """Metrics of a stage for a target.
+
+    Attributes:
+        count (int): Number of operations.
+        errors (int): Number of operations which raised exceptions.
+        bytes (int): Number of bytes received.
+        latency (LatencyHistogram): Latencies of timed operations.
+
+    """
+
+    def __init__(self, bounds):
+        self.count = 0
+        self.errors = 0
+        self.bytes = 0
+        self.latency = LatencyHistogram(bounds)
+
+    def to_dict(self):
+        latency = self.latency
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "bytes": self.bytes,
+            "latency": {
+                "count": latency.count,
+                "sum": round(latency.sum, 6),
+                "max": round(latency.max, 6),
+                "p50": _round_or_none(latency.quantile(0.5)),
+                "p90": _round_or_none(latency.quantile(0.9)),
+                "p99": _round_or_none(latency.quantile(0.99)),
+                "buckets": [
+                    ["+Inf" if bound == math.inf else bound, count]
+                    for bound, count in latency.cumulative_counts()
+                ],
+            },
+        }
+
+
+class _Measurement(object):
+    """Handle given by ``MetricsRecorder.measure()`` to add bytes to the operation.
+    """
+
+    def __init__(self):
+        self.bytes = 0
+
+    def add_bytes(self, nbytes):
+        self.bytes += nbytes
+
+
+class MetricsRecorder(object):
+    """A thread-safe recorder of metrics of the stages of a run.
+
+    Args:
+        bounds (Iterable(float), optional): Upper bounds of latency buckets in seconds.
+
+    Attributes:
+        started_at (float): Unix time when the recorder was created or reset.
+
+    """
+
+    def __init__(self, bounds=METRICS_CONFIG["latency_buckets"]):
+        self.bounds = tuple(bounds)
+        self._stages = {}  # (stage, target) ==> StageMetrics
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self._start_time = timer()
+
+    def reset(self):
+        """Forget all metrics, and start a new run.
+        """
+        with self._lock:
+            self._stages = {}
+            self.started_at = time.time()
+            self._start_time = timer()
+
+    def record(self, stage, target=None, seconds=None, nbytes=0, error=False):
+        """Record an operation.
+
+        Args:
+            stage (str): Name of the stage.
+            target (str, optional): The domain name, method, etc. of the operation.
+            seconds (float, optional): Latency of the operation. None if not timed.
+            nbytes (int, optional): Number of bytes received.
+            error (bool, optional): Whether the operation failed.
+
+        """
+        with self._lock:
+            metrics = self._stages.get((stage, target or ""))
+            if metrics is None:
+                metrics = self._stages[(stage, target or "")] = StageMetrics(self.bounds)
+
+            metrics.count += 1
+            metrics.bytes += nbytes
+            if error:
+                metrics.errors += 1
+            if seconds is not None:
+                metrics.latency.observe(seconds)
+
+    @contextmanager
+    def measure(self, stage, target=None):
+        """Time the operation inside the ``with`` block.
+
+        The operation fails if an exception is raised, which is re-raised.
+
+        Yields:
+            _Measurement: Call ``add_bytes(nbytes)`` of it to record bytes received.
+
+        """
+        measurement = _Measurement()
+        start_time = timer()
+        error = True
+        try:
+            yield measurement
+            error = False
+        finally:
+            self.record(stage, target, timer() - start_time, measurement.bytes, error)
+
+    def get_stage_latency(self, stage):
+        """Get latencies of a stage for all targets.
+
+        Returns:
+            LatencyHistogram: A histogram which merges those of all targets.
+
+        """
+        histogram = LatencyHistogram(self.bounds)
+        with self._lock:
+            for (stage_name, _), metrics in self._stages.items():
+                if stage_name == stage:
+                    histogram.merge(metrics.latency)
+        return histogram
+
+    def get_report(self, **summary):
+        """Get metrics of the run as a JSON object.
+
+        Args:
+            **summary: Numbers which describe the run, e.g. ``news_count=100``.
+
+        Returns:
+            dict: The report.
+
+        """
+        with self._lock:
+            stages = {}
+            for (stage, target), metrics in sorted(self._stages.items()):
+                stages.setdefault(stage, {})[target] = metrics.to_dict()
+
+            return {
+                "started_at": self.started_at,
+                "duration": round(timer() - self._start_time, 6),
+                "summary": summary,
+                "stages": stages,
+            }
+
+    def get_prometheus_text(self, **summary):
+        """Get metrics of the run in the text format of Prometheus.
+
+        Args:
+            **summary: Numbers which describe the run, exported as gauges.
+
+        Returns:
+            str: The metrics.
+
+        """
+        lines = []
+
+        def add_metric(name, metric_type, help_text, samples):
+            name = "%s_%s" % (_PROMETHEUS_PREFIX, name)
+            lines.append("# HELP %s %s" % (name, help_text))
+            lines.append("# TYPE %s %s" % (name, metric_type))
+            for suffix, labels, value in samples:
+                lines.append("%s%s%s %s" % (
+                    name, suffix, _format_labels(labels), _format_value(value)
+                ))
+
+        with self._lock:
+            items = sorted(self._stages.items())
+            duration = timer() - self._start_time
+
+            for attr_name, help_text in (
+                    ("count", "Number of operations of a stage."),
+                    ("errors", "Number of failed operations of a stage."),
+                    ("bytes", "Number of bytes received by a stage."),
+            ):
+                add_metric("stage_%s_total" % attr_name, "counter", help_text, [
+                    ("", {"stage": stage, "target": target}, getattr(metrics, attr_name))
+                    for (stage, target), metrics in items
+                ])
+
+            samples = []
+            for (stage, target), metrics in items:
+                labels = {"stage": stage, "target": target}
+                for bound, count in metrics.latency.cumulative_counts():
+                    samples.append(("_bucket", dict(labels, le=bound), count))
+                samples.append(("_sum", labels, metrics.latency.sum))
+                samples.append(("_count", labels, metrics.latency.count))
+            add_metric(
+                "stage_latency_seconds", "histogram", "Latencies of operations of a stage.",
+                samples
+            )
+
+        add_metric("run_started_timestamp_seconds", "gauge", "Unix time when the run started.",
+                   [("", {}, self.started_at)])
+        add_metric("run_duration_seconds", "gauge", "Duration of the run.",
+                   [("", {}, duration)])
+        for key, value in sorted(summary.items()):
+            add_metric("run_%s" % key, "gauge", "%s of the run." % key, [("", {}, value)])
+
+        return "\n".join(lines) + "\n"
+
+    def write_reports(self, json_file=None, prometheus_file=None, **summary):
+        """Write the JSON report and the Prometheus textfile of the run.
+
+        Files are replaced atomically, so that the node exporter never reads
+        a partial file.
+
+        Args:
+            json_file (str, optional): Filename of the JSON report. None to skip it.
+            prometheus_file (str, optional): Filename of the Prometheus textfile,
+                which should end with ".prom". None to skip it.
+            **summary: Numbers which describe the run.
+
+        """
+        if json_file:
+            _write_atomically(
+                json_file, json.dumps(self.get_report(**summary), indent=2, ensure_ascii=False)
+            )
+        if prometheus_file:
+            _write_atomically(prometheus_file, self.get_prometheus_text(**summary))
+
+
+def _round_or_none(value):
+    return None if value is None else round(value, 6)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+
+    pairs = []
+    for key, value in labels.items():
+        if key == "le":
+            value = _format_value(value)
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append('%s="%s"' % (key, value))
+    return "{%s}" % ",".join(pairs)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _write_atomically(filename, text):
+    temp_filename = "%s.%d.tmp" % (filename, os.getpid())
+    with open(temp_filename, "w", encoding="utf-8") as outfile:
+        outfile.write(text)
+    os.replace(temp_filename, filename)
+
+
+# Metrics of the current run, recorded by all modules
+_RECORDER = MetricsRecorder()
+
+# Depth of calls of functions decorated by measured(stage) in each thread: <stage, depth>
+_MEASURED_CALLS = threading.local()
+
+
+def get_recorder():
+    """Get the recorder of the current run.
+    """
+    return _RECORDER
+
+
+def reset():
+    """Forget all metrics, and start a new run. See ``MetricsRecorder.reset()``.
+    """
+    _RECORDER.reset()
+
+
+def record(stage, target=None, seconds=None, nbytes=0, error=False):
+    """Record an operation. See ``MetricsRecorder.record()``.
+    """
+    _RECORDER.record(stage, target, seconds, nbytes, error)
+
+
+def measure(stage, target=None):
+    """Time the operation inside the ``with`` block. See ``MetricsRecorder.measure()``.
+    """
+    return _RECORDER.measure(stage, target)
+
+
+def measured(stage):
+    """Decorator to time every call of a function, whose name is the target.
+
+    Calls made inside another decorated function of the same stage (e.g.
+    ``store_news_data()`` calling ``store_news_rule_scores()``) are not
+    recorded, so that the time of the stage is counted once.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            depths = getattr(_MEASURED_CALLS, "depths", None)
+            if depths is None:
+                depths = _MEASURED_CALLS.depths = {}
+
+            depth = depths.get(stage, 0)
+            depths[stage] = depth + 1
+            try:
+                if depth:
+                    return func(*args, **kwargs)
+                with _RECORDER.measure(stage, func.__name__):
+                    return func(*args, **kwargs)
+            finally:
+                depths[stage] = depth
+        return wrapper
+    return decorator
+
+
+def write_reports(json_file=None, prometheus_file=None, **summary):
+    """Write reports of the current run. See ``MetricsRecorder.write_reports()``.
+    """
+    _RECORDER.write_reports(json_file, prometheus_file, **summary)
@@ -4,7 +4,13 @@ The reason is that this modules contains data structures that
 are proper to break the conventions in my opinion.
 
 """
+# Standard library
+import hashlib
+# Local modules
 import scraper_utils
+from scraping_rules_compiler import CompiledRuleSet
+from text_normalizer import normalize_text
+from url_canonicalizer import canonicalize_url
 
 
 class RssFeed(object):
@@ -59,7 +65,7 @@ class NewsRSSEntry(object):
 
         description (str): Context or excerpt of the news.
 
-        link (str): Url of the news.
+        link (str): Url of the news, by which the news is retrieved.
 
         published_time (datetime.datetime): Published time of the news.
 
@@ -70,20 +76,36 @@ class NewsRSSEntry(object):
 
         tags (set, optional): Tags of the news. Defaults to None.
 
-        rules (Iterable, optional): ScrapingRules related to this news.
-            Defaults to None.
+        rules (scraping_rules_compiler.CompiledRuleSet, optional): ScrapingRules
+            related to this news. Defaults to None.
+
+    Attributes:
+        duplicate_of (NewsRSSEntry): The representative news of the same story,
+            if this news is a near-duplicate (See ``story_clusters.py``).
+            Otherwise None.
 
     """
+    # Many news are kept in memory when rescoring news in DB.
+    __slots__ = (
+        "_title", "_description", "_normalized_text", "_content_hash",
+        "_link", "_canonical_link", "published_time", "source", "tags", "duplicate_of",
+        "_rules", "_scores",
+    )
 
     def __init__(self, title, description, link, published_time, source,
                  category=None, tags=None, rules=None):
+        self._normalized_text = None
+        self._content_hash = None
         self.title = title
         self.description = description
         self.link = link
         self.published_time = published_time
         self.source = source
-        self.rule_score_map = {}  # rule ==> score, will be set in news_collector.py
+        # Scores are in the order of self._rules.rules. Will be set by set_rules().
+        self._rules = None
+        self._scores = ()
         self.tags = tags.copy() if tags else set()  # .copy() -> shallow copy
+        self.duplicate_of = None
 
         if rules:
             self.set_rules(rules)
@@ -98,73 +120,153 @@ class NewsRSSEntry(object):
         This method does:
             1. computes scores which represents the relevance between
                the rule and the news.
-            2. Constructs ``self.rule_score_map`` which maps a rule to a score.
+            2. Keeps the scores as a tuple in the order of the rules, which is
+               shared with the score memo. (See ``self.rule_score_map``)
             3. Set up ``self.tags`` with related (whose score is greater than 0) rules.
 
+        Scores of rules set before are replaced.
+
         Args:
-            rules (Iterable(ScrapingRule)): list of scraping_rules to decide whether
-            this news is of interested according to the rule.
+            rules (scraping_rules_compiler.CompiledRuleSet): scraping_rules to decide
+                whether this news is of interested according to the rule. The same
+                compiled rules should be set to many news, so that they are compiled
+                once and share the score memo.
+
+        Raises:
+            TypeError: If ``rules`` is not compiled by
+                ``scraping_rules_compiler.compile_rules()``.
 
         """
-        for rule in rules:
-            score = self._compute_score_by_rule(rule)
-            self.rule_score_map[rule] = score
+        if not isinstance(rules, CompiledRuleSet):
+            raise TypeError("Rules should be compiled by compile_rules() before set to news.")
+
+        # The same news is often seen in several feeds, or in previous runs.
+        scores = rules.score_memo.get(self.content_hash)
+        if scores is None:
+            scores = tuple(rules.score(self.normalized_title, self.normalized_description))
+            rules.score_memo.put(self.content_hash, scores)
+
+        self._rules = rules
+        self._scores = scores
+        for rule, score in zip(rules.rules, scores):
             self._set_tags_from_rule(rule, score)
 
     @property
-    def total_score(self):
-        """Sum of positive scores of all rules.
+    def rule_score_map(self):
+        """dict: Maps a rule to its score. A new dict is built on each access,
+        so prefer ``rule_scores()`` or ``score_of()``.
+        """
+        return dict(self.rule_scores())
 
-        Note that negative scores are excluded.
+    def rule_scores(self):
+        """Get scores of the rules set by ``set_rules()``.
+
+        Returns:
+            Iterator(tuple(ScrapingRule, int)): <rule, score> in the order of the rules.
 
         """
-        if not self.rule_score_map:
-            scraper_utils.log_warning('No scraping rule set for %s' % str(self))
+        if self._rules is None:
+            return iter(())
 
-        return sum(score for score in self.rule_score_map.values() if score > 0)
+        return zip(self._rules.rules, self._scores)
 
-    def _set_tags_from_rule(self, rule, score):
-        if score > 0:
-            self.tags.update(rule.tags)  # shallow copy
+    def score_of(self, rule):
+        """Get the score of a rule set by ``set_rules()``.
+
+        Raises:
+            KeyError: If the rule is not set to this news.
 
-    def _compute_score_by_rule(self, rule):
         """
-        Score:
-            < 0 ==> excluded     (by rule.excluded_keywords)
-            > 0 ==> of interest  (by rule.included_keywords)
-            = 0 ==> others (not of interest) (does not contains "all" included_keywords)
+        if self._rules is None:
+            raise KeyError(rule)
+
+        return self._scores[self._rules.index_of(rule)]
+
+    @property
+    def title(self):
+        """str: Title of the news."""
+        return self._title
+
+    @title.setter
+    def title(self, value):
+        self._title = value
+        self._normalized_text = None
+        self._content_hash = None
+
+    @property
+    def link(self):
+        """str: Url of the news, by which the news is retrieved."""
+        return self._link
+
+    @link.setter
+    def link(self, value):
+        self._link = value
+        self._canonical_link = None
+
+    @property
+    def canonical_link(self):
+        """str: Canonical url of the news (See ``url_canonicalizer.py``), by which
+        the news is deduplicated and stored to DB.
         """
-        score = 0
+        if self._canonical_link is None:
+            self._canonical_link = canonicalize_url(self._link)
 
-        for keyword in rule.excluded_keywords:
-            if keyword in self.title:
-                score -= 10
+        return self._canonical_link
 
-        if score < 0:
-            # Excluded. No more evaluation.
-            return score
+    @property
+    def description(self):
+        """str: Context or excerpt of the news."""
+        return self._description
+
+    @description.setter
+    def description(self, value):
+        self._description = value
+        self._normalized_text = None
+        self._content_hash = None
+
+    @property
+    def normalized_title(self):
+        """str: Title normalized by ``text_normalizer.normalize_text()``."""
+        return self._get_normalized_text()[0]
+
+    @property
+    def normalized_description(self):
+        """str: Description normalized by ``text_normalizer.normalize_text()``."""
+        return self._get_normalized_text()[1]
+
+    @property
+    def content_hash(self):
+        """str: SHA-1 hash of the title and description, to memoize scores."""
+        if self._content_hash is None:
+            content = "%s\n%s" % (self._title, self._description)
+            self._content_hash = hashlib.sha1(content.encode("utf-8")).hexdigest()
+
+        return self._content_hash
+
+    def _get_normalized_text(self):
+        # Normalize once, and reuse it for all rules until the text changes.
+        if self._normalized_text is None:
+            self._normalized_text = (
+                normalize_text(self._title), normalize_text(self._description)
+            )
 
-        contains_all_keywords = True
-        for keyword in rule.included_keywords:
-            # Should change to analyse the content of the news
+        return self._normalized_text
 
-            keyword_occurrences_in_title = self.title.count(keyword)
-            if keyword_occurrences_in_title > 0:
-                score += keyword_occurrences_in_title * 10
+    @property
+    def total_score(self):
+        """Sum of positive scores of all rules.
 
-            # keyword occurrences in description
-            kw_occurrences_in_desc = self.description.count(keyword)
-            if kw_occurrences_in_desc > 0:
-                score += kw_occurrences_in_desc * 1
+        Note that negative scores are excluded.
 
-            if not keyword_occurrences_in_title and not kw_occurrences_in_desc:
-                # If any of the keywords does not appear, this news does not pass the rule
-                contains_all_keywords = False
+        """
+        if not self._scores:
+            scraper_utils.log_warning('No scraping rule set for %s' % str(self))
 
-        if not contains_all_keywords:
-            score = 0
+        return sum(score for score in self._scores if score > 0)
 
-        return score
+    def _set_tags_from_rule(self, rule, score):
+        if score > 0:
+            self.tags.update(rule.tags)  # shallow copy
 
     def __repr__(self):
         return (
@@ -181,7 +283,7 @@ class NewsRSSEntry(object):
             .format(
                 hex(id(self)),
                 news_obj=self,
-                rules={str(rule): score for rule, score in self.rule_score_map.items()}
+                rules={str(rule): score for rule, score in self.rule_scores()}
             )
         )
 
@@ -192,6 +294,10 @@ class NewsRSSEntry(object):
 class ScrapingRule(object):
     """Data structure representing a rule to decide whether a news is of interest.
 
+    Rules are immutable, and their hash is computed once, since they are used
+    as dict keys and compared in sets for every news.
+    Keyword and tag sets are stored as frozensets.
+
     Args:
         name (str): Name of the rule.
 
@@ -207,71 +313,117 @@ class ScrapingRule(object):
 
         is_active (bool, optional): Whether this rule is active. Defaults to True.
 
+        include_groups (Iterable(set(str)), optional): Alternative sets of keywords.
+            A news passes the rule if it contains all keywords of any of the groups.
+            The keywords are also added to ``included_keywords``.
+            Defaults to None, which means ``included_keywords`` is the only group.
+
+        include_any (set(str), optional): A news passes the rule only if it
+            contains at least one of these keywords. Defaults to None.
+
+        ensure_times_lower (int, optional): Maximum allowed occurrences of an
+            excluded keyword in the description. Defaults to None, which means
+            only the title is checked for excluded keywords.
+            Note that an excluded keyword in the title always excludes the news.
+
     """
+    __slots__ = (
+        "name", "included_keywords", "excluded_keywords", "tags", "active",
+        "include_any", "ensure_times_lower", "include_groups", "_hash",
+    )
 
     def __init__(self, name, included_keywords=None,
-                 excluded_keywords=None, tags=None, is_active=True):
-        self.name = name
-        self.included_keywords = included_keywords if included_keywords else set()
-        self.excluded_keywords = excluded_keywords if excluded_keywords else set()
-        self.tags = tags if tags else set()
-        self.active = is_active
+                 excluded_keywords=None, tags=None, is_active=True,
+                 include_groups=None, include_any=None, ensure_times_lower=None):
+        included_keywords = frozenset(included_keywords or ())
+
+        if include_groups is None:
+            include_groups = (included_keywords,) if included_keywords else ()
+        else:
+            include_groups = tuple(frozenset(group) for group in include_groups)
+            included_keywords = included_keywords.union(*include_groups)
+
+        attributes = {
+            "name": name,
+            "included_keywords": included_keywords,
+            "excluded_keywords": frozenset(excluded_keywords or ()),
+            "tags": frozenset(tags or ()),
+            "active": is_active,
+            "include_any": frozenset(include_any or ()),
+            "ensure_times_lower": ensure_times_lower,
+            # Groups of keywords, ORed together. Keywords inside a group are ANDed together.
+            "include_groups": include_groups,
+        }
+        for attr_name, value in attributes.items():
+            object.__setattr__(self, attr_name, value)
+
+        object.__setattr__(self, "_hash", hash(self._get_key()))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ScrapingRule is immutable: can not set '%s'" % name)
+
+    def __reduce__(self):
+        return (
+            self.__class__,
+            (self.name, self.included_keywords, self.excluded_keywords, self.tags,
+             self.active, self.include_groups, self.include_any, self.ensure_times_lower)
+        )
 
-    def add_keyword(self, keyword_name, to_include):
-        """Add a keyword to this rule.
+    def _get_key(self):
+        # Everything which affects scores and tags. The order of include
+        # groups does not matter.
+        return (
+            self.name,
+            frozenset(self.include_groups),
+            self.include_any,
+            self.excluded_keywords,
+            self.tags,
+            self.ensure_times_lower,
+        )
 
-        Args:
-            keyword_name (str): The keyword to add.
-            to_include (bool): If True, this keyword is of "included_keywords".
-                Otherwise, it is of "excluded_keywords"
+    def all_keywords(self):
+        """Get all included and excluded keywords of this rule.
 
-        """
-        if not isinstance(to_include, bool):
-            raise scraper_utils.NewsScrapperError(
-                "Parameter to_include in add_keyword() is invalid: '%s'"
-                % repr(to_include)
-            )
+        Returns:
+            frozenset(str): The keywords.
 
-        if to_include:
-            self.included_keywords.add(keyword_name)
-        else:
-            self.excluded_keywords.add(keyword_name)
+        """
+        return self.included_keywords | self.include_any | self.excluded_keywords
 
     def __repr__(self):
         return (
             "\n"
             "------- <Scraping Rule> -------\n"
             "[Name]   : {rule_obj.name}\n"
-            "[Include]: {rule_obj.included_keywords}\n"
-            "[Exclude]: {rule_obj.excluded_keywords}\n"
-            "[Tags]   : {rule_obj.tags}\n"
+            "[Include]: {include_groups}\n"
+            "[Any]    : {include_any}\n"
+            "[Exclude]: {excluded_keywords}\n"
+            "[Tags]   : {tags}\n"
             "------------------------------\n"
-            .format(rule_obj=self)
+            .format(
+                rule_obj=self,
+                include_groups=[set(group) for group in self.include_groups],
+                include_any=set(self.include_any),
+                excluded_keywords=set(self.excluded_keywords),
+                tags=set(self.tags)
+            )
         )
 
     def __str__(self):
         return "<ScrapingRule '%s'>" % self.name
 
     def __eq__(self, other):
+        if self is other:
+            return True
+
         return (
             isinstance(other, self.__class__) and
-            self.name == other.name and
-            self.included_keywords == other.included_keywords and
-            self.excluded_keywords == other.excluded_keywords and
-            self.tags == other.tags
+            self._hash == other._hash and
+            self._get_key() == other._get_key()
         )
 
     def __ne__(self, other):
-        return self != other
+        return not self == other
 
     def __hash__(self):
-        # __eq__ makes this object unhashable
-        # set() is also unhashable
-        return hash(
-            (  # tuple of attributes
-                self.name,
-                frozenset(self.included_keywords),
-                frozenset(self.excluded_keywords),
-                frozenset(self.tags)
-            )
-        )
+        return self._hash
@@ -7,9 +7,15 @@ Attributes:
 """
 import logging
 import re
+import threading
+from contextlib import contextmanager
+from urllib.request import urlopen
 
 DEFAULT_LOG_FORMAT = '[%(levelname)s] [%(asctime)s] %(message)s\n'
 
+# Fetcher used by fetch_url() in each thread, instead of the network (See use_fetcher())
+_THREAD_FETCHER = threading.local()
+
 
 def log_warning(msg, is_error=False):
     """Log warnings or errors.
@@ -41,6 +47,9 @@ def setup_logger(
         log_format=DEFAULT_LOG_FORMAT):
     """Set up ``logging.logger``
 
+    Handlers added by an earlier call for the same logger are replaced, so a
+    long-lived process can set up a logger before each run.
+
     Args:
         name (str): Name of the logger to set up.
 
@@ -64,14 +73,21 @@ def setup_logger(
 
     logger.setLevel(level)
 
+    for handler in list(logger.handlers):
+        if getattr(handler, "_set_up_by_scraper", False):
+            logger.removeHandler(handler)
+            handler.close()
+
     if logfile:
         file_handler = logging.FileHandler(logfile)
         file_handler.setFormatter(formatter)
+        file_handler._set_up_by_scraper = True
         logger.addHandler(file_handler)
 
     if to_console:
         console = logging.StreamHandler()
         console.setFormatter(formatter)
+        console._set_up_by_scraper = True
         logger.addHandler(console)
 
     return logger
@@ -87,15 +103,69 @@ def extract_domain_name_from_url(link):
         str: The domain name in the url.
 
     """
-    base_url_pattern = re.compile('^https?://([a-zA-Z0-9.-]+)/')
+    base_url_pattern = re.compile('^https?://([a-zA-Z0-9.-]+)(?:[:/?#]|$)')
     try:
-        return base_url_pattern.match(link).group(1).lstrip('www.')
+        domain_name = base_url_pattern.match(link).group(1)
+        # Remove the prefix "www." (str.lstrip() would also strip e.g. "w" of "wsj.com")
+        return domain_name[4:] if domain_name.startswith('www.') else domain_name
     except AttributeError:
         log_warning(
             'News link [%s] does not match base_url_pattern.' % link
         )
 
 
+def fetch_url(url, timeout=None):
+    """Retrieve the content of a url.
+
+    All HTTP requests of feeds and local news are made by this function.
+    In a thread which uses another fetcher (See ``use_fetcher()``), the url is
+    retrieved by that fetcher instead.
+
+    Args:
+        url (str): The url.
+        timeout (float, optional): Timeout in seconds. Defaults to None (no timeout).
+
+    Returns:
+        bytes: The content.
+
+    Raises:
+        HTTPError: If the HTTP errors occurrs.
+        URLError: If the url is incorrect or has some problems.
+
+    """
+    fetcher = get_fetcher()
+    if fetcher is not None:
+        return fetcher(url, timeout)
+
+    with urlopen(url, timeout=timeout) as response:
+        return response.read()
+
+
+@contextmanager
+def use_fetcher(fetcher):
+    """Retrieve urls by a fetcher in this thread, inside the ``with`` block.
+
+    Other threads still retrieve urls from the network.
+
+    Args:
+        fetcher (callable): A function with the interface of ``fetch_url()``,
+            e.g. ``response_archive.ResponseArchive.fetch_url``.
+
+    """
+    previous_fetcher = get_fetcher()
+    _THREAD_FETCHER.fetcher = fetcher
+    try:
+        yield
+    finally:
+        _THREAD_FETCHER.fetcher = previous_fetcher
+
+
+def get_fetcher():
+    """Get the fetcher used by this thread (See ``use_fetcher()``), or None for the network.
+    """
+    return getattr(_THREAD_FETCHER, "fetcher", None)
+
+
 def read_json_from_file(filename):
     """Read data in JSON format from file.
 
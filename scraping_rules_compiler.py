@@ -0,0 +1,209 @@
+"""This module compiles scraping rules into a compact form for fast scoring.
+
+All keywords of a rule set are collected into one vocabulary, and each keyword
+gets a bit position. The keywords present in a news are then represented by
+an integer bitset, so that each rule can be evaluated by a few mask operations
+instead of scanning the news text for each of its keywords again.
+
+Keywords are normalized by ``text_normalizer.normalize_text()`` when compiled,
+so the news text to score must be normalized in the same way.
+
+Score of a news by a rule:
+    < 0 ==> excluded     (by rule.excluded_keywords)
+    > 0 ==> of interest  (by the include groups and rule.include_any)
+    = 0 ==> others (not of interest)
+
+    1. Each excluded keyword found in the title scores -10.
+       If ``rule.ensure_times_lower`` is set, an excluded keyword which appears
+       more than that many times in the description also scores -10.
+       An excluded news is not evaluated further.
+    2. The news passes the rule if it contains all keywords of at least one
+       include group, and at least one keyword of ``rule.include_any``
+       (if any of them are given). Otherwise the score is 0.
+    3. The score is the sum of (10 * occurrences in title + occurrences in
+       description) for every include keyword of the rule.
+
+"""
+# Standard library
+import hashlib
+import json
+# Local modules
+from score_memo import ScoreMemo
+from text_normalizer import normalize_text
+
+_TITLE_WEIGHT = 10
+_DESCRIPTION_WEIGHT = 1
+_EXCLUDED_SCORE = -10
+
+
+def compile_rules(rules):
+    """Compile scraping rules into a ``CompiledRuleSet``.
+
+    Args:
+        rules (Iterable(scraper_models.ScrapingRule)): Rules to compile.
+            If it is already a ``CompiledRuleSet``, it is returned as is.
+
+    Returns:
+        CompiledRuleSet: The compiled rules.
+
+    """
+    if isinstance(rules, CompiledRuleSet):
+        return rules
+
+    return CompiledRuleSet(rules)
+
+
+def _popcount(bits):
+    return bin(bits).count("1")
+
+
+class _CompiledRule(object):
+    """A scraping rule in bitset form.
+    """
+    __slots__ = (
+        "exclude_mask", "exclude_indices", "group_masks",
+        "any_mask", "score_indices", "ensure_times_lower",
+    )
+
+    def __init__(self, rule, vocabulary):
+        def to_indices(keywords):
+            return {vocabulary[normalize_text(keyword)] for keyword in keywords}
+
+        def to_mask(keywords):
+            mask = 0
+            for index in to_indices(keywords):
+                mask |= 1 << index
+            return mask
+
+        self.exclude_indices = tuple(sorted(to_indices(rule.excluded_keywords)))
+        self.exclude_mask = to_mask(rule.excluded_keywords)
+        self.group_masks = tuple(
+            to_mask(group) for group in rule.include_groups if group
+        )
+        self.any_mask = to_mask(rule.include_any)
+        self.score_indices = tuple(sorted(
+            to_indices(rule.included_keywords) | to_indices(rule.include_any)
+        ))
+        self.ensure_times_lower = rule.ensure_times_lower
+
+
+class CompiledRuleSet(object):
+    """Scraping rules compiled for fast scoring.
+
+    Args:
+        rules (Iterable(scraper_models.ScrapingRule)): Rules to compile.
+
+    Attributes:
+        rules (tuple(scraper_models.ScrapingRule)): The original rules.
+            Scores returned by ``score()`` are in the same order.
+
+        keywords (tuple(str)): All normalized keywords used by the rules.
+            The index of a keyword is its bit position in a keyword bitset.
+
+        fingerprint (str): A hash of everything in the rules that affects scores.
+
+        score_memo (score_memo.ScoreMemo): Memoized scores by these rules.
+
+    """
+
+    def __init__(self, rules):
+        self.rules = tuple(rules)
+        # Dense index of each rule, which is also its position in scores
+        self._rule_indices = {rule: index for index, rule in enumerate(self.rules)}
+
+        vocabulary = {}
+        for rule in self.rules:
+            for keyword in rule.all_keywords():
+                vocabulary.setdefault(normalize_text(keyword), len(vocabulary))
+
+        self.keywords = tuple(vocabulary)
+        self._compiled = tuple(_CompiledRule(rule, vocabulary) for rule in self.rules)
+        self.fingerprint = self._compute_fingerprint()
+        self.score_memo = ScoreMemo(self.fingerprint)
+
+    def __iter__(self):
+        return iter(self.rules)
+
+    def __len__(self):
+        return len(self.rules)
+
+    def index_of(self, rule):
+        """Get the index of a rule, which is also the index of its score.
+
+        Raises:
+            KeyError: If the rule is not in this rule set.
+
+        """
+        return self._rule_indices[rule]
+
+    def _compute_fingerprint(self):
+        # Scores are in the order of self.rules, so the order matters.
+        signature = [
+            [
+                sorted(sorted(group) for group in rule.include_groups),
+                sorted(rule.include_any),
+                sorted(rule.excluded_keywords),
+                rule.ensure_times_lower,
+            ]
+            for rule in self.rules
+        ]
+        content = json.dumps(signature, ensure_ascii=False).encode("utf-8")
+        return hashlib.sha1(content).hexdigest()
+
+    def score(self, title, description):
+        """Compute scores of a news for every rule.
+
+        Args:
+            title (str): Normalized title of the news.
+            description (str): Normalized context or excerpt of the news.
+
+        Returns:
+            list(int): Scores of the news, in the order of ``self.rules``.
+
+        """
+        in_title = 0
+        present = 0
+        weights = [0] * len(self.keywords)
+        desc_counts = {}
+
+        # Count each keyword once, no matter how many rules use it.
+        for index, keyword in enumerate(self.keywords):
+            in_desc = keyword in description
+            if keyword in title:
+                bit = 1 << index
+                in_title |= bit
+                present |= bit
+                weights[index] += title.count(keyword) * _TITLE_WEIGHT
+
+            if in_desc:
+                present |= 1 << index
+                count = description.count(keyword)
+                desc_counts[index] = count
+                weights[index] += count * _DESCRIPTION_WEIGHT
+
+        return [
+            self._score_by_rule(rule, present, in_title, weights, desc_counts)
+            for rule in self._compiled
+        ]
+
+    @staticmethod
+    def _score_by_rule(rule, present, in_title, weights, desc_counts):
+        excluded = in_title & rule.exclude_mask
+
+        if rule.ensure_times_lower is not None:
+            for index in rule.exclude_indices:
+                if desc_counts.get(index, 0) > rule.ensure_times_lower:
+                    excluded |= 1 << index
+
+        if excluded:
+            # Excluded. No more evaluation.
+            return _popcount(excluded) * _EXCLUDED_SCORE
+
+        if rule.group_masks and not any(
+                present & mask == mask for mask in rule.group_masks):
+            return 0
+
+        if rule.any_mask and not present & rule.any_mask:
+            return 0
+
+        return sum(weights[index] for index in rule.score_indices)
@@ -1,16 +1,42 @@
 """This module contains tools to read scraping_rules from a file.
 
+A rule in the rule file looks like this:
+
+    .. code-block:: json
+
+        {
+            "name": "美股",
+            "include": [["美股", "跌"], ["道瓊", "重挫"]],
+            "include_any": ["美國", "華爾街"],
+            "exclude": ["台股"],
+            "ensure_times_lower": 1,
+            "tags": ["投資"]
+        }
+
+    - "include" is either a list of keywords which are ANDed together, or a
+      list of such lists, which are ORed together.
+    - "include_any" is a list of keywords, at least one of them must appear.
+    - "ensure_times_lower" is the maximum allowed occurrences of an excluded
+      keyword in the news content. Without it, only the title is checked.
+
 Attributes:
     ESSENTIAL_ATTRIBUTES (tuple(str)) Attributes that a rule must have.
-    OPTIONAL_ATTRIBUTES (tuple(str)): Attributes that are optional.
+    OPTIONAL_ATTRIBUTES (dict): Attributes that are optional, and their default values.
 
 """
 # Local modules
 import scraper_utils
 from scraper_models import ScrapingRule
+from scraping_rules_compiler import compile_rules
 
 ESSENTIAL_ATTRIBUTES = ("name",)
-OPTIONAL_ATTRIBUTES = ("exclude", "include", "tags")
+OPTIONAL_ATTRIBUTES = {
+    "exclude": [],
+    "include": [],
+    "include_any": [],
+    "ensure_times_lower": None,
+    "tags": [],
+}
 
 
 class ScrapingRuleFormatError(scraper_utils.NewsScrapperError):
@@ -35,27 +61,93 @@ def get_rules_from_file(filename):
     configs = scraper_utils.read_json_from_file(filename)
     name_set = set()
     for config in configs:
-        name, included_kw, excluded_kw, tags = _get_attributes_from_config(config)
+        _check_unknown_attributes(config)
+
+        name = _get_attribute(config, "name", str)
         if name in name_set:
             raise ScrapingRuleFormatError("Rule names must be unique.")
 
         name_set.add(name)
         yield ScrapingRule(
             name=name,
-            included_keywords=set(included_kw),
-            excluded_keywords=set(excluded_kw),
-            tags=set(tags)
+            excluded_keywords=set(_get_keywords(config, "exclude")),
+            tags=set(_get_keywords(config, "tags")),
+            include_groups=_get_include_groups(config),
+            include_any=set(_get_keywords(config, "include_any")),
+            ensure_times_lower=_get_ensure_times_lower(config)
+        )
+
+
+def get_compiled_rules_from_file(filename):
+    """Parse scraping rules from a file, and compile them for scoring.
+
+    Args:
+        filename (str): File name of the rule file to parse.
+
+    Returns:
+        scraping_rules_compiler.CompiledRuleSet: The compiled rules.
+
+    Raises:
+        ScrapingRuleFormatError: If a rule has invalid format.
+
+    """
+    return compile_rules(get_rules_from_file(filename))
+
+
+def _check_unknown_attributes(config):
+    for attr_name in config:
+        if attr_name not in ESSENTIAL_ATTRIBUTES and attr_name not in OPTIONAL_ATTRIBUTES:
+            raise ScrapingRuleFormatError(
+                "Attribute '%s' in the input file is unknown." % attr_name
+            )
+
+
+def _get_keywords(config, attr_name):
+    keywords = _get_attribute(config, attr_name, list)
+
+    if not all(isinstance(keyword, str) for keyword in keywords):
+        raise ScrapingRuleFormatError(
+            "'%s' attribute must be a list of strings." % attr_name
         )
 
+    return keywords
+
 
-def _get_attributes_from_config(config):
+def _get_include_groups(config):
+    include = _get_attribute(config, "include", list)
 
-    name = _get_attribute(config, "name", str)
-    inc_kw = _get_attribute(config, "include", list)
-    exc_kw = _get_attribute(config, "exclude", list)
-    tags = _get_attribute(config, "tags", list)
+    if all(isinstance(keyword, str) for keyword in include):
+        # A single group of keywords (Also the case of an empty list)
+        return [set(include)] if include else []
+
+    if all(isinstance(group, list) for group in include):
+        groups = []
+        for group in include:
+            if not group or not all(isinstance(keyword, str) for keyword in group):
+                raise ScrapingRuleFormatError(
+                    "Each group in 'include' attribute must be a non-empty list of strings."
+                )
+            groups.append(set(group))
+        return groups
+
+    raise ScrapingRuleFormatError(
+        "'include' attribute must be a list of strings, or a list of lists of strings."
+    )
+
+
+def _get_ensure_times_lower(config):
+    if config.get("ensure_times_lower") is None:
+        return None
+
+    times = _get_attribute(config, "ensure_times_lower", int)
+
+    # Note that bool is also an instance of int
+    if times is not None and (isinstance(times, bool) or times < 0):
+        raise ScrapingRuleFormatError(
+            "'ensure_times_lower' attribute must be a non-negative integer."
+        )
 
-    return name, inc_kw, exc_kw, tags
+    return times
 
 
 def _get_attribute(config, attr_name, expected_type):
@@ -66,7 +158,8 @@ def _get_attribute(config, attr_name, expected_type):
         attr_err = err.args[0]
 
         if attr_err in OPTIONAL_ATTRIBUTES:
-            return list()
+            default = OPTIONAL_ATTRIBUTES[attr_err]
+            return list(default) if isinstance(default, list) else default
 
         elif attr_err in ESSENTIAL_ATTRIBUTES:
             raise ScrapingRuleFormatError("A rule must have 'name' attribute.")
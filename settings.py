@@ -7,9 +7,25 @@ SCRAPER_CONFIG = {
     "rss_worker_timeout": 120,
     "rule_file": "rule.json",
     "error_log": "error.log",
+    # Set a filename to keep memoized scores between runs.
+    "score_memo_file": None,
+    "score_memo_size": 50000,
+    # Set a filename (e.g. "news_index.json") to keep an inverted index of news
+    # in DB, so that only news which may match changed rules are read and
+    # rescored. Its size grows with the news kept in DB (See RETENTION_CONFIG).
+    "news_index_file": None,
+    # News of interest are written to DB in batches while scraping.
+    "db_writer_batch_size": 200,
+    "db_writer_queue_size": 1000,
+    "db_writer_flush_interval": 5,
+    # Maximum number of news being retrieved or waiting to be scored (See news_pipeline.py).
+    "pipeline_max_pending_news": 200,
 }
 
 DATABASE_CONFIG = {
+    # "postgresql" (the DB of my_focus_news), or "sqlite" to run without a DB server
+    "backend": "postgresql",
+    "sqlite_file": "news_scraper.sqlite3",
     "db_host": "db",
     "db_port": 5432,
     "db_user": "dja1",
@@ -17,7 +33,91 @@ DATABASE_CONFIG = {
     "database": "my_focus_news",
 }
 
+# The long-lived connection pool used by schedule.py (See db_session.py)
+DB_SESSION_CONFIG = {
+    "min_connections": 1,
+    "max_connections": 2,
+}
+
+# Old news are pruned by prune_news_data.py (and by schedule.py, only if a limit is set)
+# Pruning permanently deletes news with their scores and relations from DB.
+RETENTION_CONFIG = {
+    # News created more than this number of days ago are deleted. None to keep all.
+    "max_age_days": None,
+    # Only this number of the newest news are kept. None for no limit.
+    "max_rows": None,
+    # News are deleted in batches, with a pause between batches.
+    "batch_size": 500,
+    "batch_pause": 0.1,
+    # Set a filename (e.g. "news_archive.jsonl.gz") to archive news before deletion.
+    "archive_file": None,
+    "schedule_hours": 24,
+}
+
 FEED_PARSER_CONFIG = {
     "max_workers": 10,
     "html_parser_worker_timeout": 60,
+    # Timeout in seconds of a HTTP request of a feed or a local news.
+    "http_timeout": 30,
+    # Parse RSS 2.0 feeds by rss_xml_reader.py instead of feedparser.
+    "native_rss_parser": True,
+    # Number of processes to parse HTML of local news, while they are retrieved
+    # by threads. None means the number of CPUs, and 0 parses in the threads.
+    "html_parser_processes": None,
+    # Where the news content lies in pages of local news sources (See extraction_profiles.py).
+    "extraction_profile_file": "extraction_profiles.json",
+    # News of the same story are fetched and stored once (See story_clusters.py).
+    "cluster_stories": True,
+    # Maximum number of different bits between SimHash of the same story.
+    "title_simhash_distance": 4,
+    "content_simhash_distance": 6,
+    # Number of news contents cached by canonical url, so that a local news
+    # linked by several feeds is retrieved once.
+    "content_cache_size": 2000,
+}
+
+# Metrics of the stages of each run (See scraper_metrics.py)
+METRICS_CONFIG = {
+    # The JSON report of the last run. None to skip it.
+    "json_file": "scraper_metrics.json",
+    # The file for the textfile collector of the Prometheus node exporter,
+    # which should be in its --collector.textfile.directory. None to skip it.
+    "prometheus_file": "news_scraper.prom",
+    # Upper bounds of latency buckets in seconds
+    "latency_buckets": [0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60],
+}
+
+# Raw responses of feeds and local news (See response_archive.py and reprocess_archive.py)
+ARCHIVE_CONFIG = {
+    # Whether to append every retrieved feed and local news to the archive.
+    "capture": False,
+    "directory": "response_archive",
+}
+
+DAEMON_CONFIG = {
+    "interval_hours": 1,
+    # Unix socket to trigger a run at once ("python schedule.py --run-now").
+    # None to disable it. SIGUSR1 also triggers a run.
+    "control_socket": "news_scraper.sock",
+}
+
+DISTRIBUTED_CONFIG = {
+    # Worker processes on each host ("python distributed_crawl.py worker"),
+    # and threads in each process
+    "worker_processes": 2,
+    "worker_threads": 10,
+    # Seconds a worker has to finish a job, before another worker may lease it
+    "lease_seconds": 300,
+    "max_attempts": 3,
+    # Seconds before the first retry of a failed job. It doubles with each attempt.
+    "retry_delay": 30,
+    # Seconds to wait when no job is available, or no job of the run has finished
+    "poll_interval": 1.0,
+    # Seconds the coordinator waits for all jobs of a run
+    "run_timeout": 3600,
+    # A worker retries the job queue after a DB error, waiting poll_interval
+    # seconds at first and doubling up to max_db_retry_delay seconds. After
+    # max_db_errors errors in a row, it reconnects to DB.
+    "max_db_retry_delay": 60,
+    "max_db_errors": 5,
 }
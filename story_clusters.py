@@ -0,0 +1,330 @@
+"""This module groups news of the same story into clusters during a run.
+
+Google and Yahoo feeds of different categories often carry the same story
+under slightly different headlines. Each news is fingerprinted by SimHash, and
+news whose fingerprints differ in at most a few bits are near-duplicates:
+
+    0. A news whose (canonical) link has been seen in this run is a duplicate.
+    1. Before the content of a news is fetched, its normalized title is
+       compared to the titles seen in this run. A duplicate is not fetched.
+    2. After the content is fetched, it is compared to the contents seen in
+       this run, to catch the same story under a quite different headline.
+
+The first news of a cluster is its representative. Other members link to it
+by ``NewsRSSEntry.duplicate_of``, and their categories are added to the tags
+of the representative. Only the content of the representative is fetched, so
+duplicates by title wait for it (``defer()``), and are scored with its content
+once it is scored (``resolve()``). If its content can not be fetched, a
+waiting duplicate is elected as the new representative (``reelect()``).
+
+At most one news of a story is stored to DB: the best-scoring news among the
+representative and the duplicates waiting for it, or else the first news of
+the story found to be of interest later (``claim()``).
+
+Example:
+    .. code-block:: python
+
+        clusterer = StoryClusterer()
+        pipeline = NewsPipeline(rules, db_writer, clusterer)
+
+"""
+# Standard library
+import hashlib
+import re
+import threading
+# Local modules
+from settings import FEED_PARSER_CONFIG
+
+_HASH_BITS = 64
+
+# Google News appends the news source to titles, e.g. "... - 中央社即時新聞"
+_TITLE_SOURCE_SUFFIX = re.compile(r"\s+-\s+[^-]+$")
+_NOT_WORD_CHARS = re.compile(r"[\W_]+")
+
+
+def simhash(text, shingle_size):
+    """Compute the 64-bit SimHash of a text over its character shingles.
+
+    Args:
+        text (str): The (normalized) text.
+        shingle_size (int): Number of characters in a shingle.
+
+    Returns:
+        int: The fingerprint.
+
+    """
+    shingles = {text[i:i + shingle_size] for i in range(len(text) - shingle_size + 1)}
+    if not shingles:
+        shingles = {text}
+
+    bit_strings = [
+        format(int.from_bytes(
+            hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big"
+        ), "064b")
+        for shingle in shingles
+    ]
+    half = len(bit_strings) / 2
+
+    fingerprint = 0
+    for column in zip(*bit_strings):
+        fingerprint <<= 1
+        if column.count("1") > half:
+            fingerprint |= 1
+
+    return fingerprint
+
+
+def hamming_distance(hash1, hash2):
+    """Number of different bits between two fingerprints.
+    """
+    return bin(hash1 ^ hash2).count("1")
+
+
+class _SimHashIndex(object):
+    """Find a fingerprint within a Hamming distance, by splitting it into bands.
+
+    If two fingerprints differ in at most ``max_distance`` bits, at least one of
+    ``max_distance + 1`` bands must be the same (pigeonhole principle).
+    """
+
+    def __init__(self, max_distance):
+        self.max_distance = max_distance
+        num_bands = max_distance + 1
+        width = _HASH_BITS // num_bands
+        self._bands = [
+            (i * width, (1 << (width if i < num_bands - 1 else _HASH_BITS - i * width)) - 1)
+            for i in range(num_bands)
+        ]
+        self._buckets = [{} for _ in self._bands]
+
+    def find(self, fingerprint):
+        for (shift, mask), buckets in zip(self._bands, self._buckets):
+            for other, value in buckets.get((fingerprint >> shift) & mask, ()):
+                if hamming_distance(fingerprint, other) <= self.max_distance:
+                    return value
+        return None
+
+    def add(self, fingerprint, value):
+        for (shift, mask), buckets in zip(self._bands, self._buckets):
+            buckets.setdefault((fingerprint >> shift) & mask, []).append((fingerprint, value))
+
+    def replace(self, fingerprint, value, new_value):
+        for (shift, mask), buckets in zip(self._bands, self._buckets):
+            bucket = buckets.get((fingerprint >> shift) & mask, [])
+            bucket[:] = [
+                (other, new_value if other == fingerprint and item is value else item)
+                for other, item in bucket
+            ]
+
+
+class _Story(object):
+    """State of the story of a representative news.
+    """
+    __slots__ = ("title_hash", "scored", "stored", "waiting")
+
+    def __init__(self, title_hash=None):
+        self.title_hash = title_hash
+        self.scored = False  # Whether the representative is scored (or dropped).
+        self.stored = False  # Whether a news of the story is stored.
+        self.waiting = []  # Duplicates waiting for the representative to be scored.
+
+
+class StoryClusterer(object):
+    """Clusters news of the same story, first by titles, then by contents.
+
+    It is shared by all feeds of a run, and may be used by several threads.
+
+    Args:
+        title_distance (int, optional): Maximum Hamming distance of SimHash of
+            titles of the same story.
+
+        content_distance (int, optional): Maximum Hamming distance of SimHash of
+            contents of the same story.
+
+    Attributes:
+        duplicate_count (int): Number of news found to be duplicates.
+
+    """
+
+    def __init__(self,
+                 title_distance=FEED_PARSER_CONFIG["title_simhash_distance"],
+                 content_distance=FEED_PARSER_CONFIG["content_simhash_distance"]):
+        self._titles = _SimHashIndex(title_distance)
+        self._contents = _SimHashIndex(content_distance)
+        self._links = {}
+        self._stories = {}  # Representative news ==> _Story
+        self._lock = threading.Lock()
+        self.duplicate_count = 0
+
+    def add_by_title(self, news):
+        """Add a news to the cluster of its title, before its content is fetched.
+
+        Args:
+            news (scraper_models.NewsRSSEntry): The news.
+
+        Returns:
+            bool: True if the news is a duplicate of a news seen before
+                (``news.duplicate_of`` is set), and need not be fetched.
+
+        """
+        with self._lock:
+            representative = self._links.setdefault(news.canonical_link, news)
+        if representative is not news:
+            return self._link_to(representative, news)
+
+        title = _NOT_WORD_CHARS.sub("", _TITLE_SOURCE_SUFFIX.sub("", news.normalized_title))
+        if not title:
+            return False
+
+        title_hash = simhash(title, 2)
+        if self._add(self._titles, title_hash, news):
+            return True
+
+        with self._lock:
+            self._stories[news] = _Story(title_hash)
+        return False
+
+    def add_by_content(self, news):
+        """Add a news to the cluster of its content, after the content is fetched.
+
+        Args:
+            news (scraper_models.NewsRSSEntry): The news.
+
+        Returns:
+            bool: True if the news is a duplicate of a news seen before
+                (``news.duplicate_of`` is set).
+
+        """
+        content = _NOT_WORD_CHARS.sub("", news.normalized_description)
+        if not content:
+            return False
+
+        return self._add(self._contents, simhash(content, 3), news)
+
+    def defer(self, news):
+        """Let a duplicate by title wait until its representative is scored.
+
+        Args:
+            news (scraper_models.NewsRSSEntry): A news whose ``add_by_title()``
+                returned True.
+
+        Returns:
+            bool: True if the news waits, and is returned by ``resolve()`` or
+                ``reelect()`` later. False if the representative has been
+                scored, so the news can be scored with its content now.
+
+        """
+        with self._lock:
+            story = self._stories.get(self._get_root(news))
+            if story is None or story.scored:
+                return False
+
+            story.waiting.append(news)
+            return True
+
+    def resolve(self, news):
+        """Mark a representative as scored, and take the duplicates waiting for it.
+
+        Args:
+            news (scraper_models.NewsRSSEntry): A news whose content is fetched and scored.
+
+        Returns:
+            list(scraper_models.NewsRSSEntry): The duplicates to score with its content.
+
+        """
+        with self._lock:
+            story = self._stories.get(news)
+            if story is None:
+                return []
+
+            story.scored = True
+            waiting, story.waiting = story.waiting, []
+            return waiting
+
+    def reelect(self, news):
+        """Replace a representative whose content can not be fetched.
+
+        The first duplicate waiting for it becomes the representative of the
+        story (and of later news with the same link or title), and the other
+        duplicates wait for the new one.
+
+        Args:
+            news (scraper_models.NewsRSSEntry): The representative which is dropped.
+
+        Returns:
+            scraper_models.NewsRSSEntry: The new representative, whose content
+                should be fetched, or None if no duplicate is waiting.
+
+        """
+        with self._lock:
+            story = self._stories.get(news)
+            if story is None:
+                return None
+            if not story.waiting:
+                story.scored = True
+                return None
+
+            new_representative = story.waiting.pop(0)
+            new_representative.duplicate_of = None
+            new_representative.tags.update(news.tags)
+            for duplicate in story.waiting:
+                duplicate.duplicate_of = new_representative
+            self.duplicate_count -= 1
+
+            del self._stories[news]
+            self._stories[new_representative] = story
+            if story.title_hash is not None:
+                self._titles.replace(story.title_hash, news, new_representative)
+            for link, representative in self._links.items():
+                if representative is news:
+                    self._links[link] = new_representative
+
+            news.duplicate_of = new_representative
+            return new_representative
+
+    def claim(self, news):
+        """Claim the story of a news of interest to be stored by this news.
+
+        Args:
+            news (scraper_models.NewsRSSEntry): A scored news of interest.
+
+        Returns:
+            bool: True if no news of the story has been stored, so this news
+                should be stored. False otherwise.
+
+        """
+        with self._lock:
+            root = self._get_root(news)
+            story = self._stories.setdefault(root, _Story())
+            if story.stored:
+                return False
+
+            story.stored = True
+            if news is not root:
+                news.tags.update(root.tags)
+            return True
+
+    @staticmethod
+    def _get_root(news):
+        while news.duplicate_of is not None:
+            news = news.duplicate_of
+        return news
+
+    def _add(self, index, fingerprint, news):
+        with self._lock:
+            representative = index.find(fingerprint)
+            if representative is None or representative is news:
+                index.add(fingerprint, news)
+                return False
+
+        return self._link_to(representative, news)
+
+    def _link_to(self, representative, news):
+        with self._lock:
+            # The representative may have been found to be a duplicate by its content.
+            representative = self._get_root(representative)
+
+            news.duplicate_of = representative
+            representative.tags.update(news.tags)
+            self.duplicate_count += 1
+            return True
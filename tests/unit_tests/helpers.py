@@ -0,0 +1,27 @@
+"""Helpers shared by unit tests.
+"""
+import os
+
+FIXTURE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def read_fixture(filename):
+    """Read a fixture file in this directory as bytes.
+    """
+    with open(os.path.join(FIXTURE_DIR, filename), "rb") as infile:
+        return infile.read()
+
+
+class FakeWriter(object):
+    """A ``db_writer.NewsDatabaseWriter`` which keeps news in memory.
+
+    Attributes:
+        stored (list(scraper_models.NewsRSSEntry)): News put to the writer.
+
+    """
+
+    def __init__(self):
+        self.stored = []
+
+    def put(self, news):
+        self.stored.append(news)
@@ -0,0 +1,111 @@
+"""Unit test for verifying indexes of scraper tables.
+"""
+import unittest
+from unittest.mock import Mock
+from db_indexes import (
+    REQUIRED_INDEXES, HotQuery, IndexSpec, check_conflict_indexes, create_index,
+    explain_hot_query, find_missing_indexes
+)
+from db_sqlite import SQLiteDatabase
+from scraper_utils import NewsScrapperError
+
+
+class IndexesTest(unittest.TestCase):
+    """Test finding and creating missing indexes, and timing hot queries.
+    """
+
+    def test_find_missing_indexes(self):
+        """Unique requirements need unique indexes; others need leading columns.
+        """
+        catalog_rows = [
+            # Unique on the same columns in another order
+            ("shownews_newsdata", "url_uniq", True, ["url"]),
+            ("shownews_scrapingrule_keywords", "rule_kw_uniq", True,
+             ["newskeyword_id", "scrapingrule_id"]),
+            # Leading columns cover a non-unique requirement.
+            ("shownews_newsdata", "creation_time_idx", False, ["creation_time", "id"]),
+            # A non-unique index does not cover a unique requirement.
+            ("shownews_scoremap", "scoremap_idx", False, ["news_id", "rule_id"]),
+            # Columns which are not leading do not cover a requirement.
+            ("shownews_scrapingrule_tags", "rule_tag_idx", False,
+             ["scrapingrule_id", "newscategory_id"]),
+        ]
+        conn = Mock()
+        conn.execute_sql_command.return_value = catalog_rows
+
+        missing = find_missing_indexes(conn)
+
+        self.assertEqual(
+            {(spec.table, spec.columns) for spec in missing},
+            {(spec.table, spec.columns) for spec in REQUIRED_INDEXES} - {
+                ("shownews_newsdata", ("url",)),
+                ("shownews_newsdata", ("creation_time",)),
+                ("shownews_scrapingrule_keywords", ("scrapingrule_id", "newskeyword_id")),
+                ("shownews_scrapingrule_keywords", ("newskeyword_id",)),
+            }
+        )
+
+    def test_check_conflict_indexes(self):
+        """Storing news fails early without the unique index of scores.
+        """
+        conn = Mock()
+        conn.execute_sql_command.return_value = [
+            ("shownews_newsdata", "url_uniq", True, ["url"]),
+        ]
+        with self.assertRaisesRegex(NewsScrapperError, r"shownews_scoremap \(news_id, rule_id\)"):
+            check_conflict_indexes(conn)
+
+        # Other missing indexes only slow down queries.
+        conn.execute_sql_command.return_value = [
+            ("shownews_scoremap", "scoremap_uniq", True, ["news_id", "rule_id"]),
+        ]
+        check_conflict_indexes(conn)
+
+        # The schema of SQLite has the unique constraints.
+        with SQLiteDatabase(":memory:") as sqlite_conn:
+            check_conflict_indexes(sqlite_conn)
+
+    def test_create_index(self):
+        conn = Mock()
+        create_index(conn, IndexSpec("shownews_newsdata", ("url",), True, "url lookups"))
+
+        conn.execute_sql_command.assert_called_once_with(
+            "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS shownews_newsdata_url_uniq "
+            "ON shownews_newsdata (url);"
+        )
+
+    def test_explain_write_is_rolled_back(self):
+        plan = {
+            "Planning Time": 0.1,
+            "Execution Time": 0.5,
+            "Plan": {
+                "Node Type": "ModifyTable",
+                "Plans": [{"Node Type": "Index Scan", "Relation Name": "shownews_scoremap"}],
+            },
+        }
+        conn = Mock()
+        conn.execute_sql_command.side_effect = [[(1, 2, 3)], None, [([plan],)], None]
+        hot_query = HotQuery("score upsert", "INSERT ...;", "SELECT ...;", True)
+
+        result = explain_hot_query(conn, hot_query)
+
+        self.assertEqual(result, {
+            "planning_ms": 0.1, "execution_ms": 0.5,
+            "scans": ["Index Scan on shownews_scoremap"],
+        })
+        statements = [call.args[0] for call in conn.execute_sql_command.call_args_list]
+        self.assertEqual(statements, [
+            "SELECT ...;", "BEGIN;", "EXPLAIN (ANALYZE, FORMAT JSON) INSERT ...;", "ROLLBACK;"
+        ])
+        self.assertEqual(conn.execute_sql_command.call_args_list[2].args[1], [1, 2, 3])
+
+    def test_explain_without_sample_row(self):
+        conn = Mock()
+        conn.execute_sql_command.return_value = []
+        hot_query = HotQuery("url lookup", "SELECT ...;", "SELECT url ...;", False)
+
+        self.assertIsNone(explain_hot_query(conn, hot_query))
+
+
+if __name__ == "__main__":
+    unittest.main()
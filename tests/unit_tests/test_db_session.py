@@ -0,0 +1,103 @@
+"""Unit test for server-side prepared statements of pooled PostgreSQL connections.
+"""
+import unittest
+from unittest.mock import Mock, patch
+import db_news_api
+import db_session
+from db_news_api import NewsDatabaseAPI
+from db_session import PooledConnection
+
+
+class FakeCursor(object):
+    """A cursor which records statements, and returns a row for EXECUTE.
+    """
+
+    def __init__(self, statements):
+        self.statements = statements
+        self.description = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+    def execute(self, sql_command, params=None):
+        self.statements.append((sql_command, params))
+        self.description = ("id",) if sql_command.startswith("EXECUTE") else None
+
+    def fetchall(self):
+        return [(1,)]
+
+
+class FakeRawConnection(object):
+    """A psycopg2 connection (``db_session._PreparingConnection``) without a server.
+    """
+
+    def __init__(self):
+        self.autocommit = True
+        self.prepared_statements = set()
+        self.statements = []
+
+    def cursor(self):
+        return FakeCursor(self.statements)
+
+
+class PreparedStatementTest(unittest.TestCase):
+    """Test ``PooledConnection.execute_prepared()``.
+    """
+
+    def setUp(self):
+        self.raw_conn = FakeRawConnection()
+        self.conn = PooledConnection(self.raw_conn)
+
+    def get_statements(self, prefix):
+        return [sql for sql, _ in self.raw_conn.statements if sql.startswith(prefix)]
+
+    def test_statement_is_prepared_once(self):
+        query = "SELECT id FROM shownews_scrapingrule WHERE name = %s AND active = %s;"
+        self.assertEqual(self.conn.execute_prepared(query, ["a", True]), [(1,)])
+        self.assertEqual(self.conn.execute_prepared(query, ["b", True]), [(1,)])
+
+        prepares = self.get_statements("PREPARE")
+        self.assertEqual(len(prepares), 1)
+        self.assertTrue(prepares[0].endswith(
+            "AS SELECT id FROM shownews_scrapingrule WHERE name = $1 AND active = $2;"
+        ))
+        self.assertEqual(self.raw_conn.statements[-1][1], ["b", True])
+        self.assertEqual(len(self.get_statements("EXECUTE")), 2)
+
+    def test_prepared_statements_are_capped(self):
+        """All statements are deallocated when the cap is reached.
+        """
+        with patch.object(db_session, "_MAX_PREPARED_STATEMENTS", 3):
+            for index in range(3):
+                self.conn.execute_prepared("SELECT %d;" % index)
+            self.assertEqual(self.get_statements("DEALLOCATE"), [])
+
+            self.conn.execute_prepared("SELECT 3;")
+
+        self.assertEqual(self.get_statements("DEALLOCATE"), ["DEALLOCATE ALL;"])
+        self.assertEqual(len(self.raw_conn.prepared_statements), 1)
+        self.assertEqual(len(self.get_statements("PREPARE")), 4)
+
+    def test_only_full_chunks_are_prepared(self):
+        """The last chunk of a bulk insert, of any size, is not prepared.
+        """
+        conn = Mock(autocommit=True)
+        conn.execute_prepared.return_value = None
+        conn.execute_sql_command.return_value = None
+        db_api = NewsDatabaseAPI(conn)
+
+        with patch.object(db_news_api, "_BULK_CHUNK_SIZE", 2):
+            db_api._bulk_insert("scoremap", ("news_id", "rule_id", "weight"),
+                                [(news_id, 1, 0) for news_id in range(5)])
+
+        prepared = [call.args[0] for call in conn.execute_prepared.call_args_list]
+        self.assertEqual(len(prepared), 2)
+        self.assertEqual(len(set(prepared)), 1)
+        self.assertEqual(conn.execute_sql_command.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,289 @@
+"""Unit test for NewsDatabaseAPI on the embedded SQLite backend.
+"""
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import Mock, patch
+import pytz
+import db_news_api
+from db_news_api import NewsDatabaseAPI
+from db_sqlite import SQLiteDatabase
+from scraper_models import NewsRSSEntry, ScrapingRule
+from scraping_rules_compiler import compile_rules
+from scraper_utils import NewsScrapperError
+
+
+class SQLiteNewsDatabaseTest(unittest.TestCase):
+    """Test that every NewsDatabaseAPI method works with SQLiteDatabase.
+    """
+
+    def setUp(self):
+        self.conn = SQLiteDatabase(":memory:")
+        self.db_api = NewsDatabaseAPI(self.conn)
+        self.rules = [
+            ScrapingRule("Korea", {"韓國"}, {"娛樂"}, tags={"world"}),
+            ScrapingRule("Trump", {"川普"}, tags={"world", "us"}),
+        ]
+        for rule in self.rules:
+            self.db_api.store_a_scraping_rule(rule)
+        self.compiled_rules = compile_rules(self.rules)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def make_news(self, title, url):
+        return NewsRSSEntry(
+            title, "", url, datetime(2018, 2, 19, tzinfo=pytz.utc), "test", rules=self.compiled_rules
+        )
+
+    def count_rows(self, table_name):
+        return self.conn.execute_sql_command("SELECT COUNT(*) FROM %s;" % table_name)[0][0]
+
+    def test_rules_round_trip(self):
+        rules_from_db = self.db_api.get_scraping_rules()
+        self.assertEqual(set(rules_from_db.values()), set(self.rules))
+
+        # Storing the same rule again is a no-op.
+        self.db_api.store_a_scraping_rule(self.rules[0])
+        self.assertEqual(self.count_rows("shownews_scrapingrule"), 2)
+
+    def test_extended_rules_round_trip(self):
+        rules = [
+            ScrapingRule("Stock", include_groups=[{"美股", "跌"}, {"道瓊"}], include_any={"重挫"}),
+            ScrapingRule("Korea", {"韓國"}, {"娛樂"}, tags={"world"}, ensure_times_lower=2),
+        ]
+        self.db_api.remove_a_scraping_rule("Korea")
+        for rule in rules:
+            self.db_api.store_a_scraping_rule(rule)
+
+        self.assertEqual(
+            set(self.db_api.get_scraping_rules().values()), set(rules + self.rules[1:])
+        )
+
+        # Rules whose keywords are edited outside the scraper are read as AND-only rules.
+        self.conn.execute_sql_command(
+            "DELETE FROM shownews_scrapingrule_keywords WHERE newskeyword_id IN "
+            "(SELECT id FROM shownews_newskeyword WHERE name = %s);", ["道瓊"]
+        )
+        rules_by_name = {
+            rule.name: rule for rule in self.db_api.get_scraping_rules().values()
+        }
+        self.assertEqual(rules_by_name["Stock"], ScrapingRule("Stock", {"美股", "跌", "重挫"}))
+
+        self.db_api.remove_all_rules_and_relations()
+        self.assertEqual(self.count_rows("scraper_rule_definitions"), 0)
+
+    def test_store_news_and_scores(self):
+        news = [self.make_news("川普訪問韓國", "http://a"), self.make_news("川普", "http://b")]
+        news_id_map = self.db_api.store_news_data(news)
+        self.assertEqual(set(news_id_map), {"http://a", "http://b"})
+
+        # Existing news are not stored again, but their scores are updated.
+        news_id_map_again = self.db_api.store_news_data([self.make_news("韓國", "http://a")])
+        self.assertEqual(news_id_map_again["http://a"], news_id_map["http://a"])
+        self.assertEqual(self.count_rows("shownews_newsdata"), 2)
+
+        news_from_db = self.db_api.get_news_data_and_setup_rule(self.rules)
+        self.assertEqual(news_from_db[news_id_map["http://a"]].title, "川普訪問韓國")
+        self.assertEqual(
+            news_from_db[news_id_map["http://b"]].published_time,
+            datetime(2018, 2, 19, tzinfo=pytz.utc)
+        )
+
+        # "http://a" is now scored by its new title "韓國".
+        rows = self.conn.execute_sql_command(
+            "SELECT rule.name, score.weight FROM shownews_scoremap AS score "
+            "INNER JOIN shownews_scrapingrule AS rule ON score.rule_id = rule.id "
+            "WHERE score.news_id = %s;",
+            [news_id_map["http://a"]]
+        )
+        self.assertEqual(dict(rows), {"Korea": 10, "Trump": 0})
+
+    def test_news_are_stored_by_canonical_urls(self):
+        """News stored by original urls before canonicalization are not stored again.
+        """
+        legacy_url = "http://m.udn.com/news/story/7331/1?from=udn-ch1_breaknews"
+        self.conn.execute_sql_command(
+            "INSERT INTO shownews_newsdata (title, url, content, time, creation_time, "
+            "last_modified_time) VALUES (%s, %s, '', %s, %s, %s);",
+            ["川普", legacy_url] + [datetime(2018, 2, 19, tzinfo=pytz.utc)] * 3
+        )
+        legacy_id = self.conn.execute_sql_command("SELECT id FROM shownews_newsdata;")[0][0]
+
+        news_id_map = self.db_api.store_news_data([
+            self.make_news("川普訪問韓國", legacy_url),
+            self.make_news("韓國", "http://m.udn.com/news/story/7331/2?from=udn-ch1_breaknews"),
+            self.make_news("韓國", "https://udn.com/news/amp/story/7331/2"),
+        ])
+
+        self.assertEqual(news_id_map[legacy_url], legacy_id)
+        rows = self.conn.execute_sql_command("SELECT id, url FROM shownews_newsdata;")
+        self.assertEqual(
+            sorted(url for _, url in rows), [legacy_url, "https://udn.com/news/story/7331/2"]
+        )
+        self.assertEqual(len(set(news_id_map.values())), 2)
+
+    def test_bulk_insert_in_chunks(self):
+        statements = []
+        execute_sql_command = self.conn.execute_sql_command
+
+        def record_statement(sql_command, params=None):
+            statements.append(sql_command)
+            return execute_sql_command(sql_command, params)
+
+        news = [self.make_news("川普", "http://%d" % i) for i in range(5)]
+        with patch.object(db_news_api, "_BULK_CHUNK_SIZE", 2), \
+                patch.object(self.conn, "execute_sql_command", side_effect=record_statement):
+            news_id_map = self.db_api.store_news_data(news)
+
+        # Ids of all news are returned by INSERT ... RETURNING, 2 rows at a time.
+        self.assertEqual(set(news_id_map), {"http://%d" % i for i in range(5)})
+        self.assertEqual(len(set(news_id_map.values())), 5)
+        inserts = [sql for sql in statements if sql.startswith("INSERT INTO shownews_newsdata ")]
+        self.assertEqual(len(inserts), 3)
+        self.assertTrue(all("RETURNING url, id" in sql for sql in inserts))
+        self.assertEqual(self.count_rows("shownews_scoremap"), 10)
+
+    def test_id_cache(self):
+        # All ids of a table are read by one query, and then found in the cache.
+        db_api = NewsDatabaseAPI(self.conn)
+        with patch.object(
+            self.conn, "execute_sql_command", wraps=self.conn.execute_sql_command
+        ) as execute_sql_command:
+            rule_ids = db_api._get_rule_ids()
+            self.assertEqual(db_api._get_id_field("scrapingrule", name="Trump"), rule_ids["Trump"])
+            self.assertEqual(
+                db_api._get_id_field("newskeyword", name="韓國", to_include=True),
+                db_api._get_id_field("newskeyword", name="韓國", to_include=True)
+            )
+        self.assertEqual(execute_sql_command.call_count, 2)
+        self.assertEqual(set(rule_ids), {"Korea", "Trump"})
+
+        # Ids of rows inserted later are cached by INSERT ... RETURNING.
+        self.db_api.store_a_scraping_rule(ScrapingRule("Stock", {"股"}))
+        rule_id = self.conn.execute_sql_command(
+            "SELECT id FROM shownews_scrapingrule WHERE name = %s;", ["Stock"]
+        )[0][0]
+        self.assertEqual(self.db_api._get_rule_ids()["Stock"], rule_id)
+
+        # Ids inserted in a rolled back transaction are forgotten.
+        with self.assertRaises(RuntimeError):
+            with self.db_api.transaction():
+                self.db_api.store_a_scraping_rule(ScrapingRule("Other", {"其他"}))
+                raise RuntimeError()
+        self.assertNotIn("Other", self.db_api._get_rule_ids())
+
+    def test_id_cache_after_removing_rules(self):
+        """Ids of removed rules, keywords and tags are not reused from the cache.
+        """
+        self.db_api.remove_a_scraping_rule("Korea")
+        self.assertEqual(set(self.db_api._get_rule_ids()), {"Trump"})
+
+        self.db_api.remove_all_rules_and_relations()
+        for rule in self.rules:
+            self.db_api.store_a_scraping_rule(rule)
+
+        rows = self.conn.execute_sql_command("SELECT name, id FROM shownews_scrapingrule;")
+        self.assertEqual(self.db_api._get_rule_ids(), dict(rows))
+        self.assertEqual(set(self.db_api.get_scraping_rules().values()), set(self.rules))
+        # A tag shared by two rules is stored once.
+        self.assertEqual(self.count_rows("shownews_newscategory"), 2)
+
+        news_id_map = self.db_api.store_news_data([self.make_news("川普訪問韓國", "http://a")])
+        self.assertEqual(len(news_id_map), 1)
+        self.assertEqual(self.count_rows("shownews_scoremap"), 2)
+
+    def test_transaction_rollback(self):
+        with self.assertRaises(RuntimeError):
+            with self.db_api.transaction():
+                self.db_api.store_news_data([self.make_news("川普", "http://a")])
+                raise RuntimeError()
+
+        self.assertEqual(self.count_rows("shownews_newsdata"), 0)
+
+    def test_nested_transaction_rollback(self):
+        """An error in a nested block rolls back the whole transaction, once.
+        """
+        with self.db_api.transaction():
+            with self.db_api.transaction():
+                self.db_api.store_news_data([self.make_news("川普", "http://a")])
+            self.assertTrue(self.conn._conn.in_transaction)
+        self.assertFalse(self.conn._conn.in_transaction)
+        self.assertEqual(self.count_rows("shownews_newsdata"), 1)
+
+        with self.assertRaises(RuntimeError):
+            with self.db_api.transaction():
+                self.db_api.store_news_data([self.make_news("川普", "http://b")])
+                with self.db_api.transaction():
+                    self.db_api.store_a_scraping_rule(ScrapingRule("Stock", {"股"}))
+                    raise RuntimeError()
+
+        self.assertFalse(self.conn._conn.in_transaction)
+        self.assertEqual(self.count_rows("shownews_newsdata"), 1)
+        self.assertEqual(self.count_rows("shownews_scrapingrule"), 2)
+
+        # The connection is usable after the rollback.
+        self.db_api.store_news_data([self.make_news("川普", "http://b")])
+        self.assertEqual(self.count_rows("shownews_newsdata"), 2)
+
+    def test_connection_must_be_in_autocommit_mode(self):
+        with self.assertRaises(NewsScrapperError):
+            NewsDatabaseAPI(Mock(autocommit=False))
+
+        # The mode of a connection without the attribute is unknown.
+        with self.assertRaises(NewsScrapperError):
+            NewsDatabaseAPI(Mock(spec=["execute_sql_command"]))
+
+    def test_wrapped_connection_is_switched_to_autocommit_mode(self):
+        """The psycopg2 connection wrapped by MyDB is switched to autocommit mode.
+        """
+        conn = Mock(spec=["execute_sql_command", "conn"])
+        conn.conn.autocommit = False
+        NewsDatabaseAPI(conn)
+        self.assertIs(conn.conn.autocommit, True)
+
+    def test_prune_news(self):
+        news_id_map = self.db_api.store_news_data(
+            [self.make_news("川普", "http://%d" % i) for i in range(5)]
+        )
+        self.assertEqual(len(self.db_api.get_expired_news_ids(keep_newest=3, limit=10)), 2)
+        self.assertEqual(self.db_api.get_expired_news_ids(keep_newest=5), [])
+        self.assertEqual(self.db_api.get_expired_news_ids(
+            created_before=datetime.now(pytz.utc) - timedelta(days=1)
+        ), [])
+
+        expired_ids = self.db_api.get_expired_news_ids(
+            created_before=datetime.now(pytz.utc) + timedelta(days=1), limit=10
+        )
+        self.assertEqual(set(expired_ids), set(news_id_map.values()))
+
+        self.db_api.delete_news_data(expired_ids)
+        self.assertEqual(self.count_rows("shownews_newsdata"), 0)
+        self.assertEqual(self.count_rows("shownews_scoremap"), 0)
+        self.assertEqual(self.count_rows("shownews_newsdata_rules"), 0)
+
+    def test_oldest_news_over_max_rows_are_expired_first(self):
+        ids = []
+        for index in range(6):
+            news_id_map = self.db_api.store_news_data([self.make_news("川普", "http://%d" % index)])
+            ids.append(news_id_map["http://%d" % index])
+        # The creation time of the oldest news is the latest, so it is pruned last.
+        self.conn.execute_sql_command(
+            "UPDATE shownews_newsdata SET creation_time = %s WHERE id = %s;",
+            [datetime.now(pytz.utc) + timedelta(days=1), ids[0]]
+        )
+
+        self.assertEqual(self.db_api.get_expired_news_ids(keep_newest=2, limit=2), ids[1:3])
+        self.assertEqual(self.db_api.get_expired_news_ids(keep_newest=2, limit=10), ids[1:5])
+        self.assertEqual(self.db_api.get_expired_news_ids(keep_newest=0, limit=10), ids)
+
+    def test_remove_all(self):
+        self.db_api.store_news_data([self.make_news("川普", "http://a")])
+        self.db_api.remove_all_rules_and_relations()
+        self.db_api.reset_news_data()
+
+        self.assertEqual(self.db_api.get_scraping_rules(), {})
+        self.assertEqual(self.count_rows("shownews_newsdata"), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
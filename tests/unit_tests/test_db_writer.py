@@ -0,0 +1,57 @@
+"""Unit test for writing news to DB behind the scraping.
+"""
+import logging
+import unittest
+from unittest.mock import Mock
+from db_writer import NewsDatabaseWriter
+
+
+class NewsDatabaseWriterTest(unittest.TestCase):
+    """Test batches written by ``NewsDatabaseWriter``.
+    """
+
+    def setUp(self):
+        logging.getLogger("error_log").addHandler(logging.NullHandler())
+
+    def test_write_in_batches(self):
+        """Full batches are written at once, and the rest when closed.
+        """
+        db_api = Mock()
+        with NewsDatabaseWriter(db_api, batch_size=2, queue_size=2, flush_interval=60) as writer:
+            writer.put_many(range(5))
+
+        batches = [call.args[0] for call in db_api.store_news_data.call_args_list]
+        self.assertEqual(batches, [[0, 1], [2, 3], [4]])
+        self.assertEqual(writer.stored_count, 5)
+
+    def test_partial_batch_is_written_after_flush_interval(self):
+        db_api = Mock()
+        writer = NewsDatabaseWriter(db_api, batch_size=10, flush_interval=0.01)
+        writer.start()
+        writer.put("news")
+
+        for _ in range(500):
+            if db_api.store_news_data.called:
+                break
+            writer._thread.join(0.01)
+
+        db_api.store_news_data.assert_called_once_with(["news"], update_contents=False)
+        writer.close()
+
+    def test_first_error_is_raised_when_closed(self):
+        """After an error, news are drained without being written, and the error is raised.
+        """
+        db_api = Mock()
+        db_api.store_news_data.side_effect = RuntimeError("DB is down")
+        writer = NewsDatabaseWriter(db_api, batch_size=1, queue_size=1, flush_interval=60)
+        writer.start()
+        writer.put_many(range(3))
+
+        with self.assertRaisesRegex(RuntimeError, "DB is down"):
+            writer.close()
+        self.assertEqual(db_api.store_news_data.call_count, 1)
+        self.assertEqual(writer.stored_count, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
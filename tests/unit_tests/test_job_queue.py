@@ -0,0 +1,210 @@
+"""Unit test for the job queue shared by crawl workers, and crawling by workers.
+"""
+import logging
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import Mock, patch
+import local_news_parsers
+import rss_feed_parsers
+from benchmarks.local_news_server import LocalNewsServer, build_corpus
+from crawl_jobs import CrawlCoordinator, run_worker
+from db_sqlite import SQLiteDatabase
+from extraction_profiles import get_extraction_profiles
+from job_queue import JobQueue
+from news_pipeline import NewsPipeline
+from news_sources import GoogleNews, YahooNews
+from scraper_models import ScrapingRule
+from scraping_rules_compiler import compile_rules
+from tests.unit_tests.helpers import FakeWriter
+
+
+class JobQueueTest(unittest.TestCase):
+    """Test leases, retries and results of jobs.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.db_file = os.path.join(self.temp_dir.name, "jobs.sqlite3")
+
+    def open_queue(self, **kwargs):
+        conn = SQLiteDatabase(self.db_file)
+        self.addCleanup(conn.close)
+        return JobQueue(conn, "sqlite", **kwargs)
+
+    def test_complete(self):
+        job_queue = self.open_queue()
+        job_id = job_queue.put("run1", "feed", {"source": "GoogleNews", "category": "WORLD"})
+
+        job = self.open_queue().lease("worker-1")
+        self.assertEqual((job.id, job.kind, job.payload["category"], job.attempts),
+                         (job_id, "feed", "WORLD", 1))
+        self.assertIsNone(self.open_queue().lease("worker-2"))
+        self.assertEqual(job_queue.take_finished("run1"), [])
+
+        self.assertTrue(job_queue.complete(job, {"entries": ["花蓮"]}))
+        finished = job_queue.take_finished("run1")
+        self.assertEqual([(job.state, job.result) for job in finished],
+                         [("done", {"entries": ["花蓮"]})])
+        self.assertEqual(job_queue.count(), {})
+
+    def test_put_and_take_in_batches(self):
+        """Jobs are added by multi-row INSERT statements, and taken by one DELETE.
+        """
+        job_queue = self.open_queue()
+        statements = []
+        execute_sql_command = job_queue.conn.execute_sql_command
+
+        def record_statement(sql_command, params=None):
+            statements.append(sql_command)
+            return execute_sql_command(sql_command, params)
+
+        with patch.object(job_queue.conn, "execute_sql_command", side_effect=record_statement):
+            job_ids = job_queue.put_many("run1", "article", ({"n": n} for n in range(150)))
+            self.assertEqual(len([sql for sql in statements if sql.startswith("INSERT")]), 2)
+
+            for n in range(150):
+                job = job_queue.lease("worker-1")
+                self.assertEqual((job.id, job.payload), (job_ids[n], {"n": n}))
+                job_queue.complete(job, {})
+
+            del statements[:]
+            self.assertEqual(len(job_queue.take_finished("run1")), 150)
+            self.assertEqual(len([sql for sql in statements if sql.startswith("DELETE")]), 1)
+
+        self.assertEqual(job_queue.count(), {})
+
+    def test_retry_and_expire(self):
+        job_queue = self.open_queue(lease_seconds=0.1, max_attempts=2, retry_delay=0)
+        first_id, second_id = job_queue.put_many("run1", "article", [{"n": 1}, {"n": 2}])
+
+        # Failed, and retried by another worker
+        first = job_queue.lease("worker-1")
+        second = job_queue.lease("worker-2")
+        self.assertEqual((first.id, second.id), (first_id, second_id))
+        self.assertTrue(job_queue.fail(first, "HTTPError: 503"))
+        retried = job_queue.lease("worker-3")
+        self.assertEqual((retried.id, retried.attempts), (first_id, 2))
+
+        # The lease of worker-2 expires, and the job is leased again.
+        time.sleep(0.15)
+        leased_again = job_queue.lease("worker-4")
+        self.assertEqual((leased_again.id, leased_again.attempts), (second_id, 2))
+        self.assertFalse(job_queue.complete(second, {}))
+
+        # Out of attempts
+        self.assertTrue(job_queue.fail(retried, "HTTPError: 503"))
+        time.sleep(0.15)
+        self.assertIsNone(job_queue.lease("worker-5"))
+        job_queue.expire_leases()
+
+        finished = job_queue.take_finished("run1")
+        self.assertEqual(
+            [(job.id, job.state, job.error) for job in finished],
+            [(first_id, "failed", "HTTPError: 503"), (second_id, "failed", "Lease expired")]
+        )
+
+    def test_worker_retries_db_errors(self):
+        """Errors of the job queue are retried, and raised after too many in a row.
+        """
+        logging.getLogger("error_log").addHandler(logging.NullHandler())
+        job_queue = self.open_queue(retry_delay=0)
+        job_id = job_queue.put("run1", "article", {"source": "Unknown"})
+        stop_event = threading.Event()
+
+        flaky_queue = Mock(wraps=job_queue)
+        flaky_queue.lease.side_effect = [OSError("DB is restarting"), job_queue.lease("worker-1")]
+
+        def fail_once(job, error):
+            if flaky_queue.fail.call_count == 1:
+                raise OSError("DB is restarting")
+            stop_event.set()
+            return job_queue.fail(job, error)
+
+        flaky_queue.fail.side_effect = fail_once
+        run_worker(flaky_queue, "worker-1", stop_event, poll_interval=0.01)
+
+        self.assertEqual(flaky_queue.fail.call_count, 2)
+        self.assertEqual(job_queue.count("run1"), {"pending": 1})
+        self.assertEqual(job_queue.lease("worker-2").id, job_id)
+
+        broken_queue = Mock()
+        broken_queue.lease.side_effect = OSError("DB is down")
+        with self.assertRaisesRegex(OSError, "DB is down"):
+            run_worker(broken_queue, "worker-3", threading.Event(), poll_interval=0.01,
+                       max_db_errors=3)
+        self.assertEqual(broken_queue.lease.call_count, 3)
+
+
+class DistributedCrawlTest(unittest.TestCase):
+    """Test that workers retrieve the same news as the pipeline in one process.
+    """
+
+    def setUp(self):
+        logging.getLogger("error_log").addHandler(logging.NullHandler())
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.db_file = os.path.join(self.temp_dir.name, "jobs.sqlite3")
+
+        self.rules = compile_rules([ScrapingRule("北韓", {"北韓"}), ScrapingRule("花蓮", {"花蓮"})])
+        self.news_sources = {"GoogleNews": GoogleNews, "YahooNews": YahooNews}
+        self.corpus = build_corpus(
+            self.news_sources, items_per_feed=5, scraping_rules=self.rules.rules
+        )
+        parser_pool = patch("rss_feed_parsers._PARSER_POOL", rss_feed_parsers._HtmlParserPool(0))
+        parser_pool.start()
+        self.addCleanup(parser_pool.stop)
+        self.addCleanup(rss_feed_parsers.clear_content_cache)
+        # Success rates of selectors recorded by this test are not kept.
+        self.addCleanup(get_extraction_profiles.cache_clear)
+        self.addCleanup(local_news_parsers._get_profile_parser_registry.cache_clear)
+
+    def start_workers(self, count):
+        stop_event = threading.Event()
+        threads = []
+        for index in range(count):
+            job_queue = JobQueue(SQLiteDatabase(self.db_file), "sqlite")
+            thread = threading.Thread(
+                target=run_worker, args=(job_queue, "worker-%d" % index, stop_event, 0.01)
+            )
+            thread.start()
+            threads.append((thread, job_queue))
+
+        def stop_workers():
+            stop_event.set()
+            for thread, job_queue in threads:
+                thread.join()
+                job_queue.conn.close()
+
+        self.addCleanup(stop_workers)
+
+    def test_crawl_by_workers(self):
+        with LocalNewsServer(self.corpus):
+            expected = FakeWriter()
+            pipeline = NewsPipeline(self.rules, expected)
+            pipeline.run(self.news_sources)
+            rss_feed_parsers.clear_content_cache()
+
+            self.start_workers(3)
+            with SQLiteDatabase(self.db_file) as conn:
+                job_queue = JobQueue(conn, "sqlite")
+                writer = FakeWriter()
+                coordinator_pipeline = NewsPipeline(self.rules, writer)
+                CrawlCoordinator(job_queue, coordinator_pipeline, poll_interval=0.01).run(
+                    self.news_sources
+                )
+                self.assertEqual(job_queue.count(), {})
+
+        self.assertEqual(coordinator_pipeline.news_count, pipeline.news_count)
+        self.assertGreater(len(writer.stored), 0)
+        self.assertEqual(
+            sorted((news.link, news.description, news.total_score) for news in writer.stored),
+            sorted((news.link, news.description, news.total_score) for news in expected.stored)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
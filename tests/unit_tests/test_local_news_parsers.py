@@ -0,0 +1,110 @@
+"""Unit test for extracting news content from retrieved local news pages.
+"""
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+import rss_feed_parsers
+from extraction_profiles import ExtractionProfileFormatError, get_extraction_profiles
+from local_news_parsers import (
+    ProfileHtmlNewsParser, extract_news_content, get_local_parser_registry
+)
+
+LTN_PAGE = (
+    '<html><head><meta name="description" content="摘要"></head><body>'
+    '<div class="news_content"><p>自由時報</p><p>新聞內容</p></div>'
+    '</body></html>'
+).encode("utf-8")
+
+CNA_PAGE = (
+    '<html><body><div class="article_box"><p>中央社</p><p>新聞內容</p></div></body></html>'
+).encode("utf-8")
+
+
+class ExtractNewsContentTest(unittest.TestCase):
+    """Test that news content is extracted from pages without retrieving them again.
+    """
+
+    def test_extract_from_html(self):
+        html_parser = get_local_parser_registry()["ltn.com.tw"]()
+        with patch("scraper_utils.fetch_url") as mock_fetch:
+            content, selector_results = extract_news_content(
+                html_parser, "http://news.ltn.com.tw/news/world/breakingnews/1", LTN_PAGE
+            )
+
+        self.assertEqual(content, "自由時報新聞內容")
+        mock_fetch.assert_not_called()
+        # <div class="text"> is tried first, then <div class="news_content">
+        self.assertEqual(selector_results, [(0, False), (1, True)])
+
+    def test_fetch_in_thread_and_parse_in_process(self):
+        url = "http://www.cna.com.tw/news/aopl/201802110062-1.aspx"
+        pool = rss_feed_parsers._HtmlParserPool(processes=1)
+        rss_feed_parsers.clear_content_cache()
+
+        with patch("rss_feed_parsers._PARSER_POOL", pool), \
+                patch("scraper_utils.fetch_url", return_value=CNA_PAGE) as mock_fetch:
+            try:
+                for link in (url, "https://www.cna.com.tw/news/aopl/201802110062-1.aspx"):
+                    content = rss_feed_parsers._get_content_from_local_source(
+                        "中央社", link, get_local_parser_registry()["cna.com.tw"]()
+                    )
+                    self.assertEqual(content, "(Extracted from '中央社')\n中央社新聞內容")
+            finally:
+                pool.shutdown()
+                rss_feed_parsers.clear_content_cache()
+
+        # Retrieved once by the original url, and cached by the canonical url
+        mock_fetch.assert_called_once()
+        self.assertEqual(mock_fetch.call_args[0][0], url)
+
+
+class ExtractionProfileTest(unittest.TestCase):
+    """Test reading extraction profiles and ordering their selectors.
+    """
+
+    def write_profiles(self, profiles):
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as outfile:
+            json.dump(profiles, outfile)
+        self.addCleanup(os.remove, outfile.name)
+        return outfile.name
+
+    def test_adaptive_selector_order(self):
+        filename = self.write_profiles([{
+            "name": "LTN", "domains": ["ltn.com.tw"],
+            "selectors": [
+                {"tag": "div", "attrs": {"class": "text"}},
+                {"tag": "div", "attrs": {"class": "news_content"}},
+            ],
+        }])
+        profile, = get_extraction_profiles(filename)
+        self.assertEqual([index for index, _ in profile.ordered_selectors()], [0, 1])
+
+        for _ in range(3):
+            html_parser = ProfileHtmlNewsParser(profile)
+            content, selector_results = extract_news_content(
+                html_parser, "https://news.ltn.com.tw/news/world/breakingnews/1", LTN_PAGE
+            )
+            html_parser.record_selector_results(selector_results)
+            self.assertEqual(content, "自由時報新聞內容")
+
+        # The layout which works is tried first after a while.
+        self.assertEqual([index for index, _ in profile.ordered_selectors()], [1, 0])
+        self.assertEqual(html_parser.selector_results, [(1, True)])
+
+    def test_invalid_profiles(self):
+        for profiles in (
+                [{"name": "A", "domains": ["a.com"]}],
+                [{"name": "A", "domains": ["a.com"], "selectors": []}],
+                [{"name": "A", "domains": ["a.com"], "selectors": [{"attrs": {}}]}],
+                [{"name": "A", "domains": ["a.com"], "selectors": [{"tag": "div"}], "xpath": "//p"}],
+                [{"name": "A", "domains": ["a.com"], "selectors": [{"tag": "div"}]},
+                 {"name": "B", "domains": ["a.com"], "selectors": [{"tag": "div"}]}],
+        ):
+            with self.assertRaises(ExtractionProfileFormatError):
+                get_extraction_profiles(self.write_profiles(profiles))
+
+
+if __name__ == "__main__":
+    unittest.main()
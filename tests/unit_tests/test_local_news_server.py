@@ -0,0 +1,67 @@
+"""Unit test for the local HTTP server used by the benchmarks.
+"""
+import logging
+import unittest
+from urllib.error import HTTPError
+import scraper_utils
+from benchmarks.local_news_server import LocalNewsServer, build_corpus
+from local_news_parsers import extract_news_content, get_local_parser_registry
+from news_sources import GoogleNews
+from rss_xml_reader import FeedDict, read_feed
+from scraper_models import ScrapingRule
+
+
+class LocalNewsServerTest(unittest.TestCase):
+    """Test that feeds and local news are served instead of retrieved from the web.
+    """
+
+    def setUp(self):
+        logging.getLogger("error_log").addHandler(logging.NullHandler())
+        self.corpus = self.build_corpus()
+        self.feed_url = GoogleNews().get_rss_url("WORLD")
+
+    def build_corpus(self):
+        return build_corpus(
+            {"GoogleNews": GoogleNews}, items_per_feed=5,
+            scraping_rules=[ScrapingRule("北韓", {"北韓"})], match_ratio=1
+        )
+
+    def test_serve_corpus(self):
+        # The same corpus is generated every time.
+        self.assertEqual(self.build_corpus(), self.corpus)
+
+        with LocalNewsServer(self.corpus) as server:
+            feed = read_feed(scraper_utils.fetch_url(self.feed_url))
+            self.assertIsInstance(feed, FeedDict)
+            self.assertEqual(len(feed.entries), 5)
+
+            for entry in feed.entries:
+                self.assertIn("北韓", entry.title)
+                html = scraper_utils.fetch_url(entry.link)
+                domain = next(
+                    (domain for domain in get_local_parser_registry() if domain in entry.link),
+                    None
+                )
+                if domain is not None:
+                    html_parser = get_local_parser_registry()[domain]()
+                    content, _ = extract_news_content(html_parser, entry.link, html)
+                    self.assertTrue(content)
+
+            with self.assertRaises(HTTPError) as context:
+                scraper_utils.fetch_url("https://news.ltn.com.tw/not-in-corpus")
+            self.assertEqual(context.exception.code, 404)
+
+        self.assertEqual(server.request_count, 7)
+        self.assertNotEqual(scraper_utils.fetch_url, server.fetch_url)
+
+    def test_inject_errors(self):
+        with LocalNewsServer(self.corpus, error_rate=1) as server:
+            with self.assertRaises(HTTPError) as context:
+                scraper_utils.fetch_url(self.feed_url)
+
+        self.assertEqual(context.exception.code, 503)
+        self.assertEqual(server.error_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+"""Unit test for the component microbenchmarks.
+"""
+import logging
+import unittest
+from benchmarks.microbenchmarks import (
+    compare_with_baseline, get_parser_benchmarks, get_routing_benchmark,
+    get_scoring_benchmarks, measure
+)
+
+
+class MicrobenchmarksTest(unittest.TestCase):
+    """Test that the benchmarks run, and regressions are detected.
+    """
+
+    def setUp(self):
+        logging.getLogger("error_log").addHandler(logging.NullHandler())
+
+    def test_run_benchmarks(self):
+        benchmarks = (
+            get_parser_benchmarks() + [get_routing_benchmark(news_count=5)]
+            + get_scoring_benchmarks(rule_counts=(10,), news_count=5)
+        )
+        self.assertIn("parse/unknown", [benchmark.name for benchmark in benchmarks])
+
+        for benchmark in benchmarks:
+            # Parsers raise AssertionError if no content is extracted.
+            self.assertGreater(measure(benchmark, repeat=1, min_time=0), 0)
+
+    def test_compare_with_baseline(self):
+        baseline = {
+            "parse/cna": {"throughput": 100.0, "unit": "pages/s"},
+            "score/10_rules": {"throughput": 100.0, "unit": "news/s"},
+        }
+        results = {
+            "parse/cna": {"throughput": 85.0, "unit": "pages/s"},
+            "score/10_rules": {"throughput": 75.0, "unit": "news/s"},
+            "google_routing": {"throughput": 1.0, "unit": "news/s"},
+        }
+
+        self.assertEqual(compare_with_baseline(results, baseline, 0.2),
+                         [("score/10_rules", 75.0, 100.0)])
+        self.assertEqual(compare_with_baseline(results, baseline, 0.1),
+                         [("parse/cna", 85.0, 100.0), ("score/10_rules", 75.0, 100.0)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+"""Unit test for the inverted news index and incremental rescoring.
+"""
+import os
+import tempfile
+import unittest
+from collect_news_to_db import _update_scraping_rules_in_db
+from db_news_api import NewsDatabaseAPI
+from db_sqlite import SQLiteDatabase
+from news_index import NewsInvertedIndex
+from scraper_models import NewsRSSEntry, ScrapingRule
+from scraping_rules_compiler import compile_rules
+
+NEWS_TEXTS = [
+    ("川普訪問北韓", "金正恩與川普會面"),
+    ("北韓試射飛彈", "南韓表示關切"),
+    ("台灣經濟成長", "出口創新高"),
+    ("川普推特", "談到台灣"),
+    ("韓國瑜參選", "北部選情"),
+]
+
+
+class NewsInvertedIndexTest(unittest.TestCase):
+    """Test candidates from the index against scoring every news.
+    """
+
+    def setUp(self):
+        self.news = {
+            news_id: NewsRSSEntry(title, desc, "http://%d" % news_id, None, "test")
+            for news_id, (title, desc) in enumerate(NEWS_TEXTS, start=1)
+        }
+        self.index = NewsInvertedIndex()
+        for news_id, news in self.news.items():
+            self.index.add(news_id, news.normalized_title, news.normalized_description)
+
+    def assert_candidates_cover_scored_news(self, rule):
+        scored_ids = set()
+        compiled = compile_rules([rule])
+        for news_id, news in self.news.items():
+            news.set_rules(compiled)
+            if news.rule_score_map[rule] != 0:
+                scored_ids.add(news_id)
+
+        candidates = self.index.candidates_of_rule(rule)
+        self.assertLessEqual(scored_ids, candidates)
+        return candidates
+
+    def test_keyword_candidates(self):
+        self.assertEqual(self.index.candidates_of_keyword("北韓"), {1, 2})
+        self.assertEqual(self.index.candidates_of_keyword("韓"), {1, 2, 5})
+        self.assertEqual(self.index.candidates_of_keyword("臺灣"), {3, 4})  # Normalized
+        self.assertEqual(self.index.candidates_of_keyword("日本"), set())
+
+    def test_rule_candidates(self):
+        rules = [
+            ScrapingRule("and", {"川普", "北韓"}),
+            ScrapingRule("or", include_groups=[{"北韓"}, {"台灣"}]),
+            ScrapingRule("any", {"川普"}, include_any={"台灣", "北韓"}),
+            ScrapingRule("exclude", {"選情"}, {"韓國瑜"}),
+        ]
+        expected = [{1}, {1, 2, 3, 4}, {1, 4}, {5}]
+        for rule, expected_ids in zip(rules, expected):
+            self.assertEqual(self.assert_candidates_cover_scored_news(rule), expected_ids)
+
+    def test_remove_and_save(self):
+        self.index.remove([1])
+        self.assertEqual(self.index.candidates_of_keyword("北韓"), {2})
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, "index.json")
+            self.index.save(filename)
+            loaded = NewsInvertedIndex.load(filename)
+
+        self.assertEqual(loaded.news_ids, {2, 3, 4, 5})
+        self.assertEqual(loaded.candidates_of_keyword("川普"), {4})
+
+
+class IncrementalRescoreTest(unittest.TestCase):
+    """Test that only changed rules are rescored, on the SQLite backend.
+    """
+
+    def setUp(self):
+        self.conn = SQLiteDatabase(":memory:")
+        self.index = NewsInvertedIndex()
+        self.db_api = NewsDatabaseAPI(self.conn, news_index=self.index)
+        self.rules = [ScrapingRule("Trump", {"川普"}), ScrapingRule("Taiwan", {"台灣"})]
+
+        _update_scraping_rules_in_db(self.db_api, self.rules, [])
+        compiled = compile_rules(self.rules)
+        self.db_api.store_news_data(
+            NewsRSSEntry(title, desc, "http://news/%d" % i, None, "test", rules=compiled)
+            for i, (title, desc) in enumerate(NEWS_TEXTS)
+        )
+
+    def tearDown(self):
+        self.conn.close()
+
+    def scores(self):
+        rows = self.conn.execute_sql_command(
+            "SELECT news.url, rule.name, score.weight FROM shownews_scoremap AS score "
+            "INNER JOIN shownews_scrapingrule AS rule ON score.rule_id = rule.id "
+            "INNER JOIN shownews_newsdata AS news ON score.news_id = news.id "
+            "WHERE score.weight != 0;"
+        )
+        return {(url, name): weight for url, name, weight in rows}
+
+    def count_rows(self, table_name):
+        return self.conn.execute_sql_command("SELECT COUNT(*) FROM %s;" % table_name)[0][0]
+
+    def test_index_is_updated_on_store(self):
+        self.assertEqual(len(self.index), len(NEWS_TEXTS))
+
+        index = NewsInvertedIndex()
+        index.sync(self.db_api)
+        self.assertEqual(index.candidates_of_keyword("北韓"), {1, 2})
+
+    def test_change_rules(self):
+        rules_from_db = self.db_api.get_scraping_rules().values()
+        new_rules = [self.rules[0], ScrapingRule("Taiwan", {"台灣", "經濟"})]
+        _update_scraping_rules_in_db(self.db_api, new_rules, rules_from_db)
+
+        self.assertEqual(set(self.db_api.get_scraping_rules().values()), set(new_rules))
+        self.assertEqual(self.scores(), {
+            ("http://news/0", "Trump"): 11, ("http://news/3", "Trump"): 10,
+            ("http://news/2", "Taiwan"): 20,
+        })
+
+    def test_score_matrix_is_complete(self):
+        """News which are not rescored get a score of zero by the new rules.
+        """
+        rules_from_db = self.db_api.get_scraping_rules().values()
+        new_rules = self.rules + [ScrapingRule("Korea", {"北韓"})]
+        _update_scraping_rules_in_db(self.db_api, new_rules, rules_from_db)
+
+        rows = self.conn.execute_sql_command(
+            "SELECT COUNT(*) FROM shownews_scoremap AS score "
+            "INNER JOIN shownews_scrapingrule AS rule ON score.rule_id = rule.id "
+            "WHERE rule.name = %s;", ["Korea"]
+        )
+        self.assertEqual(rows[0][0], len(NEWS_TEXTS))
+        self.assertEqual(self.count_rows("shownews_scoremap"), len(NEWS_TEXTS) * len(new_rules))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+"""Unit test for streaming news from feeds to the DB writer.
+"""
+import logging
+import unittest
+from news_pipeline import NewsPipeline
+from rss_feed_parsers import YahooFeedParser
+from rss_xml_reader import read_feed
+from scraper_models import NewsRSSEntry, ScrapingRule
+from scraping_rules_compiler import compile_rules
+from story_clusters import StoryClusterer
+from tests.unit_tests.helpers import FakeWriter, read_fixture
+
+
+class FakeYahooNews(object):
+    """A news source whose feeds are read from the fixture file.
+
+    It does not inherit ``news_sources.NewsSource``, so it is not registered.
+    """
+    categories = ["politics", "politics-again"]
+    feed_parser = YahooFeedParser
+
+    def get_rss_url(self, category):
+        return "https://tw.news.yahoo.com/rss/" + category
+
+    def get_raw_feed_object(self, category):
+        raw_feed = read_feed(read_fixture("rss-yahoo-politics-0219.xml"))
+        raw_feed.feed.link = self.get_rss_url(category)
+        return raw_feed
+
+
+class FailingFeedParser(YahooFeedParser):
+    @classmethod
+    def get_news_content(cls, entry):
+        if "花蓮" in entry.title:
+            raise ValueError("Broken page")
+        return super().get_news_content(entry)
+
+
+class FlakyFeedParser(YahooFeedParser):
+    failed_links = set()
+
+    @classmethod
+    def get_news_content(cls, entry):
+        if "花蓮" in entry.title and entry.link not in cls.failed_links:
+            cls.failed_links.add(entry.link)
+            raise ValueError("Broken page")
+        return super().get_news_content(entry)
+
+
+class NewsPipelineTest(unittest.TestCase):
+    """Test that news flow through all stages.
+    """
+
+    def setUp(self):
+        logging.getLogger("error_log").addHandler(logging.NullHandler())
+        self.rules = compile_rules([
+            ScrapingRule("Hualien", {"花蓮"}), ScrapingRule("Russia", {"俄"}),
+        ])
+
+    def run_pipeline(self, news_source_class, **kwargs):
+        writer = FakeWriter()
+        pipeline = NewsPipeline(
+            self.rules, writer, keep_news=True, feed_workers=2, news_workers=2, **kwargs
+        )
+        pipeline.run({"FakeYahooNews": news_source_class})
+        return pipeline, writer
+
+    def test_news_of_interest_are_stored(self):
+        pipeline, writer = self.run_pipeline(
+            FakeYahooNews, clusterer=StoryClusterer(), max_pending_news=1
+        )
+
+        self.assertEqual(pipeline.news_count, 10)
+        self.assertEqual(len(pipeline.news_entries), 10)
+
+        # The same news in the other feed are duplicates, and stored once.
+        self.assertEqual(pipeline.target_count, 3)
+        self.assertEqual(
+            sorted(news.title for news in writer.stored),
+            sorted(["花蓮地震民宅受損 政府2.1億補助重建", "圍堵俄勢力 美兩驅逐艦進駐黑海",
+                    "俄羅斯靠降息讓經濟好轉　普京3月當總統機率高"])
+        )
+        for news in writer.stored:
+            self.assertTrue(news.description)
+            self.assertEqual(len(news.tags), 2)  # Both categories
+
+    def test_failed_news_are_dropped(self):
+        class FailingYahooNews(FakeYahooNews):
+            categories = ["politics"]
+            feed_parser = FailingFeedParser
+
+        pipeline, writer = self.run_pipeline(FailingYahooNews)
+
+        self.assertEqual(pipeline.news_count, 4)
+        self.assertEqual(pipeline.target_count, 2)
+        self.assertNotIn("花蓮", "".join(news.title for news in writer.stored))
+
+    def test_failed_representative_is_replaced(self):
+        """The same news of another feed is fetched if the first one fails.
+        """
+        class FlakyYahooNews(FakeYahooNews):
+            feed_parser = FlakyFeedParser
+
+        FlakyFeedParser.failed_links.clear()
+        pipeline, writer = self.run_pipeline(FlakyYahooNews, clusterer=StoryClusterer())
+
+        self.assertEqual(len(FlakyFeedParser.failed_links), 1)
+        self.assertEqual(pipeline.target_count, 3)
+        self.assertIn("花蓮", "".join(news.title for news in writer.stored))
+
+    def test_best_scoring_news_of_a_story_is_stored(self):
+        """A duplicate which scores higher than its representative is stored instead.
+        """
+        rules = compile_rules([ScrapingRule("Liberty", {"自由時報"})])
+        writer = FakeWriter()
+        pipeline = NewsPipeline(rules, writer, StoryClusterer(title_distance=4))
+        first = NewsRSSEntry("川普：北韓若不棄核 將面臨嚴重後果 - 中央社", "", "http://1",
+                             None, "test", "WORLD")
+        second = NewsRSSEntry("川普:北韓若不棄核,將面臨嚴重後果 - 自由時報", "", "http://2",
+                              None, "test", "politics")
+
+        self.assertFalse(pipeline.clusterer.add_by_title(first))
+        self.assertTrue(pipeline.clusterer.add_by_title(second))
+        pipeline.score_a_news(second, False)
+        self.assertEqual(pipeline.news_count, 0)  # Waits for the representative
+
+        first.description = "美國總統川普表示"
+        pipeline.score_a_news(first, True)
+
+        self.assertEqual(pipeline.news_count, 2)
+        self.assertEqual(writer.stored, [second])
+        self.assertEqual(second.description, "美國總統川普表示")
+        self.assertEqual(second.tags, {"WORLD", "politics"})
+
+
+if __name__ == "__main__":
+    unittest.main()
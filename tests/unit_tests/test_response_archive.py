@@ -0,0 +1,154 @@
+"""Unit test for archiving raw responses and reprocessing them without a network.
+"""
+import gzip
+import json
+import logging
+import os
+import tempfile
+import threading
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import patch
+import rss_feed_parsers
+import scraper_utils
+from collect_news_to_db import ScraperState, sync_scraping_rules
+from db_news_api import NewsDatabaseAPI
+from db_sqlite import SQLiteDatabase
+from news_sources import GoogleNews, YahooNews
+from reprocess_archive import reprocess_archive
+from response_archive import ResponseArchive
+from scraper_models import NewsRSSEntry
+from scraping_rules_reader import get_compiled_rules_from_file
+from settings import DATABASE_CONFIG, SCRAPER_CONFIG
+from tests.unit_tests.helpers import read_fixture
+
+CNA_URL = "https://www.cna.com.tw/news/firstnews/201802190013-1.aspx"
+CNA_PAGE = (
+    '<html><body><div class="article_box"><p>美國總統川普</p><p>批評聯邦調查局</p></div></body></html>'
+).encode("utf-8")
+
+
+class ResponseArchiveTest(unittest.TestCase):
+    """Test appending responses to the archive and reading them back.
+    """
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.directory = os.path.join(self.temp_dir.name, "archive")
+
+    def test_append_and_read(self):
+        archive = ResponseArchive(self.directory)
+        first = archive.append(
+            "article", CNA_URL, b"old", datetime(2018, 2, 19, 8, tzinfo=timezone.utc)
+        )
+        archive.append("article", CNA_URL, CNA_PAGE, datetime(2018, 2, 19, 9, tzinfo=timezone.utc))
+        archive.append("feed", "https://tw.news.yahoo.com/rss/politics", b"<rss/>",
+                       datetime(2018, 2, 20, tzinfo=timezone.utc))
+
+        # Read by another process later
+        archive = ResponseArchive(self.directory)
+        self.assertEqual(archive.read(first), b"old")
+        self.assertEqual(archive.fetch_url("http://m.cna.com.tw/news/firstnews/201802190013-1.aspx"),
+                         CNA_PAGE)
+        self.assertEqual(len(archive.entries(kind="article")), 2)
+        self.assertEqual(
+            [entry["kind"] for entry in archive.entries(
+                since=datetime(2018, 2, 19, 9, tzinfo=timezone.utc),
+                until=datetime(2018, 2, 20, tzinfo=timezone.utc)
+            )],
+            ["article"]
+        )
+        self.assertEqual(
+            sorted(os.listdir(self.directory)),
+            ["index.jsonl", "responses-20180219.warc.gz", "responses-20180220.warc.gz"]
+        )
+
+        # A WARC file can also be read as a whole.
+        with gzip.open(os.path.join(self.directory, "responses-20180219.warc.gz")) as infile:
+            records = infile.read()
+        self.assertEqual(records.count(b"WARC/1.1\r\nWARC-Type: resource\r\n"), 2)
+        self.assertIn(("WARC-Target-URI: %s\r\n" % CNA_URL).encode("utf-8"), records)
+
+        with self.assertRaises(OSError):
+            archive.fetch_url("https://www.cna.com.tw/news/not-archived.aspx")
+
+    def test_reprocess_without_network(self):
+        logging.getLogger("error_log").addHandler(logging.NullHandler())
+        archive = ResponseArchive(self.directory)
+        archive.append("feed", YahooNews().get_rss_url("politics"),
+                       read_fixture("rss-yahoo-politics-0219.xml"))
+        archive.append("feed", GoogleNews().get_rss_url("WORLD"),
+                       read_fixture("rss-google-world-0219.xml"))
+        archive.append("article", CNA_URL, CNA_PAGE)
+
+        rule_file = os.path.join(self.temp_dir.name, "rule.json")
+        with open(rule_file, "w") as outfile:
+            json.dump([{"name": "花蓮", "include": ["花蓮"]},
+                       {"name": "川普", "include": ["川普"]}], outfile)
+        sqlite_file = os.path.join(self.temp_dir.name, "news.sqlite3")
+        news_index_file = os.path.join(self.temp_dir.name, "news_index.json")
+
+        # A news stored before, whose content was not extracted
+        with SQLiteDatabase(sqlite_file) as conn:
+            NewsDatabaseAPI(conn).store_news_data([NewsRSSEntry(
+                "川普批FBI忙通俄槍擊倖存者怒：沒良心", "", CNA_URL,
+                datetime(2018, 2, 19, tzinfo=timezone.utc), "google"
+            )])
+
+        with patch.dict(DATABASE_CONFIG, {"backend": "sqlite", "sqlite_file": sqlite_file}), \
+                patch.dict(SCRAPER_CONFIG, {"rule_file": rule_file,
+                                            "news_index_file": news_index_file}), \
+                patch("scraper_utils.urlopen", side_effect=AssertionError("No network")), \
+                patch("rss_feed_parsers._PARSER_POOL", rss_feed_parsers._HtmlParserPool(0)):
+            pipeline = reprocess_archive(archive)
+
+        self.assertEqual(pipeline.news_count, 10)
+        with SQLiteDatabase(sqlite_file) as conn:
+            contents = dict(conn.execute_sql_command(
+                "SELECT url, content FROM shownews_newsdata;"
+            ))
+
+        self.assertEqual(len(contents), pipeline.target_count)
+        self.assertEqual(
+            contents[CNA_URL], "(Extracted from '中央社即時新聞')\n美國總統川普批評聯邦調查局"
+        )
+
+        # A rule matching only the new content rescores the news, by the saved index.
+        with open(rule_file, "w") as outfile:
+            json.dump([{"name": "花蓮", "include": ["花蓮"]},
+                       {"name": "川普", "include": ["川普"]},
+                       {"name": "FBI", "include": ["聯邦調查局"]}], outfile)
+        with SQLiteDatabase(sqlite_file) as conn:
+            news_index = ScraperState().get_news_index(news_index_file)
+            db_api = NewsDatabaseAPI(conn, news_index=news_index)
+            news_index.sync(db_api)
+            sync_scraping_rules(db_api, get_compiled_rules_from_file(rule_file))
+
+            weights = conn.execute_sql_command(
+                "SELECT score.weight FROM shownews_scoremap AS score "
+                "INNER JOIN shownews_scrapingrule AS rule ON score.rule_id = rule.id "
+                "INNER JOIN shownews_newsdata AS news ON score.news_id = news.id "
+                "WHERE rule.name = %s AND news.url = %s;", ["FBI", CNA_URL]
+            )
+        self.assertEqual(weights, [(1,)])
+
+    def test_reprocess_does_not_affect_other_threads(self):
+        """Only the threads of the pipeline read from the archive.
+        """
+        archive = ResponseArchive(self.directory)
+        archive.append("article", CNA_URL, CNA_PAGE)
+
+        fetchers = []
+        with scraper_utils.use_fetcher(archive.fetch_url):
+            self.assertEqual(scraper_utils.fetch_url(CNA_URL), CNA_PAGE)
+            thread = threading.Thread(target=lambda: fetchers.append(scraper_utils.get_fetcher()))
+            thread.start()
+            thread.join()
+
+        self.assertEqual(fetchers, [None])
+        self.assertIsNone(scraper_utils.get_fetcher())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+"""Unit test for reading RSS feeds without feedparser.
+"""
+import unittest
+import feedparser
+from dateutil import parser as date_parser
+from rss_feed_parsers import YahooFeedParser
+from rss_xml_reader import FeedDict, parse_rss_date, read_feed
+from tests.unit_tests.helpers import read_fixture
+
+
+class ReadFeedTest(unittest.TestCase):
+    """Test that feeds are read in the same way as feedparser.
+    """
+
+    def assert_same_feed(self, data):
+        feed = read_feed(data)
+        expected = feedparser.parse(data)
+
+        self.assertIsInstance(feed, FeedDict)
+        for key in ("title", "subtitle", "link", "language", "published"):
+            self.assertEqual(getattr(feed.feed, key, None), getattr(expected.feed, key, None), key)
+
+        self.assertEqual(len(feed.entries), len(expected.entries))
+        for entry, expected_entry in zip(feed.entries, expected.entries):
+            for key in ("title", "link", "description", "published"):
+                self.assertEqual(getattr(entry, key), getattr(expected_entry, key), key)
+
+        return feed, expected
+
+    def test_google_feed(self):
+        feed, _ = self.assert_same_feed(read_fixture("rss-google-world-0219.xml"))
+        self.assertIn('<a href="http://news.ltn.com.tw/', feed.entries[0].description)
+
+    def test_yahoo_feed(self):
+        feed, expected = self.assert_same_feed(read_fixture("rss-yahoo-politics-0219.xml"))
+
+        # No <pubDate> in the channel
+        with self.assertRaises(AttributeError):
+            feed.feed.published
+
+        for raw_feed in (feed, expected):
+            raw_feed.feed.link = "https://tw.news.yahoo.com/rss/politics"
+
+        rss_feed = YahooFeedParser.parse_feed(feed, "politics")
+        expected_rss_feed = YahooFeedParser.parse_feed(expected, "politics")
+
+        for key in ("title", "subtitle", "link", "language"):
+            self.assertEqual(getattr(rss_feed, key), getattr(expected_rss_feed, key))
+
+        news_by_link = {news.link: news for news in expected_rss_feed.entries}
+        self.assertEqual(len(rss_feed.entries), len(news_by_link))
+        for news in rss_feed.entries:
+            expected_news = news_by_link[news.link]
+            self.assertEqual(news.title, expected_news.title)
+            self.assertEqual(news.description, expected_news.description)
+            self.assertEqual(news.published_time, expected_news.published_time)
+            self.assertEqual(news.tags, expected_news.tags)
+
+    def test_unusual_feed_falls_back(self):
+        atom = (
+            b'<?xml version="1.0" encoding="utf-8"?>'
+            b'<feed xmlns="http://www.w3.org/2005/Atom"><title>Atom</title>'
+            b'<entry><title>News</title><link href="http://example.com/1"/></entry></feed>'
+        )
+        entity = (
+            b'<rss version="2.0"><channel><title>T</title><link>http://example.com</link>'
+            b'<item><title>Q&amp;A &lt;i&gt;x&lt;/i&gt; &amp;#39;</title>'
+            b'<link>http://example.com/1</link></item></channel></rss>'
+        )
+
+        for data in (atom, entity, b"<rss version='2.0'><channel>"):
+            feed = read_feed(data)
+            self.assertNotIsInstance(feed, FeedDict)
+            self.assertEqual(feed.entries, feedparser.parse(data).entries)
+
+
+class ParseRssDateTest(unittest.TestCase):
+    """Test that dates are parsed in the same way as dateutil.
+    """
+
+    def test_same_as_dateutil(self):
+        for value in (
+                "Mon, 19 Feb 2018 08:15:52 GMT",
+                "Mon, 19 Feb 2018 17:07:17 +0800",
+                "Mon, 19 Feb 2018 17:07:17 -0530",
+                "Mon, 19 Feb 2018 09:07:17 +0000",
+                "19 Feb 2018 08:15 GMT",
+                "2018-02-19T08:15:52Z",
+                "Monday, 19 February 2018 08:15:52 +0800",
+        ):
+            expected = date_parser.parse(value)
+            self.assertEqual(parse_rss_date(value), expected, value)
+            self.assertEqual(parse_rss_date(value).utcoffset(), expected.utcoffset(), value)
+
+    def test_invalid_date(self):
+        with self.assertRaises(ValueError):
+            parse_rss_date("not a date")
+
+
+if __name__ == "__main__":
+    unittest.main()
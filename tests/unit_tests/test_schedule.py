@@ -0,0 +1,98 @@
+"""Unit test for the scheduler daemon and the state kept between runs.
+"""
+import json
+import logging
+import os
+import signal
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+from collect_news_to_db import ScraperState
+from schedule import ScraperDaemon, request_run_now
+from settings import RETENTION_CONFIG
+
+
+class ScraperStateTest(unittest.TestCase):
+    """Test that rules and the news index are reused between runs.
+    """
+
+    def test_reuse_until_modified(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            rule_file = os.path.join(temp_dir, "rule.json")
+            with open(rule_file, "w") as outfile:
+                json.dump([{"name": "花蓮", "include": ["花蓮"]}], outfile)
+
+            state = ScraperState()
+            rules = state.get_compiled_rules(rule_file)
+            self.assertIs(state.get_compiled_rules(rule_file), rules)
+
+            with open(rule_file, "w") as outfile:
+                json.dump([{"name": "川普", "include": ["川普"]}], outfile)
+            new_rules = state.get_compiled_rules(rule_file)
+            self.assertIsNot(new_rules, rules)
+            self.assertEqual([rule.name for rule in new_rules.rules], ["川普"])
+
+            news_index = state.get_news_index(os.path.join(temp_dir, "news_index.json"))
+            self.assertIs(state.get_news_index("another_file.json"), news_index)
+
+
+class ScraperDaemonTest(unittest.TestCase):
+    """Test that runs never overlap, and can be triggered through the control socket.
+    """
+
+    def setUp(self):
+        logging.getLogger("error_log").addHandler(logging.NullHandler())
+        self.addCleanup(signal.signal, signal.SIGUSR1, signal.getsignal(signal.SIGUSR1))
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.control_socket = os.path.join(self.temp_dir.name, "scraper.sock")
+
+    def test_news_are_pruned_only_with_a_retention_limit(self):
+        with patch.dict(RETENTION_CONFIG, {"max_age_days": None, "max_rows": None}):
+            self.assertIsNone(ScraperDaemon().scheduler.get_job("prune_news"))
+        with patch.dict(RETENTION_CONFIG, {"max_age_days": 90, "max_rows": None}):
+            self.assertIsNotNone(ScraperDaemon().scheduler.get_job("prune_news"))
+
+    def test_trigger_runs(self):
+        daemon = ScraperDaemon(control_socket=self.control_socket)
+        lock = threading.Lock()
+        states = []
+        running = []
+        max_running = []
+        second_run = threading.Event()
+
+        def fake_scrape(db_session, state):
+            with lock:
+                running.append(1)
+                max_running.append(len(running))
+                states.append(state)
+
+            if len(states) == 1:
+                # Coalesced into this run
+                self.assertEqual(request_run_now(self.control_socket), "ok")
+                time.sleep(0.2)
+            else:
+                second_run.set()
+                daemon.scheduler.shutdown(wait=False)
+
+            with lock:
+                running.pop()
+
+        def trigger_until_second_run():
+            while not second_run.wait(0.05):
+                request_run_now(self.control_socket)
+
+        threading.Timer(0.5, trigger_until_second_run).start()
+        with patch("schedule.scrape_news_and_save_to_db", side_effect=fake_scrape):
+            daemon.start()
+
+        self.assertEqual(len(states), 2)
+        self.assertIs(states[0], states[1])
+        self.assertEqual(max(max_running), 1)
+        self.assertFalse(os.path.exists(self.control_socket))
+
+
+if __name__ == "__main__":
+    unittest.main()
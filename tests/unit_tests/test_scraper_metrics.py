@@ -0,0 +1,116 @@
+"""Unit test for metrics of the stages of a run.
+"""
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+import scraper_metrics
+from scraper_metrics import LatencyHistogram, MetricsRecorder, measured
+
+
+class LatencyHistogramTest(unittest.TestCase):
+    """Test counting latencies in buckets and estimating quantiles.
+    """
+
+    def test_buckets_and_quantiles(self):
+        histogram = LatencyHistogram([0.1, 1, 10])
+        for seconds in (0.05, 0.1, 0.5, 0.5, 20):
+            histogram.observe(seconds)
+
+        self.assertEqual(
+            histogram.cumulative_counts(),
+            [(0.1, 2), (1, 4), (10, 4), (float("inf"), 5)]
+        )
+        self.assertAlmostEqual(histogram.sum, 21.15)
+        self.assertEqual(histogram.max, 20)
+        self.assertAlmostEqual(histogram.quantile(0.4), 0.1)
+        self.assertAlmostEqual(histogram.quantile(0.6), 0.55)
+        self.assertAlmostEqual(histogram.quantile(1), 20)
+        self.assertIsNone(LatencyHistogram([1]).quantile(0.5))
+
+
+class MetricsRecorderTest(unittest.TestCase):
+    """Test recording operations and writing reports.
+    """
+
+    def setUp(self):
+        self.recorder = MetricsRecorder(bounds=[0.5, 5])
+        with self.recorder.measure("article_fetch", "ltn.com.tw") as measurement:
+            measurement.add_bytes(1000)
+        with self.assertRaises(OSError):
+            with self.recorder.measure("article_fetch", "ltn.com.tw"):
+                raise OSError("timed out")
+        self.recorder.record("score", seconds=0.01)
+
+    def test_report(self):
+        report = self.recorder.get_report(news_count=1)
+
+        self.assertEqual(report["summary"], {"news_count": 1})
+        metrics = report["stages"]["article_fetch"]["ltn.com.tw"]
+        self.assertEqual(metrics["count"], 2)
+        self.assertEqual(metrics["errors"], 1)
+        self.assertEqual(metrics["bytes"], 1000)
+        self.assertEqual(metrics["latency"]["count"], 2)
+        self.assertEqual(metrics["latency"]["buckets"], [[0.5, 2], [5, 2], ["+Inf", 2]])
+        self.assertEqual(report["stages"]["score"][""]["count"], 1)
+
+        self.recorder.reset()
+        self.assertEqual(self.recorder.get_report()["stages"], {})
+
+    def test_write_reports(self):
+        with tempfile.TemporaryDirectory() as dirname:
+            json_file = os.path.join(dirname, "metrics.json")
+            prometheus_file = os.path.join(dirname, "news_scraper.prom")
+            self.recorder.write_reports(json_file, prometheus_file, news_count=1)
+
+            with open(json_file) as infile:
+                self.assertIn("article_fetch", json.load(infile)["stages"])
+            with open(prometheus_file) as infile:
+                lines = infile.read().splitlines()
+            # No temporary file is left
+            self.assertEqual(sorted(os.listdir(dirname)), ["metrics.json", "news_scraper.prom"])
+
+        self.assertIn("# TYPE news_scraper_stage_latency_seconds histogram", lines)
+        self.assertIn(
+            'news_scraper_stage_count_total{stage="article_fetch",target="ltn.com.tw"} 2', lines
+        )
+        self.assertIn(
+            'news_scraper_stage_errors_total{stage="article_fetch",target="ltn.com.tw"} 1', lines
+        )
+        self.assertIn(
+            'news_scraper_stage_latency_seconds_bucket'
+            '{stage="score",target="",le="+Inf"} 1', lines
+        )
+        self.assertIn("news_scraper_run_news_count 1", lines)
+
+    def test_nested_calls_are_measured_once(self):
+        """Only the outermost call of decorated functions of the same stage is recorded.
+        """
+        @measured("db")
+        def store():
+            store_scores()
+            store_scores()
+
+        @measured("db")
+        def store_scores():
+            fetch()
+
+        @measured("fetch")
+        def fetch():
+            pass
+
+        recorder = MetricsRecorder()
+        with patch.object(scraper_metrics, "_RECORDER", recorder):
+            store()
+            store_scores()
+
+        stages = recorder.get_report()["stages"]
+        self.assertEqual(set(stages["db"]), {"store", "store_scores"})
+        self.assertEqual(stages["db"]["store"]["count"], 1)
+        self.assertEqual(stages["db"]["store_scores"]["count"], 1)
+        self.assertEqual(stages["fetch"]["fetch"]["count"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,310 @@
+"""Unit test for scoring news by scraping rules.
+"""
+import json
+import os
+import pickle
+import tempfile
+import unittest
+from scraper_models import NewsRSSEntry, ScrapingRule
+from scraping_rules_compiler import compile_rules
+from scraping_rules_reader import get_rules_from_file, ScrapingRuleFormatError
+from text_normalizer import normalize_text
+
+
+def legacy_score(title, description, rule):
+    """The scoring algorithm before rules were compiled, for AND-only rules.
+    """
+    score = 0
+
+    for keyword in rule.excluded_keywords:
+        if keyword in title:
+            score -= 10
+
+    if score < 0:
+        return score
+
+    contains_all_keywords = True
+    for keyword in rule.included_keywords:
+        in_title = title.count(keyword)
+        in_desc = description.count(keyword)
+        score += in_title * 10 + in_desc
+
+        if not in_title and not in_desc:
+            contains_all_keywords = False
+
+    return score if contains_all_keywords else 0
+
+
+def score_of(rule, title, description):
+    news = NewsRSSEntry(title, description, 'http://example.com', None, 'test')
+    news.set_rules(compile_rules([rule]))
+    return news.rule_score_map[rule]
+
+
+class ScoringTest(unittest.TestCase):
+    """Test scores computed by ``NewsRSSEntry.set_rules()``.
+    """
+
+    def test_and_only_rules_score_as_before(self):
+        """AND-only rules must score exactly as the legacy algorithm.
+        """
+        rules = [
+            ScrapingRule('r1', {'國道', '塞車'}, tags={'交通'}),
+            ScrapingRule('r2', {'柯文哲', '市長'}, {'姚文智'}),
+            ScrapingRule('r3', {'股', '新高'}),
+            ScrapingRule('r4', set(), {'北韓'}),
+            ScrapingRule('r5'),
+        ]
+        texts = [
+            ('國道塞車嚴重', '國道一號塞車，國道三號也塞車'),
+            ('柯文哲市長談市政', '市長柯文哲表示'),
+            ('姚文智批柯文哲', '市長選舉'),
+            ('台股創新高', '股市大漲，股價新高'),
+            ('北韓試射飛彈', ''),
+            ('無關新聞', '沒有關鍵字'),
+        ]
+        compiled = compile_rules(rules)
+
+        for title, description in texts:
+            news = NewsRSSEntry(title, description, 'http://example.com', None, 'test')
+            news.set_rules(compiled)
+            for rule in rules:
+                self.assertEqual(
+                    news.rule_score_map[rule],
+                    legacy_score(title, description, rule),
+                    (rule.name, title)
+                )
+
+    def test_include_groups_are_ored(self):
+        """Any fully matched include group passes the rule.
+        """
+        rule = ScrapingRule('r', include_groups=[{'美股', '跌'}, {'道瓊', '重挫'}])
+
+        self.assertEqual(score_of(rule, '道瓊重挫', ''), 20)
+        self.assertEqual(score_of(rule, '美股下跌', '道瓊'), 21)
+        self.assertEqual(score_of(rule, '美股', '重挫'), 0)
+
+    def test_include_any(self):
+        """At least one keyword of include_any must appear.
+        """
+        rule = ScrapingRule('r', include_groups=[{'股'}], include_any={'美國', '日本'})
+
+        self.assertEqual(score_of(rule, '日本股市', ''), 20)
+        self.assertEqual(score_of(rule, '台灣股市', ''), 0)
+
+    def test_ensure_times_lower(self):
+        """Excluded keywords in the description are tolerated up to a threshold.
+        """
+        rule = ScrapingRule(
+            'r', {'川普'}, {'北韓'}, ensure_times_lower=1
+        )
+
+        self.assertEqual(score_of(rule, '川普演說', '川普提到北韓'), 11)
+        self.assertEqual(score_of(rule, '川普演說', '北韓北韓'), -10)
+        self.assertEqual(score_of(rule, '川普談北韓', ''), -10)
+
+    def test_normalized_matching(self):
+        """Width, case and Chinese script variants of a keyword match.
+        """
+        rule = ScrapingRule('r', {'台鐵', 'ABC'})
+
+        self.assertEqual(score_of(rule, '臺鐵ａｂｃ', ''), 20)
+        self.assertEqual(score_of(rule, '台铁abc', ''), 20)
+
+    def test_normalized_text_is_cached_until_changed(self):
+        """The normalized text is updated when the description is set.
+        """
+        news = NewsRSSEntry('ＡＢＣ', '', 'http://example.com', None, 'test')
+        self.assertEqual(news.normalized_title, 'abc')
+        self.assertEqual(news.normalized_description, '')
+
+        news.description = '臺灣'
+        self.assertEqual(news.normalized_description, '台灣')
+
+
+class NormalizeTextTest(unittest.TestCase):
+    """Test ``text_normalizer.normalize_text()``.
+    """
+
+    def test_normalize_text(self):
+        """Width, case and script variants are folded; other characters are kept.
+        """
+        self.assertEqual(normalize_text('ＡＢＣ１２３'), 'abc123')
+        self.assertEqual(normalize_text('臺灣总统'), '台灣總統')
+        self.assertEqual(normalize_text('皇后住在村里'), '皇后住在村里')
+        self.assertEqual(normalize_text(None), '')
+
+    def test_variant_keywords_match(self):
+        """Keywords written as variants match the normalized text.
+        """
+        rule = ScrapingRule('r', {'臺鐵', 'ａｂｃ'})
+
+        self.assertEqual(score_of(rule, '台铁ABC', ''), 20)
+
+
+class ScoreMemoTest(unittest.TestCase):
+    """Test memoized scores of a compiled rule set.
+    """
+
+    def test_same_content_is_scored_once(self):
+        """A news with the same text is looked up in the memo.
+        """
+        compiled = compile_rules([ScrapingRule('r', {'台鐵'})])
+
+        for _ in range(3):
+            news = NewsRSSEntry('台鐵誤點', '', 'http://example.com', None, 'test')
+            news.set_rules(compiled)
+            self.assertEqual(news.total_score, 10)
+
+        self.assertEqual(compiled.score_memo.misses, 1)
+        self.assertEqual(compiled.score_memo.hits, 2)
+
+    def test_memo_file_of_other_rules_is_ignored(self):
+        """Saved scores are loaded only by a rule set with the same fingerprint.
+        """
+        compiled = compile_rules([ScrapingRule('r', {'台鐵'})])
+        news = NewsRSSEntry('台鐵誤點', '', 'http://example.com', None, 'test')
+        news.set_rules(compiled)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, 'memo.json')
+            compiled.score_memo.save(filename)
+
+            same_rules = compile_rules([ScrapingRule('r', {'台鐵'})])
+            same_rules.score_memo.load(filename)
+            self.assertEqual(same_rules.score_memo.get(news.content_hash), (10,))
+
+            other_rules = compile_rules([ScrapingRule('r', {'台鐵', '延誤'})])
+            other_rules.score_memo.load(filename)
+            self.assertEqual(len(other_rules.score_memo), 0)
+
+
+class RulesReaderTest(unittest.TestCase):
+    """Test ``scraping_rules_reader.get_rules_from_file()``.
+    """
+
+    def read_rules(self, configs):
+        """Write configs to a temporary rule file, and read rules from it.
+        """
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as outfile:
+            json.dump(configs, outfile)
+        self.addCleanup(os.remove, outfile.name)
+
+        return list(get_rules_from_file(outfile.name))
+
+    def test_read_legacy_rule(self):
+        """A legacy rule is read as a single include group.
+        """
+        rule, = self.read_rules([
+            {"name": "r", "include": ["a", "b"], "exclude": ["c"], "tags": ["t"]}
+        ])
+        self.assertEqual(rule.name, 'r')
+        self.assertEqual(rule.included_keywords, {'a', 'b'})
+        self.assertEqual(rule.excluded_keywords, {'c'})
+        self.assertEqual(rule.tags, {'t'})
+        self.assertEqual(rule.include_groups, (frozenset({'a', 'b'}),))
+        self.assertIsNone(rule.ensure_times_lower)
+
+    def test_read_extended_rule(self):
+        """Include groups, include_any and ensure_times_lower are read.
+        """
+        rule, = self.read_rules([{
+            "name": "r",
+            "include": [["a", "b"], ["c"]],
+            "include_any": ["d"],
+            "ensure_times_lower": 2,
+        }])
+        self.assertEqual(set(rule.include_groups), {frozenset({'a', 'b'}), frozenset({'c'})})
+        self.assertEqual(rule.included_keywords, {'a', 'b', 'c'})
+        self.assertEqual(rule.include_any, {'d'})
+        self.assertEqual(rule.ensure_times_lower, 2)
+
+    def test_null_ensure_times_lower(self):
+        rule, = self.read_rules([{"name": "r", "include": ["a"], "ensure_times_lower": None}])
+        self.assertIsNone(rule.ensure_times_lower)
+
+    def test_invalid_rules(self):
+        """Malformed rules raise ``ScrapingRuleFormatError``.
+        """
+        invalid_configs = [
+            {"name": "r", "include": ["a", ["b"]]},
+            {"name": "r", "include": [["a"], []]},
+            {"name": "r", "ensure_times_lower": -1},
+            {"name": "r", "unknown": []},
+        ]
+        for config in invalid_configs:
+            with self.assertRaises(ScrapingRuleFormatError):
+                self.read_rules([config])
+
+
+class CompactModelsTest(unittest.TestCase):
+    """Test immutable rules and scores kept as a tuple by news.
+    """
+
+    def test_rules_are_immutable_and_hashable(self):
+        """Equal rules have the same hash, and can not be modified.
+        """
+        keywords = {'台鐵'}
+        rule = ScrapingRule('r', keywords, tags={'交通'})
+        keywords.add('延誤')
+
+        self.assertEqual(rule.included_keywords, {'台鐵'})
+        self.assertEqual(rule, ScrapingRule('r', include_groups=[{'台鐵'}], tags=['交通']))
+        self.assertEqual(hash(rule), hash(ScrapingRule('r', {'台鐵'}, tags={'交通'})))
+        self.assertNotEqual(rule, ScrapingRule('r', {'台鐵'}))
+        self.assertEqual(pickle.loads(pickle.dumps(rule)), rule)
+
+        with self.assertRaises(AttributeError):
+            rule.name = 'other'
+        with self.assertRaises(AttributeError):
+            rule.tags.add('other')
+
+    def test_rules_scoring_differently_are_not_equal(self):
+        """Include groups, include_any and ensure_times_lower are compared.
+        """
+        rules = [
+            ScrapingRule('r', include_groups=[{'a', 'b'}]),
+            ScrapingRule('r', include_groups=[{'a'}, {'b'}]),
+            ScrapingRule('r', include_groups=[{'a'}], include_any={'b'}),
+            ScrapingRule('r', {'a', 'b'}, {'c'}),
+            ScrapingRule('r', {'a', 'b'}, {'c'}, ensure_times_lower=3),
+        ]
+        self.assertEqual(len(set(rules)), len(rules))
+        self.assertEqual(
+            ScrapingRule('r', include_groups=[{'a'}, {'b'}]),
+            ScrapingRule('r', include_groups=[{'b'}, {'a'}])
+        )
+
+    def test_rules_must_be_compiled(self):
+        """Rules are compiled once by the caller, so that the score memo is shared.
+        """
+        news = NewsRSSEntry('台鐵誤點', '', 'http://example.com', None, 'test')
+        with self.assertRaises(TypeError):
+            news.set_rules([ScrapingRule('r', {'台鐵'})])
+
+    def test_scores_are_shared(self):
+        """News with the same content share the memoized scores.
+        """
+        rules = [ScrapingRule('r1', {'台鐵'}, tags={'交通'}), ScrapingRule('r2', {'股'})]
+        compiled = compile_rules(rules)
+        news = [
+            NewsRSSEntry('台鐵誤點', '台鐵列車誤點', 'http://example.com/%d' % i, None, 'test')
+            for i in range(2)
+        ]
+        for each_news in news:
+            each_news.set_rules(compiled)
+
+        self.assertIs(news[0]._scores, news[1]._scores)
+        self.assertEqual(news[0].score_of(rules[0]), 11)
+        self.assertEqual(news[0].score_of(rules[1]), 0)
+        self.assertEqual(list(news[0].rule_scores()), [(rules[0], 11), (rules[1], 0)])
+        self.assertEqual(news[0].rule_score_map, {rules[0]: 11, rules[1]: 0})
+        self.assertEqual(news[0].tags, {'交通'})
+
+        with self.assertRaises(AttributeError):
+            news[0].extra = None
+
+
+if __name__ == '__main__':
+
+    unittest.main()
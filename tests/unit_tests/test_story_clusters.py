@@ -0,0 +1,140 @@
+"""Unit test for clustering near-duplicate news of the same story.
+"""
+import unittest
+from types import SimpleNamespace
+from news_pipeline import NewsPipeline
+from rss_feed_parsers import YahooFeedParser
+from scraper_models import NewsRSSEntry, ScrapingRule
+from scraping_rules_compiler import compile_rules
+from story_clusters import StoryClusterer, hamming_distance, simhash
+
+
+def make_news(title, description="", category=None):
+    return NewsRSSEntry(title, description, "http://" + title, None, "test", category)
+
+
+class SimHashTest(unittest.TestCase):
+    """Test that similar texts have close fingerprints.
+    """
+
+    def test_distance(self):
+        same = simhash("川普北韓若不棄核將面臨嚴重後果", 2)
+        similar = simhash("川普警告北韓若不棄核將面臨嚴重後果", 2)
+        other = simhash("颱風來襲北部停班停課", 2)
+
+        self.assertEqual(hamming_distance(same, simhash("川普北韓若不棄核將面臨嚴重後果", 2)), 0)
+        self.assertLess(hamming_distance(same, similar), hamming_distance(same, other))
+
+
+class StoryClustererTest(unittest.TestCase):
+    """Test clustering news by titles and contents.
+    """
+
+    def test_cluster_by_title(self):
+        clusterer = StoryClusterer(title_distance=4)
+        first = make_news("川普：北韓若不棄核 將面臨嚴重後果 - 中央社", category="WORLD")
+        second = make_news("川普:北韓若不棄核,將面臨嚴重後果 - 自由時報", category="politics")
+        third = make_news("颱風來襲 北部停班停課")
+
+        self.assertFalse(clusterer.add_by_title(first))
+        self.assertTrue(clusterer.add_by_title(second))
+        self.assertFalse(clusterer.add_by_title(third))
+
+        self.assertIs(second.duplicate_of, first)
+        self.assertIsNone(third.duplicate_of)
+        self.assertIn("politics", first.tags)
+        self.assertEqual(clusterer.duplicate_count, 1)
+
+    def test_reelect_representative(self):
+        """A waiting duplicate replaces a representative which can not be fetched.
+        """
+        clusterer = StoryClusterer(title_distance=4)
+        first = make_news("川普：北韓若不棄核 將面臨嚴重後果 - 中央社", category="WORLD")
+        second = make_news("川普:北韓若不棄核,將面臨嚴重後果 - 自由時報", category="politics")
+        third = make_news("川普：北韓若不棄核，將面臨嚴重後果 - 聯合報")
+
+        self.assertFalse(clusterer.add_by_title(first))
+        self.assertTrue(clusterer.add_by_title(second))
+        self.assertTrue(clusterer.add_by_title(third))
+        self.assertTrue(clusterer.defer(second))
+        self.assertTrue(clusterer.defer(third))
+
+        self.assertIs(clusterer.reelect(first), second)
+        self.assertIsNone(second.duplicate_of)
+        self.assertIs(third.duplicate_of, second)
+        self.assertEqual(second.tags, {"WORLD", "politics"})
+
+        # Later news of the story link to the new representative.
+        fourth = make_news("川普：北韓若不棄核 將面臨嚴重後果 - 中央社")
+        fourth.link = first.link
+        self.assertTrue(clusterer.add_by_title(fourth))
+        self.assertIs(fourth.duplicate_of, second)
+
+        self.assertTrue(clusterer.defer(fourth))
+        self.assertEqual(clusterer.resolve(second), [third, fourth])
+        self.assertFalse(clusterer.defer(make_news("川普：北韓若不棄核 將面臨嚴重後果")))
+
+        # Only one news of the story is stored.
+        self.assertTrue(clusterer.claim(third))
+        self.assertFalse(clusterer.claim(second))
+        self.assertEqual(third.tags, {"WORLD", "politics"})
+
+    def test_cluster_by_content(self):
+        content = (
+            "美國總統川普今天在白宮表示，北韓若不放棄核武，將面臨嚴重後果。"
+            "他說，美國已準備好各種選項，並與南韓及日本密切合作，持續對平壤施壓。"
+            "白宮發言人隨後補充，華府仍希望透過外交途徑解決朝鮮半島的緊張情勢，"
+            "但不排除進一步擴大經濟制裁，包括限制石油出口與金融交易。"
+        )
+        clusterer = StoryClusterer()
+        first = make_news("川普警告北韓", content)
+        second = make_news("北韓核武 美國表態", content + "（中央社）")
+
+        self.assertFalse(clusterer.add_by_title(first))
+        self.assertFalse(clusterer.add_by_title(second))
+        self.assertFalse(clusterer.add_by_content(first))
+        self.assertTrue(clusterer.add_by_content(second))
+        self.assertIs(second.duplicate_of, first)
+
+    def test_duplicates_are_not_fetched(self):
+        fetched = []
+
+        class CountingFeedParser(YahooFeedParser):
+            @staticmethod
+            def _get_description(feed):
+                fetched.append(feed.title)
+                return feed.description
+
+        class CountingNews(object):
+            categories = ["politics"]
+            feed_parser = CountingFeedParser
+
+            def get_rss_url(self, category):
+                return "https://tw.news.yahoo.com/rss/" + category
+
+            def get_raw_feed_object(self, category):
+                return SimpleNamespace(
+                    feed=SimpleNamespace(link=self.get_rss_url(category)),
+                    entries=[
+                        SimpleNamespace(title=title, link="http://news/%d" % i,
+                                        description="內容 %d" % i, published="2018-02-19")
+                        for i, title in enumerate(["川普：北韓若不棄核", "川普:北韓若不棄核", "颱風來襲"])
+                    ]
+                )
+
+        pipeline = NewsPipeline(
+            compile_rules([ScrapingRule("Trump", {"川普"})]), SimpleNamespace(put=lambda news: None),
+            StoryClusterer(), keep_news=True, feed_workers=1, news_workers=2
+        )
+        pipeline.run({"CountingNews": CountingNews})
+
+        self.assertEqual(sorted(fetched), ["川普：北韓若不棄核", "颱風來襲"])
+        self.assertEqual(len(pipeline.news_entries), 3)
+        by_title = {news.title: news for news in pipeline.news_entries}
+        duplicate = by_title["川普:北韓若不棄核"]
+        self.assertIs(duplicate.duplicate_of, by_title["川普：北韓若不棄核"])
+        self.assertEqual(duplicate.description, "內容 0")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+"""Unit test for canonicalizing urls of news.
+"""
+import unittest
+from urllib.parse import quote
+from scraper_models import NewsRSSEntry
+from scraper_utils import extract_domain_name_from_url
+from story_clusters import StoryClusterer
+from url_canonicalizer import canonicalize_url
+
+
+class CanonicalizeUrlTest(unittest.TestCase):
+    """Test that different urls of the same news have the same canonical url.
+    """
+
+    def test_tracking_params_and_fragment(self):
+        self.assertEqual(
+            canonicalize_url(
+                "HTTP://News.LTN.com.tw:80/news/world/breakingnews/2345678"
+                "?utm_source=feed&utm_medium=rss&fbclid=abc#comments"
+            ),
+            "https://news.ltn.com.tw/news/world/breakingnews/2345678"
+        )
+        self.assertEqual(
+            canonicalize_url("https://example.com/news?b=2&a=1&gclid=x"),
+            "https://example.com/news?a=1&b=2"
+        )
+
+    def test_site_rules(self):
+        self.assertEqual(
+            canonicalize_url("http://m.udn.com/news/story/7331/3000000?from=udn-ch1_breaknews"),
+            "https://udn.com/news/story/7331/3000000"
+        )
+        self.assertEqual(
+            canonicalize_url("https://udn.com/news/amp/story/7331/3000000"),
+            "https://udn.com/news/story/7331/3000000"
+        )
+        self.assertEqual(
+            canonicalize_url("http://m.cna.com.tw/news/aopl/201802110062-1.aspx"),
+            "https://www.cna.com.tw/news/aopl/201802110062-1.aspx"
+        )
+
+    def test_unwrap_google_redirect(self):
+        target = "http://www.cna.com.tw/news/aopl/201802110062-1.aspx?utm_source=gn"
+        self.assertEqual(
+            canonicalize_url("https://news.google.com/news/url?sa=t&fd=R&url=" + quote(target, safe="")),
+            "https://www.cna.com.tw/news/aopl/201802110062-1.aspx"
+        )
+
+    def test_non_http_url(self):
+        self.assertEqual(canonicalize_url("mailto:news@example.com"), "mailto:news@example.com")
+        self.assertEqual(canonicalize_url(""), "")
+
+
+class DomainNameTest(unittest.TestCase):
+    """Test extracting domain names from urls.
+    """
+
+    def test_www_prefix(self):
+        # "wsj.com" used to be extracted as "sj.com" by str.lstrip('www.')
+        self.assertEqual(extract_domain_name_from_url("https://www.wsj.com/articles/1"), "wsj.com")
+        self.assertEqual(extract_domain_name_from_url("https://wsj.com"), "wsj.com")
+        self.assertEqual(extract_domain_name_from_url("http://udn.com?x=1"), "udn.com")
+
+    def test_same_link_is_duplicate(self):
+        clusterer = StoryClusterer()
+        first = NewsRSSEntry("川普警告北韓", "", "http://m.udn.com/news/story/1/2",
+                             None, "google", "WORLD")
+        second = NewsRSSEntry("颱風來襲", "", "https://udn.com/news/story/1/2?ch=x",
+                              None, "yahoo", "politics")
+
+        self.assertFalse(clusterer.add_by_title(first))
+        self.assertTrue(clusterer.add_by_title(second))
+        self.assertIs(second.duplicate_of, first)
+        # News are still retrieved by their original links.
+        self.assertEqual(second.link, "https://udn.com/news/story/1/2?ch=x")
+        self.assertEqual(second.canonical_link, "https://udn.com/news/story/1/2")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+"""This module normalizes texts so that variants of the same keyword match.
+
+The normalization does:
+    1. Full-width to half-width (and other compatibility forms), by NFKC.
+    2. Case folding.
+    3. Simplified Chinese and variant characters to the traditional
+       characters commonly used in Taiwan, by ``_CHINESE_VARIANTS``.
+
+Both the news text and the keywords of scraping rules must be normalized by
+``normalize_text()`` before matching.
+
+Attributes:
+    _CHINESE_VARIANTS (str): Pairs of <variant, canonical> characters.
+        Only characters which are not ambiguous are listed. For example,
+        "后" (queen) or "里" (village) are not converted.
+
+"""
+import unicodedata
+
+_CHINESE_VARIANTS = (
+    "臺台湾灣国國际際总總统統经經济濟军軍华華发發长長门門东東对對会會"
+    "说說时時这這为為们們机機关關开開电電车車铁鐵闻聞习習进進着著价價"
+    "涨漲汇匯币幣银銀韩韓战戰选選举舉区區县縣党黨议議员員无無与與业業"
+    "产產义義万萬亿億两兩个個过過还還问問题題报報导導网網线線现現实實"
+    "应應该該让讓认認识識体體医醫药藥疗療卫衛学學页頁飞飛场場马馬鸟鳥"
+    "鱼魚龙龍气氣热熱压壓变變边邊达達运運输輸货貨贸貿费費资資财財买買"
+    "卖賣亚亞欧歐罗羅乌烏兰蘭鲜鮮灾災难難庆慶节節级級组組织織队隊击擊"
+    "杀殺伤傷枪槍弹彈舰艦"
+)
+
+_CHINESE_VARIANTS_TABLE = str.maketrans(
+    _CHINESE_VARIANTS[0::2], _CHINESE_VARIANTS[1::2]
+)
+
+
+def normalize_text(text):
+    """Normalize width, case and Chinese script variants of a text.
+
+    Args:
+        text (str): The text to normalize.
+
+    Returns:
+        str: The normalized text.
+
+    """
+    if not text:
+        return ""
+
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return text.translate(_CHINESE_VARIANTS_TABLE)
@@ -0,0 +1,184 @@
+"""This module canonicalizes urls of news, so that each news has only one url.
+
+The same news is often linked by several urls, which differ in tracking
+parameters, mobile hosts, schemes or fragments, or are wrapped by a redirect
+of Google News. The canonical url (``NewsRSSEntry.canonical_link``) is stored
+in the ``url`` column in DB, and is the key to deduplicate and cache news
+content. News are still retrieved by their original links, which sites serve
+for sure. News stored before canonicalization keep their original urls in DB.
+
+Canonicalization does:
+    1. Unwrap redirects (e.g. ``https://news.google.com/news/url?url=<target>``).
+    2. Lower-case the scheme and host, and remove the default port and fragment.
+    3. Apply the rule of the site (See ``SITE_RULES``): map host aliases to the
+       canonical host, force https, and rewrite the path.
+    4. Remove tracking parameters (``TRACKING_PARAMS`` and those of the site),
+       and sort the remaining parameters.
+
+Attributes:
+    TRACKING_PARAMS (frozenset(str)): Query parameters removed from all urls.
+        Parameters starting with "utm_" are also removed.
+
+    SITE_RULES (dict): Maps a domain name (without "www.") to its ``SiteRule``.
+        A rule also applies to subdomains of the domain.
+
+"""
+# Standard library
+import re
+from collections import namedtuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+SiteRule = namedtuple(
+    "SiteRule", ("host_aliases", "https", "drop_params", "path_rewrites"),
+    defaults=({}, False, frozenset(), ())
+)
+SiteRule.__doc__ = """Canonicalization rule of a site.
+
+Attributes:
+    host_aliases (dict): Maps an alias host (e.g. a mobile host) to the canonical host.
+    https (bool): Whether the site should always be linked by https.
+    drop_params (frozenset(str)): Query parameters to remove, besides ``TRACKING_PARAMS``.
+    path_rewrites (tuple(tuple(str, str))): <pattern, replacement> applied to the path.
+"""
+
+TRACKING_PARAMS = frozenset({
+    "fbclid", "gclid", "dclid", "yclid", "mc_cid", "mc_eid", "ocid", "cmpid",
+    "_ga", "ref_src", "igshid", "spm",
+})
+
+# Redirects whose target is given by a query parameter: (host, path) ==> parameter
+_REDIRECTS = {
+    ("news.google.com", "/news/url"): "url",
+    ("www.google.com", "/url"): "url",
+    ("google.com", "/url"): "q",
+}
+
+SITE_RULES = {
+    "ltn.com.tw": SiteRule(
+        host_aliases={"m.ltn.com.tw": "news.ltn.com.tw"},
+        https=True,
+    ),
+    "cna.com.tw": SiteRule(
+        host_aliases={"m.cna.com.tw": "www.cna.com.tw", "cna.com.tw": "www.cna.com.tw"},
+        https=True,
+    ),
+    "udn.com": SiteRule(
+        host_aliases={"m.udn.com": "udn.com", "www.udn.com": "udn.com"},
+        https=True,
+        drop_params=frozenset({"from", "ch"}),
+        # AMP pages: /news/amp/story/<category>/<id> ==> /news/story/<category>/<id>
+        path_rewrites=((r"^/news/amp/story/", "/news/story/"),),
+    ),
+    "ettoday.net": SiteRule(
+        host_aliases={"ettoday.net": "www.ettoday.net"},
+        https=True,
+    ),
+    "yahoo.com": SiteRule(
+        host_aliases={"tw.mobi.yahoo.com": "tw.news.yahoo.com"},
+        https=True,
+        drop_params=frozenset({"soc_src", "soc_trk"}),
+    ),
+}
+
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+_MAX_REDIRECT_DEPTH = 3
+
+
+def canonicalize_url(url):
+    """Get the canonical form of a url.
+
+    Args:
+        url (str): The url.
+
+    Returns:
+        str: The canonical url, or ``url`` itself if it is not a http(s) url.
+
+    """
+    url = unwrap_redirect(url)
+
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return url
+
+    scheme = parts.scheme.lower()
+    if scheme not in _DEFAULT_PORTS or not parts.hostname:
+        return url
+
+    if port == _DEFAULT_PORTS[scheme]:
+        port = None
+
+    host = parts.hostname.rstrip(".")
+    path = parts.path or "/"
+    rule = _get_site_rule(host)
+
+    host = rule.host_aliases.get(host, host)
+    if rule.https:
+        scheme = "https"
+    for pattern, replacement in rule.path_rewrites:
+        path = re.sub(pattern, replacement, path)
+
+    netloc = host
+    if port is not None:
+        netloc += ":%d" % port
+
+    params = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not _is_tracking_param(key, rule)
+    )
+
+    return urlunsplit((scheme, netloc, path, urlencode(params), ""))
+
+
+def unwrap_redirect(url):
+    """Get the target of a redirect (e.g. of Google News), which is not canonicalized.
+
+    Args:
+        url (str): The url.
+
+    Returns:
+        str: The target url, or ``url`` itself if it is not a known redirect.
+
+    """
+    for _ in range(_MAX_REDIRECT_DEPTH):
+        target = _get_redirect_target(url)
+        if target is None:
+            break
+        url = target
+
+    return url
+
+
+def _get_redirect_target(url):
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return None
+
+    param = _REDIRECTS.get(((parts.hostname or "").lower(), parts.path))
+    if param is None:
+        return None
+
+    target = dict(parse_qsl(parts.query)).get(param)
+    if target and target.startswith(("http://", "https://")):
+        return target
+
+    return None
+
+
+def _get_site_rule(host):
+    domain = host[4:] if host.startswith("www.") else host
+    while domain:
+        rule = SITE_RULES.get(domain)
+        if rule is not None:
+            return rule
+        domain = domain.partition(".")[2]
+
+    return SiteRule()
+
+
+def _is_tracking_param(key, rule):
+    key = key.lower()
+    return key.startswith("utm_") or key in TRACKING_PARAMS or key in rule.drop_params